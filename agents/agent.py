@@ -1,23 +1,50 @@
 from dotenv import load_dotenv
-from langgraph.graph import StateGraph, END
-from typing import TypedDict, List, Dict
-from langgraph.checkpoint.sqlite import SqliteSaver
-from langchain_core.messages import SystemMessage, HumanMessage, AIMessage
-from langchain_openai import ChatOpenAI
+from langgraph.constants import START, END
+from typing import Annotated, TypedDict, List, Dict, Iterator, Optional
+from langchain_core.messages import SystemMessage, HumanMessage
+from langchain_core.runnables import RunnableConfig
 from pydantic import BaseModel, Field
-from tavily import TavilyClient
+from agents.search import search_all
+from agents.search_cache import CachedSearchClient, search_cache
+from agents.llm_cache import with_cache
+from agents.retrieval import agent_sources, index_store, RETRIEVAL_TOP_K
+from agents.context_budget import context_budget
+from agents.dedup import dedupe, similarity
+from agents.metrics import instrument_node, llm_metrics, collect_timings, DEDUP_TOKENS_SAVED, RESEARCH_STOPS, REVISIONS_SKIPPED
+from agents.checkpoints import checkpoints
+from functools import lru_cache
 import os
+import time
+import uuid
 import logging
+import threading
 
 # Load environment variables
 _ = load_dotenv()
 
-# Initialize memory and model
-memory = SqliteSaver.from_conn_string(":memory:")
-model = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-tavily = TavilyClient(api_key=os.environ["TAVILY_API_KEY"])
+REFLECT_STOP_SCORE = int(os.getenv("REFLECT_STOP_SCORE", "8"))  # reflection score (1-10) at which revising stops
+DRAFT_CONVERGENCE = float(os.getenv("DRAFT_CONVERGENCE", "0.9"))  # draft-to-draft similarity at which revising stops
 
-MAX_TOKENS = 120_000
+# Model and search clients are created on first use so importing this module stays fast and offline
+model = None
+tavily = None
+_clients_lock = threading.Lock()
+
+def get_model():
+    global model
+    with _clients_lock:
+        if model is None:
+            from langchain_openai import ChatOpenAI
+            model = ChatOpenAI(model="gpt-4o-mini", temperature=0)
+        return model
+
+def get_tavily():
+    global tavily
+    with _clients_lock:
+        if tavily is None:
+            from tavily import TavilyClient
+            tavily = CachedSearchClient(TavilyClient(api_key=os.environ["TAVILY_API_KEY"]), search_cache)
+        return tavily
 
 class AgentDB(BaseModel):
     id: str = Field(alias="_id")
@@ -26,20 +53,48 @@ class AgentDB(BaseModel):
     websites: List[Dict] = []
     messages: List[Dict] = []
 
+def merge_content(existing: Optional[List[str]], new: Optional[List[str]]) -> List[str]:
+    """Reducer for `content`: append snippets from any branch, skipping exact repeats."""
+    merged = list(existing or [])
+    seen = set(merged)
+    for snippet in new or []:
+        if snippet not in seen:
+            seen.add(snippet)
+            merged.append(snippet)
+    return merged
+
 class AgentState(TypedDict):
     """State definition for the agent's workflow."""
     task: str
     plan: str
     draft: str
     critique: str
-    content: List[str]
+    content: Annotated[List[str], merge_content]
+    queries: List[str]
     revision_number: int
     max_revisions: int
     has_agent_content: bool
+    source_count: int
+    source_tokens: int
+    context_report: Dict
+    dedup_report: Dict
+    dedup_tokens_saved: int
+    score: int
+    issues: List[str]
+    draft_similarity: float
+    stop_reason: str
+    revisions_skipped: int
 
 class Queries(BaseModel):
     queries: List[str]
 
+class Reflection(BaseModel):
+    score: int = Field(ge=1, le=10, description="Overall quality of the essay from 1 (poor) to 10 (ready to submit)")
+    issues: List[str] = Field(
+        description="Concrete, actionable problems to fix, most important first; empty when nothing substantial is left"
+    )
+    critique: str = Field(description="Critique and recommendations, including length, depth and style")
+
 # Updated PROMPTS to handle primary sources
 PROMPTS = {
     "PLAN": """You are an expert writer tasked with writing a high level outline of an essay. \
@@ -58,7 +113,9 @@ Utilize all the information below as needed:
 
     "REFLECT": """You are a teacher grading an essay submission. \
 Generate critique and recommendations for the user's submission. \
-Provide detailed recommendations, including requests for length, depth, style, etc.""",
+Provide detailed recommendations, including requests for length, depth, style, etc. \
+Score the essay from 1 to 10 and list the actionable issues that still need fixing; \
+only give a high score when no substantial issue is left.""",
 
     "RESEARCH_PLAN": """You are a researcher charged with providing information that can \
 be used when writing the following essay. Generate a list of search queries that will gather \
@@ -74,80 +131,68 @@ def plan_node(state: AgentState):
         SystemMessage(content=PROMPTS["PLAN"]), 
         HumanMessage(content=state['task'])
     ]
-    response = model.invoke(messages)
+    response = with_cache(get_model(), "plan").invoke(messages)
     return {"plan": response.content}
 
-def read_agent_content_node(state: AgentState, agent_db: AgentDB):
-    """Read content from agent's files and websites, marking them as verified sources"""
-    content = []
-    total_tokens = 0
-    
-    # Process files first (as they're likely primary sources)
-    if agent_db and agent_db["files"]:
-        for file in agent_db["files"]:
-            if file.get("content"):
-                if isinstance(file["content"], dict):
-                    file_content = file["content"]["content"]
-                    new_tokens = file["content"].get("token_count", 0)
-                    # Skip this file if it would exceed token limit
-                    if total_tokens + new_tokens <= MAX_TOKENS:
-                        total_tokens += new_tokens
-                        content.append(f"[VERIFIED SOURCE - File '{file.get('name', 'unnamed')}'] {file_content}")
-                    else:
-                        logging.warning(f"Skipping file {file.get('name', 'unnamed')} to stay within token limit")
-                else:
-                    content.append(f"[VERIFIED SOURCE - File '{file.get('name', 'unnamed')}'] {file['content']}")
-    
-    # Process websites with remaining token budget
-    if agent_db and agent_db["websites"]:
-        for website in agent_db["websites"]:
-            if website.get("content"):
-                if isinstance(website["content"], dict):
-                    web_content = website["content"]["content"]
-                    new_tokens = website["content"].get("token_count", 0)
-                    # Skip this website if it would exceed token limit
-                    if total_tokens + new_tokens <= MAX_TOKENS:
-                        total_tokens += new_tokens
-                        content.append(f"[VERIFIED SOURCE - Website '{website.get('url', 'unknown')}'] {web_content}")
-                    else:
-                        logging.warning(f"Skipping website {website.get('url', 'unknown')} to stay within token limit")
-                else:
-                    content.append(f"[VERIFIED SOURCE - Website '{website.get('url', 'unknown')}'] {website['content']}")
-    
+def read_agent_content_node(state: AgentState, config: RunnableConfig):
+    """Make sure the agent's files and websites are indexed for retrieval as verified sources"""
+    # The agent document travels in the run config so the compiled graph can be shared
+    sources = agent_sources(config["configurable"].get("agent_db"))
+    if sources:
+        index_store.get(sources)
     return {
-        "content": content,
-        "has_agent_content": bool(content),
-        "total_source_tokens": total_tokens
+        "has_agent_content": bool(sources),
+        "source_count": len(sources),
+        # Counted from the text itself rather than trusting stored counts; repeat runs hit the cache
+        "source_tokens": sum(context_budget.count_many([text for _, text in sources]))
     }
 
-def research_plan_node(state: AgentState):
+def retrieve_verified_content(state: AgentState, config: RunnableConfig) -> List[str]:
+    """Return the agent source chunks most relevant to the task, plan and critique."""
+    sources = agent_sources(config["configurable"].get("agent_db"))
+    if not sources:
+        return []
+    query = "\n".join(filter(None, [state.get("task"), state.get("plan"), state.get("critique")]))
+    chunks = index_store.get(sources).search(query, RETRIEVAL_TOP_K)
+    return [f"{chunk['source']} {chunk['text']}" for chunk in chunks]
+
+def research_plan_node(state: AgentState, config: RunnableConfig):
     """Generate additional research only if needed"""
-    content = state.get("content", [])
+    content = []
     
-    # If we already have agent content, be more selective about additional research
-    if state.get("has_agent_content"):
-        queries = model.with_structured_output(Queries).invoke([
+    # If we already have agent content, be more selective about additional research.
+    # Read from the config: this node runs alongside read_agent_content, not after it.
+    if agent_sources(config["configurable"].get("agent_db")):
+        queries = with_cache(get_model(), "research_plan").with_structured_output(Queries).invoke([
             SystemMessage(content="Using the verified sources as primary information, identify only critical gaps that need additional research. Generate maximum 2 queries."),
             HumanMessage(content=state['task'])
         ])
         # Limit additional research when we have primary sources
         max_results = 1
     else:
-        queries = model.with_structured_output(Queries).invoke([
+        queries = with_cache(get_model(), "research_plan").with_structured_output(Queries).invoke([
             SystemMessage(content=PROMPTS["RESEARCH_PLAN"]),
             HumanMessage(content=state['task'])
         ])
         max_results = 2
 
-    for q in queries.queries:
-        response = tavily.search(query=q, max_results=max_results)
-        for r in response['results']:
+    for results in search_all(get_tavily(), queries.queries, max_results):
+        for r in results:
             content.append(f"[Supplementary Source] {r['content']}")
     
-    return {"content": content}
+    return {"content": content, "queries": queries.queries}
 
-def generation_node(state: AgentState):
-    content = "\n\n".join(state['content'] or [])
+def generation_node(state: AgentState, config: RunnableConfig):
+    verified = retrieve_verified_content(state, config)
+    # Search results from different revisions often repeat each other or the verified sources
+    supplementary, dedup_report = dedupe(state.get('content') or [], verified, count_tokens=context_budget.count)
+    # Keep the prompt within the context budget no matter how many revisions added sources
+    packed = context_budget.pack(
+        fixed=[PROMPTS["WRITE"], state['task'], state['plan']],
+        verified=verified,
+        supplementary=supplementary
+    )
+    content = "\n\n".join(packed.verified + packed.supplementary)
     user_message = HumanMessage(
         content=f"{state['task']}\n\nHere is my plan:\n\n{state['plan']}")
     messages = [
@@ -156,86 +201,292 @@ def generation_node(state: AgentState):
         ),
         user_message
     ]
-    response = model.invoke(messages)
-    return {
+    response = with_cache(get_model(), "generate").invoke(messages)
+    prompt_tokens = sum(context_budget.count_many([message.content for message in messages]))
+    revision_number = state.get("revision_number", 1) + 1
+    update = {
         "draft": response.content, 
-        "revision_number": state.get("revision_number", 1) + 1
+        "revision_number": revision_number,
+        "context_report": {**packed.report, "prompt_tokens": prompt_tokens},
+        "dedup_report": dedup_report.model_dump(),
+        "dedup_tokens_saved": state.get("dedup_tokens_saved", 0) + dedup_report.tokens_saved
     }
+    if state.get("draft"):
+        # A revision that barely changes the previous draft will not improve on the next pass either
+        update["draft_similarity"] = round(similarity(state["draft"], response.content), 4)
+        if update["draft_similarity"] >= DRAFT_CONVERGENCE:
+            update.update(stop_revising(state, "converged", revision_number))
+    if "stop_reason" not in update and revision_number > state["max_revisions"]:
+        update.update(stop_revising(state, "max_revisions", revision_number))
+    return update
+
+def stop_revising(state: AgentState, reason: str, revision_number: int) -> Dict:
+    """State update ending the generate/reflect loop; revision_number - 1 drafts have been written."""
+    return {"stop_reason": reason, "revisions_skipped": max(0, state["max_revisions"] - (revision_number - 1))}
 
 def reflection_node(state: AgentState):
     messages = [
         SystemMessage(content=PROMPTS["REFLECT"]), 
         HumanMessage(content=state['draft'])
     ]
-    response = model.invoke(messages)
-    return {"critique": response.content}
+    reflection = with_cache(get_model(), "reflect").with_structured_output(Reflection).invoke(messages)
+    critique = reflection.critique
+    if reflection.issues:
+        critique += "\n\nIssues to fix:\n" + "\n".join(f"- {issue}" for issue in reflection.issues)
+    update = {"critique": critique, "score": reflection.score, "issues": reflection.issues}
+    if reflection.score >= REFLECT_STOP_SCORE:
+        update.update(stop_revising(state, "score", state["revision_number"]))
+    return update
 
 def research_critique_node(state: AgentState):
     """Modified to respect primary sources when gathering additional information"""
-    queries = model.with_structured_output(Queries).invoke([
+    queries = with_cache(get_model(), "research_critique").with_structured_output(Queries).invoke([
         SystemMessage(content=PROMPTS["RESEARCH_CRITIQUE"]),
         HumanMessage(content=state['critique'])
     ])
-    content = state['content'] or []
+    # Only the new snippets; merge_content appends them to what earlier revisions found
+    content = []
     
     # Limit additional research if we have primary sources
     max_results = 1 if state.get("has_agent_content") else 2
     
-    for q in queries.queries:
-        response = tavily.search(query=q, max_results=max_results)
-        for r in response['results']:
+    for results in search_all(get_tavily(), queries.queries, max_results):
+        for r in results:
             content.append(f"[Supplementary Source] {r['content']}")
-    return {"content": content}
+    return {"content": content, "queries": queries.queries}
 
 def should_continue(state):
-    if state["revision_number"] > state["max_revisions"]:
+    if state.get("stop_reason") or state["revision_number"] > state["max_revisions"]:
         return END
     return "reflect"
 
-def generate_graph(agent_db: AgentDB):
+def should_revise(state):
+    return END if state.get("stop_reason") else "research_critique"
+
+def has_agent_sources(agent_db: AgentDB) -> bool:
+    return bool(agent_db and (agent_db.get("files") or agent_db.get("websites")))
+
+@lru_cache(maxsize=2)
+def build_graph(with_agent_content: bool):
+    """Compile the research graph; one compiled graph per shape is shared by all requests."""
+    from langgraph.graph import StateGraph  # slow to import; only needed for the first research run
     builder = StateGraph(AgentState)
-    builder.add_node("planner", plan_node)
-    builder.add_node("research_plan", research_plan_node)
-    builder.add_node("generate", generation_node)
-    builder.add_node("reflect", reflection_node)
-    builder.add_node("research_critique", research_critique_node)
-    print(agent_db)
-    if agent_db and (agent_db["files"] or agent_db["websites"]):
-        builder.add_node("read_agent_content", lambda state: read_agent_content_node(state, agent_db))
-        builder.set_entry_point("planner")
-        builder.add_edge("planner", "read_agent_content")
-        builder.add_edge("read_agent_content", "research_plan")
-    else:
-        builder.set_entry_point("planner")
-        builder.add_edge("planner", "research_plan")
-    
-    builder.add_edge("research_plan", "generate")
+    builder.add_node("planner", instrument_node("planner", plan_node))
+    builder.add_node("research_plan", instrument_node("research_plan", research_plan_node))
+    builder.add_node("generate", instrument_node("generate", generation_node))
+    builder.add_node("reflect", instrument_node("reflect", reflection_node))
+    builder.add_node("research_critique", instrument_node("research_critique", research_critique_node))
+    # Planning, source loading and the first research round only need the task, so they run
+    # concurrently and the first draft waits for all of them
+    first_steps = ["planner", "research_plan"]
+    if with_agent_content:
+        builder.add_node("read_agent_content", instrument_node("read_agent_content", read_agent_content_node))
+        first_steps.append("read_agent_content")
+    for step in first_steps:
+        builder.add_edge(START, step)
+    builder.add_edge(first_steps, "generate")
     builder.add_conditional_edges(
         "generate", 
         should_continue, 
         {END: END, "reflect": "reflect"}
     )
-    builder.add_edge("reflect", "research_critique")
+    builder.add_conditional_edges(
+        "reflect",
+        should_revise,
+        {END: END, "research_critique": "research_critique"}
+    )
     builder.add_edge("research_critique", "generate")
     
-    return builder.compile()
+    # Checkpoints after every node let an interrupted run resume without repeating finished calls
+    return builder.compile(checkpointer=checkpoints.saver)
 
-def begin_research(task: str, max_revisions: int = 2, agent_db: AgentDB = None):
-    graph = generate_graph(agent_db)
-    thread = {"configurable": {"thread_id": "1"}}
-    final_state = None
-    
+def generate_graph(agent_db: AgentDB):
+    return build_graph(has_agent_sources(agent_db))
+
+def run_config(thread_id: str, agent_db: AgentDB = None) -> Dict:
+    return {"configurable": {"thread_id": thread_id, "agent_db": agent_db}, "callbacks": [llm_metrics]}
+
+def research_run(task: str, max_revisions: int = 2, agent_db: AgentDB = None,
+                 thread_id: Optional[str] = None, agent_id: Optional[str] = None):
+    """Return the graph, initial state and run config for a research query, recording the run under its own thread."""
+    with_agent_content = has_agent_sources(agent_db)
+    graph = build_graph(with_agent_content)
+    thread_id = thread_id or uuid.uuid4().hex
+    if not checkpoints.claim(thread_id):
+        raise ValueError(f"Research run {thread_id} is already running")
+    checkpoints.start(thread_id, task, max_revisions, with_agent_content, agent_id=agent_id)
+    config = run_config(thread_id, agent_db)
     initial_state = {
         'task': task,
         "max_revisions": max_revisions,
         "revision_number": 1,
         "has_agent_content": False
     }
+    return graph, initial_state, config
+
+def revision_stats(values: Dict) -> Dict:
+    """Statistics of a finished run: how its revision loop ended and what deduplication and the context budget cut."""
+    return {
+        "revisions": values.get("revision_number", 1) - 1,
+        "stop_reason": values.get("stop_reason") or "max_revisions",
+        "revisions_skipped": values.get("revisions_skipped", 0),
+        "score": values.get("score"),
+        "draft_similarity": values.get("draft_similarity"),
+        "dedup_tokens_saved": values.get("dedup_tokens_saved", 0),
+        # What the context budget cut from the prompt of the final draft
+        "context": values.get("context_report")
+    }
+
+def finish_run(graph, config: Dict) -> Dict:
+    """Record a finished run's stop statistics, drop its checkpoints and return its final state."""
+    thread_id = config["configurable"]["thread_id"]
+    values = graph.get_state(config).values
+    stats = revision_stats(values)
+    RESEARCH_STOPS.labels(stats["stop_reason"]).inc()
+    REVISIONS_SKIPPED.inc(stats["revisions_skipped"])
+    DEDUP_TOKENS_SAVED.inc(stats["dedup_tokens_saved"])
+    logging.info(f"Research run {thread_id} finished: {stats}")
+    checkpoints.finish(thread_id)
+    return values
+
+def run_to_end(graph, graph_input: Optional[Dict], config: Dict) -> Dict:
+    """Stream a run to its end and return its final state; a failed run keeps its checkpoints for resuming."""
+    thread_id = config["configurable"]["thread_id"]
+    try:
+        for state in graph.stream(graph_input, config):
+            logging.debug(f"Research step completed: {', '.join(state)}")
+        return finish_run(graph, config)
+    except Exception as e:
+        checkpoints.set_status(thread_id, "failed", str(e))
+        raise
+    finally:
+        checkpoints.release(thread_id)
+
+def begin_research(task: str, max_revisions: int = 2, agent_db: AgentDB = None,
+                   thread_id: Optional[str] = None, agent_id: Optional[str] = None):
+    graph, initial_state, config = research_run(task, max_revisions, agent_db, thread_id, agent_id)
+    return run_to_end(graph, initial_state, config).get("draft") or "No draft was generated."
+
+def resume_research(thread_id: str, agent_db: AgentDB = None) -> str:
+    """
+    Continue an interrupted or failed run from its last checkpoint.
+
+    Nodes that already finished are not run again, so their model and
+    search calls are not repeated. Raises ValueError when the run is
+    unknown or has no checkpoint left.
+    """
+    run = checkpoints.get(thread_id)
+    if run is None:
+        raise ValueError(f"Unknown research run {thread_id}")
+    # Resume on the graph shape the run started with, even if the agent's sources changed since
+    graph = build_graph(run.with_agent_content)
+    config = run_config(thread_id, agent_db)
+    snapshot = graph.get_state(config)
+    if not snapshot.values:
+        raise ValueError(f"Research run {thread_id} has no checkpoint to resume")
+    if not checkpoints.claim(thread_id):
+        raise ValueError(f"Research run {thread_id} is already running")
+    checkpoints.set_status(thread_id, "running")
+    logging.info(f"Resuming research run {thread_id} before {', '.join(snapshot.next) or 'the end'}")
+    return run_to_end(graph, None, config).get("draft") or "No draft was generated."
+
+def warm_up() -> None:
+    """Create the model and search clients, load the tokenizer and compile both graph shapes ahead of the first query."""
+    steps = {
+        "model": get_model,
+        "search": get_tavily,
+        "tokenizer": lambda: context_budget.count("warm up"),
+        "graph": lambda: (build_graph(False), build_graph(True))
+    }
+    for name, step in steps.items():
+        started = time.perf_counter()
+        try:
+            step()
+            logging.info(f"Warmed up {name} in {time.perf_counter() - started:.2f}s")
+        except Exception as e:
+            logging.warning(f"Warm-up of {name} failed: {e}")
+
+def research_with_timings(task: str, max_revisions: int = 2, agent_db: AgentDB = None,
+                          thread_id: Optional[str] = None, agent_id: Optional[str] = None) -> Dict:
+    """begin_research plus the run's wall time per node and per external service and how its revisions ended."""
+    with collect_timings() as timings:
+        graph, initial_state, config = research_run(task, max_revisions, agent_db, thread_id, agent_id)
+        values = run_to_end(graph, initial_state, config)
+    return {
+        "response": values.get("draft") or "No draft was generated.",
+        "timings": timings.report(),
+        "revisions": revision_stats(values)
+    }
+
+
+def node_event(node: str, update: Dict) -> Optional[Dict]:
+    """Translate a graph node update into a client-facing progress event."""
+    update = update or {}
+    if node == "planner":
+        return {"event": "plan", "data": {"plan": update.get("plan")}}
+    if node == "read_agent_content":
+        return {"event": "sources", "data": {"count": update.get("source_count", 0)}}
+    if node in {"research_plan", "research_critique"}:
+        return {"event": "queries", "data": {"node": node, "queries": update.get("queries", [])}}
+    if node == "generate":
+        return {"event": "draft", "data": {
+            "revision": update.get("revision_number", 2) - 1, "draft": update.get("draft"),
+            "context": update.get("context_report"), "dedup": update.get("dedup_report")
+        }}
+    if node == "reflect":
+        return {"event": "critique", "data": {
+            "critique": update.get("critique"), "score": update.get("score"), "issues": update.get("issues", [])
+        }}
+    return None
+
+def stream_research(task: str, max_revisions: int = 2, agent_db: AgentDB = None,
+                    stop: Optional[threading.Event] = None, thread_id: Optional[str] = None,
+                    agent_id: Optional[str] = None) -> Iterator[Dict]:
+    """
+    Run the research graph and yield progress events as they happen.
+
+    Yields a start event carrying the run id, node-level events (plan,
+    sources, queries, draft, critique), a token event for every chunk
+    written by the generation node and a final done event carrying the last
+    draft. Setting `stop` ends the run at the next event; a stopped or
+    failed run can be resumed with resume_research.
+    """
+    graph, initial_state, config = research_run(task, max_revisions, agent_db, thread_id, agent_id)
+    thread_id = config["configurable"]["thread_id"]
+    final_draft = None
     
-    for state in graph.stream(initial_state, thread):
-        final_state = state
-        print(f"Current state: {state}")
+    stream = graph.stream(initial_state, config, stream_mode=["updates", "messages"])
+    try:
+        # First, so a client that drops mid-run still knows which run to resume
+        yield {"event": "start", "data": {"run_id": thread_id}}
+        for mode, chunk in stream:
+            if stop is not None and stop.is_set():
+                logging.info("Research stream stopped by client")
+                checkpoints.interrupt(thread_id)
+                return
+            if mode == "messages":
+                message, metadata = chunk
+                if metadata.get("langgraph_node") == "generate" and message.content:
+                    yield {"event": "token", "data": {"content": message.content}}
+                continue
+            for node, update in chunk.items():
+                if node == "generate":
+                    final_draft = update.get("draft")
+                event = node_event(node, update)
+                if event:
+                    yield event
+    except GeneratorExit:
+        # Closed by the consumer before the run finished
+        checkpoints.interrupt(thread_id)
+        raise
+    except Exception as e:
+        checkpoints.set_status(thread_id, "failed", str(e))
+        raise
+    finally:
+        stream.close()
+        checkpoints.release(thread_id)
     
-    if final_state:
-        return final_state['generate']['draft']
-    return "No draft was generated."
+    values = finish_run(graph, config)
+    yield {"event": "done", "data": {
+        "response": final_draft or "No draft was generated.", "run_id": thread_id, **revision_stats(values)
+    }}
@@ -0,0 +1,158 @@
+import os
+import time
+import sqlite3
+import logging
+import tempfile
+from threading import Lock
+from typing import List, Optional
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_DB = os.getenv("CHECKPOINT_DB", os.path.join(tempfile.gettempdir(), "research_agent_checkpoints.sqlite"))
+CHECKPOINT_TTL = float(os.getenv("CHECKPOINT_TTL", str(7 * 24 * 3600)))  # seconds an unfinished run stays resumable
+
+class RunRecord(BaseModel):
+    thread_id: str
+    agent_id: Optional[str] = None
+    task: str
+    max_revisions: int
+    with_agent_content: bool
+    status: str
+    error: Optional[str] = None
+    created_at: float = 0.0
+    updated_at: float = 0.0
+
+class CheckpointStore:
+    """
+    Durable graph checkpoints plus a `runs` table describing each research run.
+
+    Every run uses its own thread id, so an interrupted or failed run can be
+    resumed from its last completed node. Checkpoints of completed runs are
+    deleted right away; unfinished ones are kept for `ttl` seconds. Runs
+    executing in this process are tracked so one is never run twice at once.
+    """
+
+    def __init__(self, path: Optional[str] = CHECKPOINT_DB, ttl: float = CHECKPOINT_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = Lock()
+        self._conn = None
+        self._saver = None
+        self._active = set()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        with self._lock:
+            if self._conn is None:
+                try:
+                    self._conn = sqlite3.connect(self.path or ":memory:", check_same_thread=False)
+                except sqlite3.Error as e:
+                    logger.error(f"Checkpoints kept in memory only ({self.path}): {e}")
+                    self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS runs ("
+                    "thread_id TEXT PRIMARY KEY, agent_id TEXT, task TEXT NOT NULL, max_revisions INTEGER NOT NULL, "
+                    "with_agent_content INTEGER NOT NULL, status TEXT NOT NULL, error TEXT, "
+                    "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+                )
+                self._conn.commit()
+            return self._conn
+
+    @property
+    def saver(self):
+        """LangGraph checkpointer on its own connection to the same file."""
+        with self._lock:
+            if self._saver is None:
+                from langgraph.checkpoint.sqlite import SqliteSaver  # only needed once a graph is compiled
+                try:
+                    conn = sqlite3.connect(self.path or ":memory:", check_same_thread=False)
+                except sqlite3.Error as e:
+                    logger.error(f"Checkpoints kept in memory only ({self.path}): {e}")
+                    conn = sqlite3.connect(":memory:", check_same_thread=False)
+                self._saver = SqliteSaver(conn)
+                self._saver.setup()
+            return self._saver
+
+    def start(self, thread_id: str, task: str, max_revisions: int, with_agent_content: bool,
+              agent_id: Optional[str] = None) -> None:
+        now = time.time()
+        conn = self.conn
+        with self._lock:
+            conn.execute(
+                "INSERT OR REPLACE INTO runs "
+                "(thread_id, agent_id, task, max_revisions, with_agent_content, status, error, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, 'running', NULL, ?, ?)",
+                (thread_id, agent_id, task, max_revisions, int(with_agent_content), now, now)
+            )
+            conn.commit()
+
+    def set_status(self, thread_id: str, status: str, error: Optional[str] = None) -> None:
+        conn = self.conn
+        with self._lock:
+            conn.execute(
+                "UPDATE runs SET status = ?, error = ?, updated_at = ? WHERE thread_id = ?",
+                (status, error, time.time(), thread_id)
+            )
+            conn.commit()
+
+    def interrupt(self, thread_id: str) -> None:
+        """Mark a run that is still running as interrupted; finished or failed runs keep their status."""
+        conn = self.conn
+        with self._lock:
+            conn.execute(
+                "UPDATE runs SET status = 'interrupted', updated_at = ? WHERE thread_id = ? AND status = 'running'",
+                (time.time(), thread_id)
+            )
+            conn.commit()
+
+    def claim(self, thread_id: str) -> bool:
+        """Mark a run as executing in this process; False when it already is."""
+        with self._lock:
+            if thread_id in self._active:
+                return False
+            self._active.add(thread_id)
+            return True
+
+    def release(self, thread_id: str) -> None:
+        with self._lock:
+            self._active.discard(thread_id)
+
+    def is_active(self, thread_id: str) -> bool:
+        with self._lock:
+            return thread_id in self._active
+
+    def finish(self, thread_id: str) -> None:
+        """Mark a run completed and drop its checkpoints; they are only needed to resume."""
+        self.set_status(thread_id, "completed")
+        self.saver.delete_thread(thread_id)
+
+    def get(self, thread_id: str) -> Optional[RunRecord]:
+        conn = self.conn
+        with self._lock:
+            row = conn.execute(
+                "SELECT thread_id, agent_id, task, max_revisions, with_agent_content, status, error, created_at, updated_at "
+                "FROM runs WHERE thread_id = ?", (thread_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return RunRecord(**dict(zip(RunRecord.model_fields, row)))
+
+    def cleanup(self, max_age: Optional[float] = None) -> List[str]:
+        """Delete runs, and their checkpoints, not updated for `max_age` seconds."""
+        cutoff = time.time() - (self.ttl if max_age is None else max_age)
+        conn = self.conn
+        with self._lock:
+            expired = [row[0] for row in conn.execute("SELECT thread_id FROM runs WHERE updated_at < ?", (cutoff,))]
+        for thread_id in expired:
+            self.saver.delete_thread(thread_id)
+        with self._lock:
+            conn.executemany("DELETE FROM runs WHERE thread_id = ?", [(thread_id,) for thread_id in expired])
+            conn.commit()
+        if expired:
+            logger.info(f"Removed {len(expired)} expired research runs")
+        return expired
+
+# Create a singleton instance
+checkpoints = CheckpointStore()
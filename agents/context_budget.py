@@ -0,0 +1,154 @@
+import os
+import logging
+from typing import Callable, Dict, List, Optional
+from pydantic import BaseModel
+from agents.retrieval import split_sentences
+from agents.tokenizer import tokenizer
+
+logger = logging.getLogger(__name__)
+
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "16000"))  # whole WRITE prompt, including task and plan
+CONTEXT_VERIFIED_SHARE = float(os.getenv("CONTEXT_VERIFIED_SHARE", "0.6"))  # share of the source budget for verified sources
+
+class SectionReport(BaseModel):
+    items: int = 0
+    tokens_in: int = 0
+    tokens_out: int = 0
+    truncated: int = 0
+    dropped: int = 0
+
+class PackedContext(BaseModel):
+    verified: List[str]
+    supplementary: List[str]
+    report: Dict
+
+def item_caps(lengths: List[int], budget: int) -> List[int]:
+    """
+    Per-item token caps that fit `budget` while shortening the largest items first.
+
+    Items smaller than the fair share keep their full length and their unused
+    share is spread over the larger ones, so every item keeps some text.
+    """
+    caps = list(lengths)
+    if sum(lengths) <= budget:
+        return caps
+    remaining_budget = budget
+    remaining = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    while remaining:
+        share = remaining_budget // len(remaining)
+        smallest = remaining[0]
+        if lengths[smallest] > share:
+            for i in remaining:
+                caps[i] = share
+            break
+        remaining_budget -= lengths[smallest]
+        remaining.pop(0)
+    return caps
+
+class ContextBudget:
+    """Owns the token budget of the generation prompt and packs sources into it."""
+
+    def __init__(self, max_tokens: int = CONTEXT_MAX_TOKENS, verified_share: float = CONTEXT_VERIFIED_SHARE,
+                 count_tokens: Optional[Callable[[str], int]] = None):
+        self.max_tokens = max_tokens
+        self.verified_share = verified_share
+        self._count_tokens = count_tokens
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        return self._count_tokens(text) if self._count_tokens else tokenizer.count(text)
+
+    def count_many(self, texts: List[str]) -> List[int]:
+        if self._count_tokens:
+            return [self.count(text) for text in texts]
+        return tokenizer.count_many(texts)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text to at most `max_tokens`, ending on a sentence boundary where possible."""
+        if max_tokens <= 0:
+            return ""
+        if self.count(text) <= max_tokens:
+            return text
+        kept: List[str] = []
+        used = 0
+        for sentence in split_sentences(text):
+            tokens = self.count(sentence) + 1
+            if used + tokens > max_tokens:
+                if not kept:
+                    # A single overlong sentence is cut on word boundaries instead
+                    return self._truncate_words(sentence, max_tokens)
+                break
+            kept.append(sentence)
+            used += tokens
+        return " ".join(kept)
+
+    def _truncate_words(self, text: str, max_tokens: int) -> str:
+        words = text.split()
+        low, high = 0, len(words)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count(" ".join(words[:middle])) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        return " ".join(words[:low])
+
+    def _pack_section(self, items: List[str], counts: List[int], budget: int) -> tuple:
+        caps = item_caps(counts, budget)
+        packed: List[str] = []
+        report = SectionReport(items=len(items), tokens_in=sum(counts))
+        for item, count, cap in zip(items, counts, caps):
+            text = item if count <= cap else self.truncate(item, cap)
+            if not text:
+                report.dropped += 1
+                continue
+            if text is not item:
+                report.truncated += 1
+            packed.append(text)
+            report.tokens_out += count if text is item else self.count(text)
+        return packed, report
+
+    def pack(self, fixed: List[str], verified: List[str], supplementary: List[str]) -> PackedContext:
+        """
+        Fit verified and supplementary sources into what the fixed prompt text leaves free.
+
+        Verified sources get `verified_share` of the source budget and
+        supplementary ones the rest; whatever one side does not need is
+        handed to the other. Oversized items are truncated, not dropped.
+        """
+        # One batched count for every text in the prompt
+        counts = self.count_many(list(fixed) + list(verified) + list(supplementary))
+        fixed_tokens = sum(counts[:len(fixed)])
+        verified_counts = counts[len(fixed):len(fixed) + len(verified)]
+        supplementary_counts = counts[len(fixed) + len(verified):]
+        available = max(0, self.max_tokens - fixed_tokens)
+        verified_need = sum(verified_counts)
+        supplementary_need = sum(supplementary_counts)
+
+        verified_budget = int(available * self.verified_share)
+        supplementary_budget = available - verified_budget
+        if verified_need < verified_budget:
+            supplementary_budget += verified_budget - verified_need
+            verified_budget = verified_need
+        elif supplementary_need < supplementary_budget:
+            verified_budget += supplementary_budget - supplementary_need
+            supplementary_budget = supplementary_need
+
+        packed_verified, verified_report = self._pack_section(verified, verified_counts, verified_budget)
+        packed_supplementary, supplementary_report = self._pack_section(
+            supplementary, supplementary_counts, supplementary_budget
+        )
+        report = {
+            "max_tokens": self.max_tokens,
+            "fixed_tokens": fixed_tokens,
+            "verified": verified_report.model_dump(),
+            "supplementary": supplementary_report.model_dump()
+        }
+        cut = verified_report.tokens_in - verified_report.tokens_out + supplementary_report.tokens_in - supplementary_report.tokens_out
+        if cut:
+            logger.info(f"Context budget cut {cut} source tokens to fit {self.max_tokens}: {report}")
+        return PackedContext(verified=packed_verified, supplementary=packed_supplementary, report=report)
+
+# Create a singleton instance
+context_budget = ContextBudget()
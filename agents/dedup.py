@@ -0,0 +1,92 @@
+import os
+import re
+import zlib
+import hashlib
+import logging
+from typing import Callable, List, Optional, Set, Tuple
+import numpy as np
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.8"))  # similarity at which a snippet counts as redundant
+SHINGLE_WORDS = int(os.getenv("DEDUP_SHINGLE_WORDS", "5"))
+MINHASH_PERMUTATIONS = 128
+
+MERSENNE_PRIME = (1 << 61) - 1
+LABEL = re.compile(r"^\[(Supplementary Source|VERIFIED SOURCE[^\]]*)\]\s*")
+
+_rng = np.random.default_rng(1729)
+_A = _rng.integers(1, 1 << 31, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 31, size=MINHASH_PERMUTATIONS, dtype=np.uint64)
+
+class DedupReport(BaseModel):
+    snippets_in: int = 0
+    exact_duplicates: int = 0
+    near_duplicates: int = 0
+    covered_by_verified: int = 0
+    tokens_saved: int = 0
+
+def normalize(text: str) -> List[str]:
+    return re.findall(r"\w+", LABEL.sub("", text).lower())
+
+def shingles(words: List[str], size: int = SHINGLE_WORDS) -> Set[int]:
+    if len(words) <= size:
+        return {zlib.crc32(" ".join(words).encode())} if words else set()
+    return {zlib.crc32(" ".join(words[i:i + size]).encode()) for i in range(len(words) - size + 1)}
+
+def minhash(shingle_set: Set[int]) -> np.ndarray:
+    """MinHash signature; the share of equal positions estimates Jaccard similarity."""
+    if not shingle_set:
+        return np.full(MINHASH_PERMUTATIONS, MERSENNE_PRIME, dtype=np.uint64)
+    values = np.fromiter(shingle_set, dtype=np.uint64, count=len(shingle_set))
+    return ((np.outer(values, _A) + _B) % MERSENNE_PRIME).min(axis=0)
+
+def similarity(first: str, second: str) -> float:
+    """Jaccard similarity of the word shingles of two texts."""
+    first_shingles, second_shingles = shingles(normalize(first)), shingles(normalize(second))
+    if not first_shingles or not second_shingles:
+        return 0.0
+    return len(first_shingles & second_shingles) / len(first_shingles | second_shingles)
+
+def dedupe(snippets: List[str], verified: Optional[List[str]] = None, threshold: float = DEDUP_THRESHOLD,
+           count_tokens: Optional[Callable[[str], int]] = None) -> Tuple[List[str], DedupReport]:
+    """
+    Drop exact and near-duplicate snippets, keeping the first occurrence.
+
+    A snippet is also dropped when at least `threshold` of its shingles
+    already appear in the verified source text.
+    """
+    count_tokens = count_tokens or (lambda text: len(text.split()))
+    report = DedupReport(snippets_in=len(snippets))
+    verified_shingles: Set[int] = set()
+    for text in verified or []:
+        verified_shingles |= shingles(normalize(text))
+
+    kept: List[str] = []
+    seen: Set[str] = set()
+    signatures: List[np.ndarray] = []
+    for snippet in snippets:
+        words = normalize(snippet)
+        digest = hashlib.sha1(" ".join(words).encode()).hexdigest()
+        if digest in seen:
+            report.exact_duplicates += 1
+            report.tokens_saved += count_tokens(snippet)
+            continue
+        snippet_shingles = shingles(words)
+        if snippet_shingles and len(snippet_shingles & verified_shingles) / len(snippet_shingles) >= threshold:
+            report.covered_by_verified += 1
+            report.tokens_saved += count_tokens(snippet)
+            continue
+        signature = minhash(snippet_shingles)
+        if any(np.mean(signature == other) >= threshold for other in signatures):
+            report.near_duplicates += 1
+            report.tokens_saved += count_tokens(snippet)
+            continue
+        seen.add(digest)
+        signatures.append(signature)
+        kept.append(snippet)
+
+    if len(kept) < len(snippets):
+        logger.info(f"Dropped {len(snippets) - len(kept)} redundant snippets, saving {report.tokens_saved} tokens")
+    return kept, report
@@ -0,0 +1,50 @@
+import logging
+from datetime import datetime
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Bump when extraction or OCR output changes so stale entries stop matching
+EXTRACTOR_VERSION = "2"
+
+class ExtractionCache:
+    """Extracted text and token counts in Mongo, keyed by file hash, extractor version and tokenizer."""
+
+    def __init__(self, tokenizer_name: str):
+        self.tokenizer_name = tokenizer_name
+        self.counters = {"hits": 0, "misses": 0}
+
+    def key(self, sha256: str) -> str:
+        return f"{sha256}:{EXTRACTOR_VERSION}:{self.tokenizer_name}"
+
+    async def get_many(self, db, hashes: List[str]) -> Dict[str, Dict]:
+        """Return cached results for the given file hashes in one query."""
+        keys = {self.key(sha256): sha256 for sha256 in set(hashes)}
+        found = {}
+        try:
+            async for doc in db.extraction_cache.find({"_id": {"$in": list(keys)}}, {"content": 1, "token_count": 1}):
+                found[keys[doc["_id"]]] = {"content": doc["content"], "token_count": doc["token_count"]}
+        except Exception as e:
+            logger.warning(f"Extraction cache lookup failed: {e}")
+        self.counters["hits"] += len(found)
+        self.counters["misses"] += len(keys) - len(found)
+        return found
+
+    async def put(self, db, sha256: str, result: Dict) -> None:
+        try:
+            await db.extraction_cache.replace_one(
+                {"_id": self.key(sha256)},
+                {
+                    "content": result["content"],
+                    "token_count": result["token_count"],
+                    "created_at": datetime.utcnow()
+                },
+                upsert=True
+            )
+        except Exception as e:
+            # Caching is best effort; e.g. documents over Mongo's size limit are simply not cached
+            logger.warning(f"Could not cache extraction of {sha256}: {e}")
+
+    def stats(self) -> Dict:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {**self.counters, "hit_rate": self.counters["hits"] / lookups if lookups else 0.0}
@@ -0,0 +1,75 @@
+import os
+import time
+import sqlite3
+import logging
+import tempfile
+from threading import Lock
+from typing import Optional
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+WEBSITE_FETCH_DB = os.getenv("WEBSITE_FETCH_DB", os.path.join(tempfile.gettempdir(), "research_agent_fetch_records.sqlite"))
+
+class FetchRecord(BaseModel):
+    url: str
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    content_hash: str
+    text: str
+    token_count: int
+    token_method: str
+    fetched_at: float = 0.0
+
+class FetchRecordStore:
+    """Last successful fetch of each URL, used to revalidate pages instead of re-parsing them."""
+
+    def __init__(self, path: Optional[str] = WEBSITE_FETCH_DB):
+        self.path = path
+        self._lock = Lock()
+        self._conn = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            try:
+                self._conn = sqlite3.connect(self.path or ":memory:", check_same_thread=False)
+            except sqlite3.Error as e:
+                logger.error(f"Fetch records kept in memory only ({self.path}): {e}")
+                self._conn = sqlite3.connect(":memory:", check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS fetch_records ("
+                "url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, content_hash TEXT NOT NULL, "
+                "text TEXT NOT NULL, token_count INTEGER NOT NULL, token_method TEXT NOT NULL, fetched_at REAL NOT NULL)"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def get(self, url: str) -> Optional[FetchRecord]:
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT url, etag, last_modified, content_hash, text, token_count, token_method, fetched_at "
+                "FROM fetch_records WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        return FetchRecord(**dict(zip(FetchRecord.model_fields, row)))
+
+    def put(self, record: FetchRecord) -> None:
+        record.fetched_at = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO fetch_records "
+                "(url, etag, last_modified, content_hash, text, token_count, token_method, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                tuple(record.model_dump().values())
+            )
+            self.conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self.conn.execute("DELETE FROM fetch_records")
+            self.conn.commit()
+
+# Create a singleton instance
+fetch_records = FetchRecordStore()
@@ -1,34 +1,102 @@
 import os
+import time
+import asyncio
 import logging
+import weakref
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
-from typing import Optional, Dict, List
-from openai import OpenAI
-from unstructured.partition.auto import partition
-import tiktoken  # for OpenAI-style tokenization
-import nltk  # for general purpose tokenization
-from PIL import Image
-import pytesseract
-import pdf2image  # for converting PDF pages to images
-from fastapi import UploadFile
+from typing import Optional, Dict, List, Iterator
+from agents.uploads import SpooledUpload
+from agents.extraction_cache import ExtractionCache
+from agents.tokenizer import tokenizer, count_words, TOKENIZER_NAME
+from agents.metrics import collect_timings, record, timed
 from motor.motor_asyncio import AsyncIOMotorClient
-from bson import ObjectId
-nltk.download('punkt')  # Download required NLTK data
+# unstructured, PIL, pytesseract and pdf2image are imported where they are used: they are
+# slow to import and only the extraction worker processes need them
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# OpenAI setup
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
 MAX_TOKENS = 120_000
+FILE_WORKERS = int(os.getenv("FILE_WORKERS", str(os.cpu_count() or 1)))  # extraction processes
+FILE_TIMEOUT = float(os.getenv("FILE_TIMEOUT", "300"))  # seconds allowed per file
+# Per extraction process: FILE_WORKERS processes each run this many tesseract calls at once
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(max(1, (os.cpu_count() or 1) // max(1, FILE_WORKERS)))))
+OCR_PAGE_WINDOW = int(os.getenv("OCR_PAGE_WINDOW", "4"))  # pages rasterized at once per file
+OCR_DPI = int(os.getenv("OCR_DPI", "200"))
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff'}
+
+def extract_file(file_path: str) -> Optional[Dict]:
+    """Extract and count one file; runs inside the extraction worker processes."""
+    with collect_timings() as timings:
+        text = file_processor.extract_document(file_path)
+    if text is None:
+        return None
+    return {
+        "content": text,
+        "token_count": file_processor.tokenize_text(text)["token_count"],
+        # Tells the parent which service to book the pool call under
+        "extractor": "ocr" if "ocr" in timings.report() else "partition"
+    }
+
+def ocr_image(image) -> str:
+    import pytesseract
+    with timed("ocr", "page"):
+        return pytesseract.image_to_string(image)
 
 class FileProcessor:
     def __init__(self):
         self.supported_formats = {"pdf", "docx", "doc", "xlsx", "xls", "ppt", "pptx"}
-        self.tokenizer = tiktoken.get_encoding("cl100k_base")  # Default GPT-4 tokenizer
         self.total_tokens = 0
         self.db = None
+        self.extraction_cache = ExtractionCache(TOKENIZER_NAME)
+        self.max_workers = FILE_WORKERS
+        self._executor = None
+        self._slots = None
+        self._slots_loop = None
+        # Pools torn down after a timeout; jobs they break are retried once on the new pool
+        self._recycled = weakref.WeakSet()
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        """
+        Process pool for extraction, created on first use.
+
+        Workers start from a forkserver rather than forking the server, so they
+        do not inherit its event loop, threads or held locks.
+        """
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("forkserver")
+            )
+        return self._executor
+
+    @property
+    def slots(self) -> asyncio.Semaphore:
+        """One slot per pool worker on the running event loop, so FILE_TIMEOUT only counts time spent running."""
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.max_workers)
+            self._slots_loop = loop
+        return self._slots
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _recycle_executor(self, executor) -> None:
+        """Replace the pool and kill its workers, so a hung extraction stops holding a slot."""
+        if self._executor is executor:
+            self._executor = None
+        self._recycled.add(executor)
+        processes = list((getattr(executor, "_processes", None) or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        for process in processes:
+            process.kill()
 
     async def init_db(self, mongodb_url: str = "mongodb://localhost:27017"):
         """Initialize database connection"""
@@ -41,65 +109,113 @@ class FileProcessor:
             logger.error(f"MongoDB connection error: {e}")
             raise
 
-    async def process_files(self, agent_id: str, files: List[UploadFile]) -> None:
-        """Process files and update the database"""
+    async def _extract_in_pool(self, index: int, file_path: str, filename: str):
+        """Run extract_file in the process pool, isolating failures and timeouts to this file."""
+        async with self.slots:
+            return await self._run_in_pool(index, file_path, filename, retry=True)
+
+    async def _run_in_pool(self, index: int, file_path: str, filename: str, retry: bool):
+        executor = self.executor
+        extension = os.path.splitext(file_path)[1].lower()
+        # Timed here as well as in the worker: worker samples only reach /metrics in multiprocess mode
+        started = time.perf_counter()
+        service = "ocr" if extension in IMAGE_EXTENSIONS else "partition"
+        result = None
+        try:
+            future = executor.submit(extract_file, file_path)
+            result = await asyncio.wait_for(asyncio.wrap_future(future), FILE_TIMEOUT)
+            if result is not None:
+                service = result.pop("extractor", service)
+            return index, result
+        except asyncio.TimeoutError:
+            # Cancelling the wait does not stop the worker; kill the pool so later uploads get free slots
+            logger.error(f"Extraction of {filename} timed out after {FILE_TIMEOUT}s, restarting the extraction pool")
+            self._recycle_executor(executor)
+        except asyncio.CancelledError:
+            # Jobs still queued when another file's timeout tore the pool down are cancelled with it
+            if executor not in self._recycled or asyncio.current_task().cancelling():
+                raise
+            if retry:
+                return await self._run_in_pool(index, file_path, filename, retry=False)
+        except BrokenProcessPool as e:
+            if retry and executor in self._recycled:
+                # Killed along with another file's hung extraction, not by this file
+                return await self._run_in_pool(index, file_path, filename, retry=False)
+            # A crashed worker breaks the whole pool; start a fresh one for later requests
+            logger.error(f"Extraction worker crashed on {filename}: {e}")
+            if self._executor is executor:
+                self._executor = None
+        except Exception as e:
+            logger.error(f"Failed to extract text from {filename}: {e}")
+        finally:
+            record(service, extension.lstrip(".") or "unknown", time.perf_counter() - started,
+                   error=result is None, worker=True)
+        return index, None
+
+    async def extract_files(self, files: List[SpooledUpload], existing_tokens: int = 0) -> List[Dict]:
+        """
+        Extract and count spooled uploads, returning file documents.
+
+        Files that would take the total past MAX_TOKENS (counting
+        `existing_tokens` already stored for the agent) are skipped.
+        """
         if self.db is None:
             await self.init_db()
 
         processed_files = []
-        self.total_tokens = 0
+        # Local: concurrent uploads must not share a running total across the awaits below
+        total_tokens = existing_tokens
 
         try:
-            for file in files:
-                # Save file temporarily to process with unstructured
-                temp_path = f"/tmp/{file.filename}"
-                try:
-                    contents = await file.read()
-                    with open(temp_path, "wb") as temp_file:
-                        temp_file.write(contents)
-                    
-                    # Extract text using unstructured
-                    extracted_text = self.extract_text(temp_path)
-                    if extracted_text is None:
-                        logger.error(f"Failed to extract text from {file.filename}")
-                        continue
-
-                    # Tokenize the extracted text
-                    tokenization_info = self.tokenize_text(extracted_text)
-                    new_tokens = tokenization_info["token_count"]
-
-                    # Check token limit
-                    if self.total_tokens + new_tokens > MAX_TOKENS:
-                        logger.warning(f"Skipping {file.filename} as it would exceed token limit")
-                        continue
-
-                    self.total_tokens += new_tokens
-
-                    # Prepare file document
-                    file_doc = {
-                        "filename": file.filename,
-                        "content_type": file.content_type,
-                        "content": {
-                            "content": extracted_text,
-                            "tokens": tokenization_info["tokens"],
-                            "token_count": tokenization_info["token_count"]
-                        },
-                        "processed_at": datetime.utcnow()
-                    }
-                    processed_files.append(file_doc)
+            # Identical bytes are extracted at most once: reuse cached results, then
+            # extract one copy of each remaining file in parallel
+            results_by_hash = await self.extraction_cache.get_many(self.db, [file.sha256 for file in files])
+            to_extract = {}
+            for index, file in enumerate(files):
+                if file.sha256 in results_by_hash:
+                    logger.info(f"Reusing cached extraction of {file.filename}")
+                elif file.sha256 not in to_extract:
+                    to_extract[file.sha256] = index
 
-                finally:
-                    # Clean up temp file
-                    if os.path.exists(temp_path):
-                        os.remove(temp_path)
-
-            # Update database with all processed files
-            if processed_files:
-                await self.db.agents.update_one(
-                    {"_id": ObjectId(agent_id)},
-                    {"$set": {"files": processed_files}}  # Changed from $push to $set
-                )
-                logger.info(f"Successfully processed and stored {len(processed_files)} files")
+            extractions = [self._extract_in_pool(index, files[index].path, files[index].filename) for index in to_extract.values()]
+            for extraction in asyncio.as_completed(extractions):
+                index, result = await extraction
+                results_by_hash[files[index].sha256] = result
+                if result is not None:
+                    logger.info(f"Extracted {files[index].filename} ({result['token_count']} tokens)")
+                # Empty text may come from a missing OCR binary or a transient failure; retry it next time
+                if result is not None and result["content"].strip():
+                    await self.extraction_cache.put(self.db, files[index].sha256, result)
+            results = [results_by_hash.get(file.sha256) for file in files]
+
+            # Apply the token limit in upload order so the outcome does not depend on timing
+            for file, result in zip(files, results):
+                if result is None:
+                    logger.error(f"Failed to extract text from {file.filename}")
+                    continue
+
+                new_tokens = result["token_count"]
+
+                # Check token limit
+                if total_tokens + new_tokens > MAX_TOKENS:
+                    logger.warning(f"Skipping {file.filename} as it would exceed token limit")
+                    continue
+
+                total_tokens += new_tokens
+
+                # Prepare file document
+                file_doc = {
+                    "filename": file.filename,
+                    "content_type": file.content_type,
+                    "sha256": file.sha256,
+                    "size": file.size,
+                    "content": result,
+                    "processed_at": datetime.utcnow()
+                }
+                processed_files.append(file_doc)
+
+            logger.info(f"Successfully processed {len(processed_files)} files")
+            return processed_files
 
         except Exception as e:
             logger.error(f"Error processing files: {e}")
@@ -108,7 +224,9 @@ class FileProcessor:
     def extract_text(self, file_path: str) -> Optional[str]:
         """Extract text from a given file."""
         try:
-            elements = partition(filename=file_path)
+            from unstructured.partition.auto import partition
+            with timed("partition", os.path.splitext(file_path)[1].lstrip(".").lower() or "unknown"):
+                elements = partition(filename=file_path)
             return "\n".join([str(element) for element in elements])
         except Exception as e:
             logger.error(f"Error extracting text from {file_path}: {str(e)}")
@@ -123,29 +241,21 @@ class FileProcessor:
             method: 'openai' for tiktoken or 'nltk' for basic tokenization
         
         Returns:
-            Dictionary containing tokens and token count
+            Dictionary containing the token count; token lists are not kept
         """
         if not text:
-            return {"tokens": [], "token_count": 0}
+            return {"token_count": 0}
 
         try:
             if method == "openai":
-                tokens = self.tokenizer.encode(text)
-                return {
-                    "tokens": tokens,
-                    "token_count": len(tokens)
-                }
+                return {"token_count": tokenizer.count(text)}
             elif method == "nltk":
-                tokens = nltk.word_tokenize(text)
-                return {
-                    "tokens": tokens,
-                    "token_count": len(tokens)
-                }
+                return {"token_count": count_words(text)}
             else:
                 raise ValueError("Unsupported tokenization method")
         except Exception as e:
             logger.error(f"Tokenization error: {e}")
-            return {"tokens": [], "token_count": 0}
+            return {"token_count": 0}
 
     def check_token_limit(self, new_tokens: int) -> bool:
         """Check if adding new tokens would exceed the limit"""
@@ -153,47 +263,83 @@ class FileProcessor:
             raise ValueError(f"Adding this content would exceed the maximum token limit of {MAX_TOKENS}")
         return True
 
-    def extract_text_from_image(self, image_path: str) -> str:
-        """Extract text from image using OCR"""
+    def extract_text_from_image(self, image_path: str) -> Optional[str]:
+        """Extract text from image using OCR; None when OCR fails"""
         try:
+            from PIL import Image
             image = Image.open(image_path)
-            return pytesseract.image_to_string(image)
+            return ocr_image(image)
         except Exception as e:
             logger.error(f"OCR failed for image {image_path}: {str(e)}")
-            return ""
+            return None
 
-    def extract_text_from_pdf_with_ocr(self, pdf_path: str) -> str:
-        """Extract text from PDF using OCR if needed"""
+    def iter_pdf_ocr_pages(self, pdf_path: str, window: int = OCR_PAGE_WINDOW,
+                           workers: int = OCR_WORKERS) -> Iterator[str]:
+        """
+        OCR a PDF page by page, yielding text in page order.
+
+        Only `window` pages are rasterized at a time, so peak memory does not
+        grow with the page count; the pages of a window are OCR'd in parallel.
+        Closing the iterator stops rasterizing the remaining pages.
+        """
+        import pdf2image  # for converting PDF pages to images
+        page_count = pdf2image.pdfinfo_from_path(pdf_path)["Pages"]
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ocr") as pool:
+            for first_page in range(1, page_count + 1, window):
+                last_page = min(first_page + window - 1, page_count)
+                with timed("ocr", "rasterize"):
+                    images = pdf2image.convert_from_path(
+                        pdf_path, dpi=OCR_DPI, first_page=first_page, last_page=last_page
+                    )
+                try:
+                    # pytesseract runs tesseract in a subprocess, so threads use several cores
+                    for text in pool.map(ocr_image, images):
+                        yield text
+                finally:
+                    for image in images:
+                        image.close()
+
+    def extract_text_from_pdf_with_ocr(self, pdf_path: str, max_tokens: int = MAX_TOKENS) -> Optional[str]:
+        """Extract text from PDF using OCR if needed; None when OCR fails"""
         try:
             # First try normal text extraction
             text = self.extract_text(pdf_path)
-            if text.strip():
+            if text and text.strip():
                 return text
             
-            # If no text found, try OCR
-            pages = pdf2image.convert_from_path(pdf_path)
+            # If no text found, OCR page by page until the token budget is used up
             text_parts = []
-            for page in pages:
-                text_parts.append(pytesseract.image_to_string(page))
+            total_tokens = 0
+            pages = self.iter_pdf_ocr_pages(pdf_path)
+            try:
+                for page_text in pages:
+                    text_parts.append(page_text)
+                    total_tokens += self.tokenize_text(page_text)["token_count"]
+                    if total_tokens >= max_tokens:
+                        logger.info(f"Stopped OCR of {pdf_path} after {len(text_parts)} pages: token budget reached")
+                        break
+            finally:
+                pages.close()
             return "\n".join(text_parts)
         except Exception as e:
             logger.error(f"PDF OCR failed for {pdf_path}: {str(e)}")
-            return ""
+            return None
+
+    def extract_document(self, file_path: str) -> Optional[str]:
+        """Extract text using the method suited to the file type."""
+        ext = os.path.splitext(file_path)[1].lower()
+        if ext in IMAGE_EXTENSIONS:
+            return self.extract_text_from_image(file_path)
+        elif ext == '.pdf':
+            return self.extract_text_from_pdf_with_ocr(file_path)
+        return self.extract_text(file_path)
 
     def process_file(self, file_path: str, tokenize_method: str = "openai") -> Optional[Dict]:
         """Process a file and return its content with tokenization."""
         # Reset total tokens for new file processing
         self.total_tokens = 0
         
-        # Determine file type and extract text
-        ext = os.path.splitext(file_path)[1].lower()
-        if ext in {'.jpg', '.jpeg', '.png', '.bmp', '.tiff'}:
-            text = self.extract_text_from_image(file_path)
-        elif ext == '.pdf':
-            text = self.extract_text_from_pdf_with_ocr(file_path)
-        else:
-            text = self.extract_text(file_path)
-
+        text = self.extract_document(file_path)
         if text is None:
             return None
 
@@ -207,7 +353,6 @@ class FileProcessor:
             "filename": os.path.basename(file_path),
             "content": {
                 "content": text,
-                "tokens": tokenization_info["tokens"],
                 "token_count": tokenization_info["token_count"]
             },
             "timestamp": datetime.now().isoformat()
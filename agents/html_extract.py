@@ -0,0 +1,96 @@
+import os
+import re
+import logging
+from typing import Callable, Dict, Optional
+from bs4 import BeautifulSoup
+import lxml.html
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+HTML_EXTRACTOR = os.getenv("HTML_EXTRACTOR", "bs4")  # "bs4" or "lxml"
+
+REMOVED_TAGS = ('script', 'style', 'nav', 'footer', 'iframe')
+TEXT_TAGS = ('h1', 'h2', 'h3', 'p')
+TEXT_TAG_PATTERN = re.compile(r"<(/?)(%s)\b" % "|".join(TEXT_TAGS), re.IGNORECASE)
+
+def soup_text(html: str) -> str:
+    """Headings and paragraphs via BeautifulSoup's pure-Python html.parser (reference backend)."""
+    # Parse HTML
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    # Remove unwanted elements
+    for element in soup.find_all(list(REMOVED_TAGS)):
+        element.decompose()
+    
+    # Extract text from relevant tags
+    content = []
+    for tag in soup.find_all(list(TEXT_TAGS)):
+        text = tag.get_text(strip=True)
+        if text:
+            content.append(text)
+    
+    return " ".join(content)
+
+def nests_differently(html: str, parser) -> bool:
+    """
+    True when libxml2 and html.parser put different text inside the page's headings or paragraphs.
+
+    libxml2 ends an open heading or paragraph at the next block element, as
+    browsers do, and moves that block and the text after it out of the tag.
+    html.parser keeps the tag open until its end tag, or the end of the page,
+    so all of that text belongs to it. The trees differ when a text tag is
+    never closed, or is closed after libxml2 already closed it.
+    """
+    if any(error.type_name == "ERR_TAG_NAME_MISMATCH" and error.message.rsplit(" ", 1)[-1] in TEXT_TAGS
+           for error in parser.error_log):
+        return True
+    open_tags = dict.fromkeys(TEXT_TAGS, 0)
+    for closing, tag in TEXT_TAG_PATTERN.findall(html):
+        open_tags[tag.lower()] += -1 if closing else 1
+    return any(count > 0 for count in open_tags.values())
+
+def lxml_text(html: str) -> str:
+    """
+    Headings and paragraphs via libxml2.
+
+    Same selection and whitespace handling as soup_text: removed elements
+    keep their tail text, comments are skipped and every text node is
+    stripped before joining. Pages whose headings or paragraphs libxml2
+    would nest differently are read by soup_text instead.
+    """
+    parser = lxml.html.HTMLParser()
+    try:
+        root = lxml.html.document_fromstring(html, parser=parser)
+    except ValueError:
+        # Strings carrying an XML encoding declaration must be parsed as bytes
+        parser = lxml.html.HTMLParser(encoding='utf-8')
+        root = lxml.html.document_fromstring(html.encode('utf-8'), parser=parser)
+    except etree.ParserError:
+        return ""
+    if nests_differently(html, parser):
+        return soup_text(html)
+    etree.strip_elements(root, *REMOVED_TAGS, with_tail=False)
+
+    content = []
+    for tag in root.iter(*TEXT_TAGS):
+        text = "".join(piece.strip() for piece in tag.itertext())
+        if text:
+            content.append(text)
+    return " ".join(content)
+
+EXTRACTORS: Dict[str, Callable[[str], str]] = {
+    "bs4": soup_text,
+    "lxml": lxml_text,
+}
+
+def get_extractor(name: Optional[str] = None) -> Callable[[str], str]:
+    name = name or HTML_EXTRACTOR
+    try:
+        return EXTRACTORS[name]
+    except KeyError:
+        raise ValueError(f"Unknown HTML extractor {name!r}; choose one of {sorted(EXTRACTORS)}")
+
+def html_to_text(html: str, backend: Optional[str] = None) -> str:
+    """Headings and paragraphs of an HTML page, without scripts, navigation and footers."""
+    return get_extractor(backend)(html)
@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import tempfile
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, Optional, Sequence
+from langchain_core.caches import BaseCache
+from langchain_core.messages import message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, Generation
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "memory")  # "memory" or "sqlite"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", os.path.join(tempfile.gettempdir(), "research_agent_llm_cache.sqlite"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))  # seconds
+LLM_CACHE_ENTRIES = int(os.getenv("LLM_CACHE_ENTRIES", "2048"))
+# Graph nodes whose model calls are memoized, e.g. "plan,reflect,research_plan,research_critique"
+LLM_CACHE_NODES = {node.strip() for node in os.getenv("LLM_CACHE_NODES", "").split(",") if node.strip()}
+
+class MemoryBackend:
+    """In-process LRU backend; values are kept as live objects."""
+
+    def __init__(self, max_entries: int = LLM_CACHE_ENTRIES, ttl: float = LLM_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self.entries[key] = (time.time() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self.entries.clear()
+
+class SqliteBackend:
+    """On-disk backend; values are stored as JSON-serialized generations."""
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_entries: int = LLM_CACHE_ENTRIES, ttl: float = LLM_CACHE_TTL):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used)")
+        self.conn.commit()
+
+    def get(self, key: str) -> Optional[Any]:
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute("SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                self.conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self.conn.commit()
+                return None
+            self.conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+        return load_generations(row[0])
+
+    def set(self, key: str, value: Any) -> None:
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, dump_generations(value), now + self.ttl, now)
+            )
+            self.conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+            count = self.conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+            if count > self.max_entries:
+                self.conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN (SELECT key FROM llm_cache ORDER BY last_used ASC LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            self.conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self.conn.execute("DELETE FROM llm_cache")
+            self.conn.commit()
+
+def _jsonable(value: Any) -> Any:
+    # Structured-output responses carry the parsed pydantic object in additional_kwargs
+    if isinstance(value, BaseModel):
+        return value.model_dump()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dump_generations(generations: Sequence[Generation]) -> str:
+    payload = []
+    for generation in generations:
+        if isinstance(generation, ChatGeneration):
+            payload.append({"message": message_to_dict(generation.message), "info": generation.generation_info})
+        else:
+            payload.append({"text": generation.text, "info": generation.generation_info})
+    return json.dumps(payload, default=_jsonable)
+
+def load_generations(value: str) -> list:
+    generations = []
+    for item in json.loads(value):
+        if "message" in item:
+            message = messages_from_dict([item["message"]])[0]
+            generations.append(ChatGeneration(message=message, generation_info=item["info"]))
+        else:
+            generations.append(Generation(text=item["text"], generation_info=item["info"]))
+    return generations
+
+class LLMResponseCache(BaseCache):
+    """
+    LangChain cache keyed on a hash of the model configuration and prompt.
+
+    LangChain passes the serialized message list as `prompt` and the model
+    name, call parameters and any bound output schema as `llm_string`, so
+    the hash covers everything that determines a temperature-0 response.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.counters = {"hits": 0, "misses": 0}
+
+    @staticmethod
+    def key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode()).hexdigest()
+
+    def lookup(self, prompt: str, llm_string: str):
+        value = self.backend.get(self.key(prompt, llm_string))
+        self.counters["hits" if value is not None else "misses"] += 1
+        return value
+
+    def update(self, prompt: str, llm_string: str, return_val) -> None:
+        self.backend.set(self.key(prompt, llm_string), return_val)
+
+    def clear(self, **kwargs) -> None:
+        self.backend.clear()
+
+    def stats(self) -> Dict:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {**self.counters, "hit_rate": self.counters["hits"] / lookups if lookups else 0.0}
+
+def create_backend(kind: str = LLM_CACHE_BACKEND):
+    if kind == "sqlite":
+        try:
+            return SqliteBackend()
+        except sqlite3.Error as e:
+            logger.error(f"Falling back to in-memory LLM cache, cannot open {LLM_CACHE_PATH}: {e}")
+    elif kind != "memory":
+        raise ValueError(f"Unsupported LLM cache backend: {kind}")
+    return MemoryBackend()
+
+def with_cache(model, node: str, enabled_nodes=None):
+    """
+    Return `model` with response caching turned on when `node` is enabled.
+
+    Only deterministic (temperature 0) models are cached.
+    """
+    enabled_nodes = LLM_CACHE_NODES if enabled_nodes is None else enabled_nodes
+    if node not in enabled_nodes or getattr(model, "temperature", None) != 0:
+        return model
+    return model.model_copy(update={"cache": llm_cache})
+
+# Create a singleton instance
+llm_cache = LLMResponseCache(create_backend())
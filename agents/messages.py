@@ -0,0 +1,75 @@
+import os
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+
+logger = logging.getLogger(__name__)
+
+MESSAGES_PAGE_SIZE = int(os.getenv("MESSAGES_PAGE_SIZE", "20"))
+MESSAGES_MAX_PAGE_SIZE = 100
+
+def public_message(doc: Dict) -> Dict:
+    """Message document as returned by the API."""
+    doc = dict(doc)
+    doc["_id"] = str(doc["_id"])
+    doc["agent_id"] = str(doc["agent_id"])
+    return doc
+
+class MessageStore:
+    """Research queries and essays stored one document per message in the `messages` collection."""
+
+    def __init__(self, db=None):
+        self.db = db
+
+    async def ensure_indexes(self) -> None:
+        await self.db.messages.create_index(
+            [("agent_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)]
+        )
+
+    async def add(self, agent_id: str, query: str, response: str, timestamp: Optional[datetime] = None) -> Dict:
+        doc = {
+            "agent_id": ObjectId(agent_id),
+            "query": query,
+            "response": response,
+            "timestamp": timestamp or datetime.utcnow()
+        }
+        result = await self.db.messages.insert_one(doc)
+        doc["_id"] = result.inserted_id
+        return doc
+
+    async def page(self, agent_id: str, limit: int = MESSAGES_PAGE_SIZE,
+                   before: Optional[str] = None) -> Tuple[List[Dict], Optional[str]]:
+        """
+        Newest messages first, `limit` at a time.
+
+        `before` is the id of the last message of the previous page; the
+        returned cursor is None once there are no older messages.
+        """
+        limit = max(1, min(limit, MESSAGES_MAX_PAGE_SIZE))
+        query = {"agent_id": ObjectId(agent_id)}
+        if before:
+            if not ObjectId.is_valid(before):
+                raise ValueError(f"Invalid message cursor: {before}")
+            anchor = await self.db.messages.find_one(
+                {"_id": ObjectId(before), "agent_id": query["agent_id"]}, {"timestamp": 1}
+            )
+            if anchor is None:
+                raise ValueError(f"Unknown message cursor: {before}")
+            query["$or"] = [
+                {"timestamp": {"$lt": anchor["timestamp"]}},
+                {"timestamp": anchor["timestamp"], "_id": {"$lt": anchor["_id"]}}
+            ]
+        cursor = self.db.messages.find(query).sort(
+            [("timestamp", DESCENDING), ("_id", DESCENDING)]
+        ).limit(limit + 1)
+        messages = [doc async for doc in cursor]
+        next_before = str(messages[limit - 1]["_id"]) if len(messages) > limit else None
+        return messages[:limit], next_before
+
+    async def delete_agent(self, agent_id: str) -> None:
+        await self.db.messages.delete_many({"agent_id": ObjectId(agent_id)})
+
+# Create a singleton instance
+message_store = MessageStore()
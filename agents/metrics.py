@@ -0,0 +1,189 @@
+import os
+import time
+import logging
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from threading import Lock
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from langchain_core.callbacks import BaseCallbackHandler
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily
+from pymongo import monitoring
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+NODE_SECONDS = Histogram(
+    "research_node_seconds", "Wall time of research graph nodes", ["node"], buckets=LATENCY_BUCKETS
+)
+EXTERNAL_SECONDS = Histogram(
+    "external_call_seconds", "Wall time of calls to models, search, Mongo, websites, OCR and partitioning",
+    ["service", "operation"], buckets=LATENCY_BUCKETS
+)
+EXTERNAL_ERRORS = Counter("external_call_errors_total", "Failed external calls", ["service", "operation"])
+LLM_TOKENS = Counter("llm_tokens_total", "Model tokens by graph node", ["node", "kind"])
+RESEARCH_STOPS = Counter("research_stops_total", "Finished research runs by the reason they stopped revising", ["reason"])
+DEDUP_TOKENS_SAVED = Counter("research_dedup_tokens_saved_total", "Prompt tokens saved by dropping repeated search snippets")
+REVISIONS_SKIPPED = Counter("research_revisions_skipped_total", "Revisions not written because a run stopped early")
+
+class Timings:
+    """Per-request wall time totals, added to from any thread of the request."""
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+        self._lock = Lock()
+
+    def add(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.seconds[name] = self.seconds.get(name, 0.0) + seconds
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    def report(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {
+                name: {"seconds": round(seconds, 4), "calls": self.calls[name]}
+                for name, seconds in sorted(self.seconds.items(), key=lambda item: -item[1])
+            }
+
+_timings: ContextVar[Optional[Timings]] = ContextVar("request_timings", default=None)
+
+@contextmanager
+def collect_timings() -> Iterator[Timings]:
+    """Collect a timing breakdown of everything timed in this context (and contexts copied from it)."""
+    timings = Timings()
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+def record(service: str, operation: str, seconds: float, error: bool = False, worker: bool = False) -> None:
+    """
+    Add one call to external_call_seconds and the current request's breakdown.
+
+    `worker` marks a call timed from the parent around a worker-pool job. In
+    multiprocess mode the worker's own samples already reach /metrics, so
+    only the request breakdown is updated then.
+    """
+    if not (worker and os.getenv("PROMETHEUS_MULTIPROC_DIR")):
+        EXTERNAL_SECONDS.labels(service, operation).observe(seconds)
+        if error:
+            EXTERNAL_ERRORS.labels(service, operation).inc()
+    timings = _timings.get()
+    if timings is not None:
+        timings.add(service, seconds)
+
+@contextmanager
+def timed(service: str, operation: str, worker: bool = False) -> Iterator[None]:
+    """Time an external call into external_call_seconds and the current request's breakdown."""
+    started = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        record(service, operation, time.perf_counter() - started, error, worker)
+
+def instrument_node(name: str, node: Callable) -> Callable:
+    """Wrap a graph node so its wall time lands in research_node_seconds."""
+    @functools.wraps(node)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return node(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - started
+            NODE_SECONDS.labels(name).observe(seconds)
+            timings = _timings.get()
+            if timings is not None:
+                timings.add(f"node:{name}", seconds)
+    return wrapper
+
+class LLMMetricsCallback(BaseCallbackHandler):
+    """Records model call latency and prompt/completion tokens per graph node."""
+
+    def __init__(self):
+        self._started: Dict[Any, tuple] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs) -> None:
+        self._started[run_id] = (time.perf_counter(), (metadata or {}).get("langgraph_node", "unknown"))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, metadata=None, **kwargs) -> None:
+        self.on_chat_model_start(serialized, prompts, run_id=run_id, metadata=metadata)
+
+    def _finish(self, run_id, error: bool = False) -> Optional[str]:
+        started = self._started.pop(run_id, None)
+        if started is None:
+            return None
+        record("llm", started[1], time.perf_counter() - started[0], error)
+        return started[1]
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        node = self._finish(run_id)
+        if node is None:
+            return
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    LLM_TOKENS.labels(node, "prompt").inc(usage.get("input_tokens", 0))
+                    LLM_TOKENS.labels(node, "completion").inc(usage.get("output_tokens", 0))
+
+    def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        self._finish(run_id, error=True)
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every Mongo command through pymongo's command monitoring."""
+
+    def started(self, event) -> None:
+        pass
+
+    def succeeded(self, event) -> None:
+        record("mongo", event.command_name, event.duration_micros / 1e6)
+
+    def failed(self, event) -> None:
+        record("mongo", event.command_name, event.duration_micros / 1e6, error=True)
+
+class CacheCollector:
+    """Exports the hit/miss counters the caches already keep, read only when /metrics is scraped."""
+
+    def __init__(self, caches: Dict[str, Callable[[], Dict]]):
+        self.caches = caches
+
+    def collect(self):
+        hits = CounterMetricFamily("cache_hits", "Cache hits", labels=["cache"])
+        misses = CounterMetricFamily("cache_misses", "Cache misses", labels=["cache"])
+        for name, stats in self.caches.items():
+            counters = stats()
+            hits.add_metric([name], counters.get("hits", counters.get("memory_hits", 0) + counters.get("disk_hits", 0)))
+            misses.add_metric([name], counters.get("misses", 0))
+        yield hits
+        yield misses
+
+llm_metrics = LLMMetricsCallback()
+_collectors: List[CacheCollector] = []
+
+def register_mongo_metrics() -> None:
+    """Register the Mongo listener; must run before the Mongo client is created."""
+    monitoring.register(MongoCommandMetrics())
+
+def register_cache_metrics(caches: Dict[str, Callable[[], Dict]]) -> None:
+    collector = CacheCollector(caches)
+    _collectors.append(collector)
+    REGISTRY.register(collector)
+
+def metrics_payload() -> tuple:
+    """Prometheus text exposition and its content type, merging worker processes when configured."""
+    registry = REGISTRY
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        for collector in _collectors:
+            registry.register(collector)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,241 @@
+import os
+import re
+import json
+import hashlib
+import logging
+import tempfile
+from collections import Counter, OrderedDict
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+# Words too common to help BM25 rank chunks
+STOPWORDS = frozenset("""
+a an the about as at by for from in into of on to with am are be been is was were
+""".split())
+
+CHUNK_WORDS = int(os.getenv("RETRIEVAL_CHUNK_WORDS", "200"))
+CHUNK_OVERLAP_WORDS = int(os.getenv("RETRIEVAL_CHUNK_OVERLAP_WORDS", "40"))
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "8"))
+INDEX_DIR = os.getenv("RETRIEVAL_INDEX_DIR", os.path.join(tempfile.gettempdir(), "research_agent_indexes"))
+INDEX_MEMORY_ENTRIES = int(os.getenv("RETRIEVAL_INDEX_MEMORY_ENTRIES", "32"))
+INDEX_DISK_ENTRIES = int(os.getenv("RETRIEVAL_INDEX_DISK_ENTRIES", "256"))  # least recently used indexes beyond this are deleted
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n+")
+
+def agent_sources(agent_db: Optional[Dict]) -> List[Tuple[str, str]]:
+    """Return (label, text) pairs for an agent's files and websites."""
+    sources = []
+    if not agent_db:
+        return sources
+    for file in agent_db.get("files") or []:
+        text = file.get("content")
+        if isinstance(text, dict):
+            text = text.get("content")
+        if text:
+            name = file.get("filename") or file.get("name", "unnamed")
+            sources.append((f"[VERIFIED SOURCE - File '{name}']", text))
+    for website in agent_db.get("websites") or []:
+        text = website.get("content")
+        if isinstance(text, dict):
+            text = text.get("content")
+        if text:
+            sources.append((f"[VERIFIED SOURCE - Website '{website.get('url', 'unknown')}']", text))
+    return sources
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence.strip() for sentence in SENTENCE_BOUNDARY.split(text) if sentence.strip()]
+
+def chunk_text(text: str, chunk_words: int = CHUNK_WORDS, overlap_words: int = CHUNK_OVERLAP_WORDS) -> List[str]:
+    """Split text into chunks of about `chunk_words` words on sentence boundaries, with overlap."""
+    chunks = []
+    current: List[str] = []
+    current_words = 0
+    for sentence in split_sentences(text):
+        words = sentence.split()
+        # Sentences longer than a chunk are cut on word boundaries
+        pieces = [" ".join(words[i:i + chunk_words]) for i in range(0, len(words), chunk_words)]
+        for piece in pieces:
+            piece_words = len(piece.split())
+            if current and current_words + piece_words > chunk_words:
+                chunks.append(" ".join(current))
+                # Carry trailing sentences into the next chunk as overlap
+                carried: List[str] = []
+                carried_words = 0
+                for previous in reversed(current):
+                    previous_words = len(previous.split())
+                    if carried_words + previous_words > overlap_words:
+                        break
+                    carried.insert(0, previous)
+                    carried_words += previous_words
+                current, current_words = carried, carried_words
+            current.append(piece)
+            current_words += piece_words
+    if current:
+        chunks.append(" ".join(current))
+    return chunks
+
+def terms(text: str) -> List[str]:
+    return [word for word in re.findall(r"\w+", text.lower()) if word not in STOPWORDS]
+
+def sources_fingerprint(sources: List[Tuple[str, str]]) -> str:
+    digest = hashlib.sha256(f"{CHUNK_WORDS}|{CHUNK_OVERLAP_WORDS}".encode())
+    for label, text in sources:
+        digest.update(label.encode())
+        digest.update(b"\x00")
+        digest.update(text.encode())
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+class BM25Index:
+    """Okapi BM25 over source chunks, stored as a sparse chunk-by-term weight matrix."""
+
+    def __init__(self, chunks: List[Dict], vocabulary: Dict[str, int], weights: sparse.csr_matrix):
+        self.chunks = chunks
+        self.vocabulary = vocabulary
+        self.weights = weights
+
+    @classmethod
+    def build(cls, sources: List[Tuple[str, str]], k1: float = 1.5, b: float = 0.75) -> "BM25Index":
+        chunks = [
+            {"source": label, "text": chunk}
+            for label, text in sources
+            for chunk in chunk_text(text)
+        ]
+        vocabulary: Dict[str, int] = {}
+        rows, cols, counts = [], [], []
+        for row, chunk in enumerate(chunks):
+            for term, count in Counter(terms(chunk["text"])).items():
+                rows.append(row)
+                cols.append(vocabulary.setdefault(term, len(vocabulary)))
+                counts.append(count)
+        tf = sparse.csr_matrix(
+            (np.array(counts, dtype=np.float32), (rows, cols)),
+            shape=(len(chunks), len(vocabulary))
+        )
+        if not chunks or not vocabulary:
+            return cls(chunks, vocabulary, tf)
+
+        lengths = np.asarray(tf.sum(axis=1)).ravel()
+        average_length = lengths.mean() or 1.0
+        document_frequency = np.bincount(tf.indices, minlength=len(vocabulary))
+        idf = np.log1p((len(chunks) - document_frequency + 0.5) / (document_frequency + 0.5)).astype(np.float32)
+
+        row_of_entry = np.repeat(np.arange(len(chunks)), np.diff(tf.indptr))
+        norm = k1 * (1 - b + b * lengths / average_length)
+        tf.data = (tf.data * (k1 + 1) / (tf.data + norm[row_of_entry]) * idf[tf.indices]).astype(np.float32)
+        return cls(chunks, vocabulary, tf)
+
+    def __len__(self) -> int:
+        return len(self.chunks)
+
+    def search(self, query: str, k: int = RETRIEVAL_TOP_K) -> List[Dict]:
+        """Return the top-k chunks for a query, best first."""
+        if not self.chunks or k <= 0:
+            return []
+        query_counts = Counter(term for term in terms(query) if term in self.vocabulary)
+        if not query_counts:
+            return self.chunks[:k]
+        cols = [self.vocabulary[term] for term in query_counts]
+        scores = self.weights[:, cols] @ np.array(list(query_counts.values()), dtype=np.float32)
+        scores = np.asarray(scores).ravel()
+        k = min(k, len(self.chunks))
+        top = np.argpartition(-scores, k - 1)[:k]
+        # Stable ordering: best score first, earlier chunks first on ties
+        top = sorted(top, key=lambda i: (-scores[i], i))
+        return [self.chunks[i] for i in top if scores[i] > 0] or self.chunks[:k]
+
+    def save(self, path: str) -> None:
+        sparse.save_npz(f"{path}.npz", self.weights)
+        with open(f"{path}.json", "w") as f:
+            json.dump({"chunks": self.chunks, "vocabulary": self.vocabulary}, f)
+
+    @classmethod
+    def load(cls, path: str) -> "BM25Index":
+        with open(f"{path}.json") as f:
+            data = json.load(f)
+        return cls(data["chunks"], data["vocabulary"], sparse.load_npz(f"{path}.npz").tocsr())
+
+class IndexStore:
+    """
+    Per-agent indexes keyed by a fingerprint of the agent's sources, cached in memory and on disk.
+
+    Every change to an agent's sources produces a new fingerprint, so the
+    directory keeps only the `disk_entries` most recently used indexes.
+    """
+
+    def __init__(self, directory: Optional[str] = INDEX_DIR, memory_entries: int = INDEX_MEMORY_ENTRIES,
+                 disk_entries: int = INDEX_DISK_ENTRIES):
+        self.directory = directory
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.indexes: "OrderedDict[str, BM25Index]" = OrderedDict()
+        self._lock = Lock()
+
+    def _path(self, fingerprint: str) -> Optional[str]:
+        return os.path.join(self.directory, fingerprint) if self.directory else None
+
+    def build(self, sources: List[Tuple[str, str]]) -> BM25Index:
+        """Chunk and index sources, replacing any cached index for them."""
+        fingerprint = sources_fingerprint(sources)
+        index = BM25Index.build(sources)
+        path = self._path(fingerprint)
+        if path:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                index.save(path)
+                self._prune()
+            except OSError as e:
+                logger.error(f"Could not persist retrieval index {fingerprint}: {e}")
+        self._remember(fingerprint, index)
+        logger.info(f"Indexed {len(sources)} sources into {len(index)} chunks")
+        return index
+
+    def get(self, sources: List[Tuple[str, str]]) -> BM25Index:
+        """Return the index for these sources, loading or building it if needed."""
+        fingerprint = sources_fingerprint(sources)
+        with self._lock:
+            index = self.indexes.get(fingerprint)
+            if index is not None:
+                self.indexes.move_to_end(fingerprint)
+                return index
+        path = self._path(fingerprint)
+        if path and os.path.exists(f"{path}.npz"):
+            try:
+                index = BM25Index.load(path)
+                # The file's mtime is its last use for pruning
+                os.utime(f"{path}.npz")
+                self._remember(fingerprint, index)
+                return index
+            except (OSError, ValueError) as e:
+                logger.warning(f"Rebuilding unreadable retrieval index {fingerprint}: {e}")
+        return self.build(sources)
+
+    def _prune(self) -> None:
+        """Delete the least recently used indexes beyond `disk_entries`, e.g. those of sources since changed."""
+        with os.scandir(self.directory) as entries:
+            saved = [entry for entry in entries if entry.name.endswith(".npz")]
+        if len(saved) <= self.disk_entries:
+            return
+        saved.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in saved[:len(saved) - self.disk_entries]:
+            fingerprint = entry.name[:-len(".npz")]
+            for suffix in (".npz", ".json"):
+                try:
+                    os.remove(os.path.join(self.directory, fingerprint + suffix))
+                except FileNotFoundError:
+                    pass
+        logger.info(f"Removed {len(saved) - self.disk_entries} unused retrieval indexes")
+
+    def _remember(self, fingerprint: str, index: BM25Index) -> None:
+        with self._lock:
+            self.indexes[fingerprint] = index
+            self.indexes.move_to_end(fingerprint)
+            while len(self.indexes) > self.memory_entries:
+                self.indexes.popitem(last=False)
+
+# Create a singleton instance
+index_store = IndexStore()
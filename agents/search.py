@@ -0,0 +1,70 @@
+import os
+import math
+import time
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CONCURRENCY = int(os.getenv("SEARCH_CONCURRENCY", "3"))  # parallel searches per node
+SEARCH_TIMEOUT = float(os.getenv("SEARCH_TIMEOUT", "15"))  # seconds allowed per query
+
+def search_all(client, queries: List[str], max_results: int,
+               concurrency: int = SEARCH_CONCURRENCY, timeout: float = SEARCH_TIMEOUT) -> List[List[Dict]]:
+    """
+    Run several searches concurrently.
+
+    Args:
+        client: Search client exposing search(query=..., max_results=..., timeout=...)
+        queries: Queries to run
+        max_results: Results requested per query
+        concurrency: Maximum number of searches in flight at once
+        timeout: Seconds each query may run before its results are dropped
+
+    Returns:
+        One list of results per query, in the same order as `queries`.
+        Queries that fail or time out contribute an empty list.
+    """
+    results = [[] for _ in queries]
+    if not queries:
+        return results
+
+    started = {}
+
+    def run(index: int, query: str) -> List[Dict]:
+        started[index] = time.monotonic()
+        response = client.search(query=query, max_results=max_results, timeout=timeout)
+        return response.get("results", [])
+
+    workers = max(1, min(concurrency, len(queries)))
+    # Queries still queued behind stuck workers are given up on once every wave could have finished
+    overall_deadline = time.monotonic() + timeout * math.ceil(len(queries) / workers)
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="search")
+    try:
+        # Each search runs in a copy of the caller's context so per-request timings see it
+        pending = {executor.submit(contextvars.copy_context().run, run, i, q): i for i, q in enumerate(queries)}
+        while pending:
+            done, _ = wait(pending, timeout=_next_deadline(pending, started, timeout), return_when=FIRST_COMPLETED)
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    results[index] = future.result()
+                except Exception as e:
+                    logger.error(f"Search failed for query '{queries[index]}': {e}")
+            now = time.monotonic()
+            for future, index in list(pending.items()):
+                if now >= overall_deadline or (index in started and now - started[index] >= timeout):
+                    logger.warning(f"Search timed out after {timeout}s for query '{queries[index]}'")
+                    del pending[future]
+    finally:
+        # Do not wait on searches that timed out; their results are discarded
+        executor.shutdown(wait=False, cancel_futures=True)
+    return results
+
+def _next_deadline(pending: Dict, started: Dict, timeout: float) -> float:
+    """Seconds until the earliest running query hits its timeout."""
+    now = time.monotonic()
+    deadlines = [started[i] + timeout - now for i in pending.values() if i in started]
+    return max(0.0, min(deadlines)) if deadlines else timeout
@@ -0,0 +1,162 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import logging
+import tempfile
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Optional
+from agents.metrics import timed
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CACHE_PATH = os.getenv("SEARCH_CACHE_PATH", os.path.join(tempfile.gettempdir(), "research_agent_search_cache.sqlite"))
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", str(24 * 3600)))  # seconds
+SEARCH_CACHE_MEMORY_ENTRIES = int(os.getenv("SEARCH_CACHE_MEMORY_ENTRIES", "1024"))
+SEARCH_CACHE_DISK_ENTRIES = int(os.getenv("SEARCH_CACHE_DISK_ENTRIES", "50000"))
+
+def normalize_query(query: str) -> str:
+    """Lowercase, strip punctuation and collapse whitespace.
+
+    Every word is kept: prepositions ("from"/"to") and copulas ("is"/"was") change
+    what a query asks just as much as question words do.
+    """
+    return " ".join(re.sub(r"[^\w\s]", " ", query.lower()).split())
+
+def cache_key(query: str, max_results: int) -> str:
+    return hashlib.sha256(f"{normalize_query(query)}|{max_results}".encode()).hexdigest()
+
+class SearchCache:
+    """Two-tier (in-process LRU + SQLite) cache of search responses with TTL expiry."""
+
+    def __init__(self, path: Optional[str] = SEARCH_CACHE_PATH, ttl: float = SEARCH_CACHE_TTL,
+                 memory_entries: int = SEARCH_CACHE_MEMORY_ENTRIES, disk_entries: int = SEARCH_CACHE_DISK_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self.counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._lock = Lock()
+        self._conn = None
+
+    @property
+    def conn(self) -> Optional[sqlite3.Connection]:
+        """SQLite tier, opened on first use; None when the cache is memory-only."""
+        if self._conn is None and self.path:
+            try:
+                self._conn = sqlite3.connect(self.path, check_same_thread=False)
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS search_cache ("
+                    "key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+                )
+                self._conn.execute("CREATE INDEX IF NOT EXISTS search_cache_last_used ON search_cache (last_used)")
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Search cache disabled its disk tier ({self.path}): {e}")
+                self.path = None
+                self._conn = None
+        return self._conn
+
+    def get(self, query: str, max_results: int) -> Optional[Dict]:
+        key = cache_key(query, max_results)
+        now = time.time()
+        with self._lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                expires_at, response = entry
+                if expires_at > now:
+                    self.memory.move_to_end(key)
+                    self.counters["memory_hits"] += 1
+                    return response
+                del self.memory[key]
+
+            if self.conn is not None:
+                row = self.conn.execute(
+                    "SELECT response, expires_at FROM search_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    if row[1] > now:
+                        self.conn.execute("UPDATE search_cache SET last_used = ? WHERE key = ?", (now, key))
+                        self.conn.commit()
+                        response = json.loads(row[0])
+                        self._remember(key, row[1], response)
+                        self.counters["disk_hits"] += 1
+                        return response
+                    self.conn.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+                    self.conn.commit()
+
+            self.counters["misses"] += 1
+            return None
+
+    def set(self, query: str, max_results: int, response: Dict) -> None:
+        key = cache_key(query, max_results)
+        now = time.time()
+        expires_at = now + self.ttl
+        with self._lock:
+            self._remember(key, expires_at, response)
+            if self.conn is not None:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO search_cache (key, response, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(response), expires_at, now)
+                )
+                self._evict_disk(now)
+                self.conn.commit()
+
+    def _remember(self, key: str, expires_at: float, response: Dict) -> None:
+        self.memory[key] = (expires_at, response)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def _evict_disk(self, now: float) -> None:
+        """Drop expired rows, then the least recently used rows beyond the size limit."""
+        self.conn.execute("DELETE FROM search_cache WHERE expires_at <= ?", (now,))
+        count = self.conn.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+        if count > self.disk_entries:
+            self.conn.execute(
+                "DELETE FROM search_cache WHERE key IN "
+                "(SELECT key FROM search_cache ORDER BY last_used ASC LIMIT ?)",
+                (count - self.disk_entries,)
+            )
+            self.counters["evictions"] += count - self.disk_entries
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.counters["memory_hits"] + self.counters["disk_hits"] + self.counters["misses"]
+            hits = lookups - self.counters["misses"]
+            return {
+                **self.counters,
+                "memory_entries": len(self.memory),
+                "hit_rate": hits / lookups if lookups else 0.0
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self.memory.clear()
+            if self.conn is not None:
+                self.conn.execute("DELETE FROM search_cache")
+                self.conn.commit()
+
+class CachedSearchClient:
+    """Search client wrapper that answers repeated queries from a SearchCache."""
+
+    def __init__(self, client, cache: SearchCache):
+        self.client = client
+        self.cache = cache
+
+    def search(self, query: str, max_results: int = 5, **kwargs) -> Dict:
+        cached = self.cache.get(query, max_results)
+        if cached is not None:
+            return cached
+        with timed("tavily", "search"):
+            response = self.client.search(query=query, max_results=max_results, **kwargs)
+        self.cache.set(query, max_results, response)
+        return response
+
+# Create a singleton instance
+search_cache = SearchCache()
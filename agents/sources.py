@@ -0,0 +1,139 @@
+import logging
+from datetime import datetime
+from typing import Dict, List, Optional
+from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+SOURCE_KINDS = ("file", "website")
+
+# Listing projection: everything except the (large) extracted text
+WITHOUT_CONTENT = {"content": 0}
+
+def totals_field(kind: str) -> str:
+    return f"token_totals.{kind}s"
+
+def flatten_source(source: Dict) -> Dict:
+    """Lift the {"content", "token_count"} pair produced by the extractors to the top level."""
+    content = source.get("content")
+    if isinstance(content, dict):
+        return {**source, "content": content.get("content"), "token_count": content.get("token_count", 0)}
+    return source
+
+def public_source(doc: Dict) -> Dict:
+    """Source document as returned by the API."""
+    doc = dict(doc)
+    doc["_id"] = str(doc["_id"])
+    doc["agent_id"] = str(doc["agent_id"])
+    return doc
+
+class SourceStore:
+    """Agent files and websites stored one document per source in the `sources` collection."""
+
+    def __init__(self, db=None):
+        self.db = db
+
+    async def ensure_indexes(self) -> None:
+        await self.db.sources.create_index(
+            [("agent_id", ASCENDING), ("kind", ASCENDING), ("key", ASCENDING)], unique=True
+        )
+        await self.db.sources.create_index([("agent_id", ASCENDING), ("created_at", ASCENDING)])
+
+    async def list(self, agent_id: str, kind: Optional[str] = None, with_content: bool = False) -> List[Dict]:
+        query = {"agent_id": ObjectId(agent_id)}
+        if kind:
+            query["kind"] = kind
+        cursor = self.db.sources.find(query, None if with_content else WITHOUT_CONTENT).sort("created_at", ASCENDING)
+        return [doc async for doc in cursor]
+
+    async def keys(self, agent_id: str, kind: str) -> Dict[str, Dict]:
+        """Existing sources of one kind keyed by their identity (file hash or URL)."""
+        cursor = self.db.sources.find(
+            {"agent_id": ObjectId(agent_id), "kind": kind}, {"key": 1, "token_count": 1, "content_hash": 1}
+        )
+        return {doc["key"]: doc async for doc in cursor}
+
+    async def token_total(self, agent_id: str, kind: str) -> int:
+        agent = await self.db.agents.find_one({"_id": ObjectId(agent_id)}, {"token_totals": 1})
+        return ((agent or {}).get("token_totals") or {}).get(f"{kind}s", 0)
+
+    async def add(self, agent_id: str, kind: str, key: str, source: Dict) -> Optional[Dict]:
+        """Insert a source unless the agent already has one with the same key."""
+        doc = {
+            **flatten_source(source),
+            "agent_id": ObjectId(agent_id),
+            "kind": kind,
+            "key": key,
+            "created_at": datetime.utcnow()
+        }
+        result = await self.db.sources.update_one(
+            {"agent_id": doc["agent_id"], "kind": kind, "key": key},
+            {"$setOnInsert": doc},
+            upsert=True
+        )
+        if result.upserted_id is None:
+            return None
+        doc["_id"] = result.upserted_id
+        await self.db.agents.update_one(
+            {"_id": ObjectId(agent_id)}, {"$inc": {totals_field(kind): doc.get("token_count", 0)}}
+        )
+        return doc
+
+    async def update(self, agent_id: str, kind: str, key: str, source: Dict) -> bool:
+        """Replace the content of an existing source, keeping the agent's token total in step."""
+        fields = {k: v for k, v in flatten_source(source).items() if k not in ("_id", "agent_id", "kind", "key", "created_at")}
+        previous = await self.db.sources.find_one_and_update(
+            {"agent_id": ObjectId(agent_id), "kind": kind, "key": key},
+            {"$set": fields},
+            projection={"token_count": 1},
+            return_document=ReturnDocument.BEFORE
+        )
+        if previous is None:
+            return False
+        delta = fields.get("token_count", 0) - previous.get("token_count", 0)
+        if delta:
+            await self.db.agents.update_one({"_id": ObjectId(agent_id)}, {"$inc": {totals_field(kind): delta}})
+        return True
+
+    async def remove(self, agent_id: str, source_id: str) -> bool:
+        if not ObjectId.is_valid(source_id):
+            return False
+        doc = await self.db.sources.find_one_and_delete(
+            {"_id": ObjectId(source_id), "agent_id": ObjectId(agent_id)}, {"kind": 1, "token_count": 1}
+        )
+        if doc is None:
+            return False
+        await self.db.agents.update_one(
+            {"_id": ObjectId(agent_id)}, {"$inc": {totals_field(doc["kind"]): -doc.get("token_count", 0)}}
+        )
+        return True
+
+    async def remove_keys(self, agent_id: str, kind: str, keys: List[str]) -> int:
+        if not keys:
+            return 0
+        query = {"agent_id": ObjectId(agent_id), "kind": kind, "key": {"$in": list(keys)}}
+        removed_tokens = 0
+        async for doc in self.db.sources.find(query, {"token_count": 1}):
+            removed_tokens += doc.get("token_count", 0)
+        result = await self.db.sources.delete_many(query)
+        await self.db.agents.update_one(
+            {"_id": ObjectId(agent_id)}, {"$inc": {totals_field(kind): -removed_tokens}}
+        )
+        return result.deleted_count
+
+    async def agents_with(self, kind: str) -> List[str]:
+        return [str(agent_id) for agent_id in await self.db.sources.distinct("agent_id", {"kind": kind})]
+
+    async def delete_agent(self, agent_id: str) -> None:
+        await self.db.sources.delete_many({"agent_id": ObjectId(agent_id)})
+
+    async def load_for_research(self, agent_id: str) -> Dict[str, List[Dict]]:
+        """Sources with their text, grouped the way the research graph reads them."""
+        grouped = {"files": [], "websites": []}
+        for doc in await self.list(agent_id, with_content=True):
+            grouped[f"{doc['kind']}s"].append(doc)
+        return grouped
+
+# Create a singleton instance
+source_store = SourceStore()
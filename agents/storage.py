@@ -0,0 +1,82 @@
+import os
+import asyncio
+import hashlib
+import logging
+from motor.motor_asyncio import AsyncIOMotorClient
+from agents.sources import SourceStore, flatten_source
+from agents.messages import MessageStore
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SOURCE_FIELDS = ("files", "websites")
+
+async def migrate_compact_sources(db) -> int:
+    """Strip stored token-id arrays from existing agents, keeping only token counts."""
+    migrated = 0
+    for field in SOURCE_FIELDS:
+        result = await db.agents.update_many(
+            {f"{field}.content.tokens": {"$exists": True}},
+            {"$unset": {f"{field}.$[source].content.tokens": ""}},
+            array_filters=[{"source.content.tokens": {"$exists": True}}]
+        )
+        logger.info(f"Removed token ids from {field} of {result.modified_count} agents")
+        migrated += result.modified_count
+    return migrated
+
+def legacy_source_key(field: str, source: dict) -> str:
+    """Identity of an embedded source: its URL, or the hash of the uploaded (or extracted) content."""
+    if field == "websites":
+        return source["url"]
+    if source.get("sha256"):
+        return source["sha256"]
+    text = flatten_source(source).get("content") or ""
+    return hashlib.sha256(text.encode()).hexdigest()
+
+async def migrate_sources_to_collection(db) -> int:
+    """Move files and websites embedded in agent documents into the `sources` collection."""
+    store = SourceStore(db)
+    await store.ensure_indexes()
+    migrated = 0
+    query = {"$or": [{field: {"$exists": True}} for field in SOURCE_FIELDS]}
+    async for agent in db.agents.find(query, {field: 1 for field in SOURCE_FIELDS}):
+        agent_id = str(agent["_id"])
+        await db.agents.update_one(
+            {"_id": agent["_id"], "token_totals": {"$exists": False}},
+            {"$set": {"token_totals": {"files": 0, "websites": 0}}}
+        )
+        for field in SOURCE_FIELDS:
+            for source in agent.get(field) or []:
+                source = {k: v for k, v in source.items() if k != "_id"}
+                await store.add(agent_id, field[:-1], legacy_source_key(field, source), source)
+        await db.agents.update_one({"_id": agent["_id"]}, {"$unset": {field: "" for field in SOURCE_FIELDS}})
+        migrated += 1
+    logger.info(f"Moved the sources of {migrated} agents to the sources collection")
+    return migrated
+
+async def migrate_messages_to_collection(db) -> int:
+    """Move message histories embedded in agent documents into the `messages` collection."""
+    store = MessageStore(db)
+    await store.ensure_indexes()
+    migrated = 0
+    async for agent in db.agents.find({"messages": {"$exists": True}}, {"messages": 1}):
+        docs = [
+            {**message, "agent_id": agent["_id"]}
+            for message in agent.get("messages") or []
+        ]
+        if docs:
+            await db.messages.insert_many(docs)
+        await db.agents.update_one({"_id": agent["_id"]}, {"$unset": {"messages": ""}})
+        migrated += 1
+    logger.info(f"Moved the messages of {migrated} agents to the messages collection")
+    return migrated
+
+async def main():
+    client = AsyncIOMotorClient(os.getenv("MONGODB_URL", "mongodb://localhost:27017"))
+    await migrate_compact_sources(client.agents_db)
+    await migrate_sources_to_collection(client.agents_db)
+    await migrate_messages_to_collection(client.agents_db)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,178 @@
+import os
+import re
+import hashlib
+import logging
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Iterator, List, Optional
+import tiktoken
+
+logger = logging.getLogger(__name__)
+
+TOKENIZER_NAME = os.getenv("TOKENIZER_NAME", "cl100k_base")  # Default GPT-4 tokenizer
+TOKENIZER_THREADS = int(os.getenv("TOKENIZER_THREADS", str(os.cpu_count() or 1)))  # threads for batch encoding
+TOKEN_CACHE_ENTRIES = int(os.getenv("TOKEN_CACHE_ENTRIES", "4096"))
+TOKEN_CACHE_MIN_CHARS = 256  # shorter texts are cheaper to encode than to hash and look up
+SEGMENT_CHARS = 64 * 1024  # largest piece encoded at once
+BATCH_SEGMENTS_PER_THREAD = 4  # segments per encoder thread in one batch
+
+# Rough stand-in for NLTK's word tokenizer when its data is not installed
+WORD_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+_nltk_tokenize = None
+
+def count_words(text: str) -> int:
+    """
+    NLTK word count, without downloading anything.
+
+    NLTK is imported on first use. Its punkt data is expected to be
+    installed with the image; when it is missing a regex word split is used.
+    """
+    global _nltk_tokenize
+    if _nltk_tokenize is None:
+        import nltk
+        try:
+            # punkt_tab for NLTK >= 3.8.2, punkt before
+            nltk.data.find("tokenizers/punkt_tab" if hasattr(nltk.tokenize, "PunktTokenizer") else "tokenizers/punkt")
+            _nltk_tokenize = nltk.word_tokenize
+        except LookupError:
+            logger.warning("NLTK punkt data is not installed; counting words with a regex instead")
+            _nltk_tokenize = WORD_PATTERN.findall
+    return len(_nltk_tokenize(text)) if text else 0
+
+# Newline runs followed by a non-space character always end a pre-token in the
+# cl100k/o200k split patterns, so cutting there leaves the token count unchanged.
+SEGMENT_BOUNDARY = re.compile(r"[\r\n]+(?=\S)")
+
+def segments(text: str, size: int = SEGMENT_CHARS) -> Iterator[str]:
+    """Split text into pieces of roughly `size` characters at count-preserving boundaries."""
+    if len(text) <= size:
+        yield text
+        return
+    start = 0
+    for boundary in SEGMENT_BOUNDARY.finditer(text, size):
+        if boundary.end() - start >= size:
+            yield text[start:boundary.end()]
+            start = boundary.end()
+    yield text[start:]
+
+class Tokenizer:
+    """
+    Token counting shared by the scraper, the file extractor and the agent.
+
+    Counts never keep whole-document token lists: large texts are encoded
+    segment by segment, batches go through tiktoken's multi-threaded batch
+    encoder, and counts of longer texts are remembered by content hash.
+    """
+
+    def __init__(self, name: str = TOKENIZER_NAME, cache_entries: int = TOKEN_CACHE_ENTRIES,
+                 num_threads: int = TOKENIZER_THREADS, encoding: Optional[tiktoken.Encoding] = None):
+        self.name = name
+        self.cache_entries = cache_entries
+        self.num_threads = num_threads
+        self._encoding = encoding
+        self.cache: "OrderedDict[bytes, int]" = OrderedDict()
+        self.counters = {"hits": 0, "misses": 0}
+        self._lock = Lock()
+
+    @property
+    def encoding(self) -> tiktoken.Encoding:
+        """tiktoken encoding, loaded on first use."""
+        if self._encoding is None:
+            self._encoding = tiktoken.get_encoding(self.name)
+        return self._encoding
+
+    def _key(self, text: str) -> Optional[bytes]:
+        if len(text) < TOKEN_CACHE_MIN_CHARS:
+            return None
+        return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+    def _lookup(self, key: Optional[bytes]) -> Optional[int]:
+        if key is None:
+            return None
+        with self._lock:
+            count = self.cache.get(key)
+            if count is None:
+                self.counters["misses"] += 1
+                return None
+            self.cache.move_to_end(key)
+            self.counters["hits"] += 1
+            return count
+
+    def _remember(self, key: Optional[bytes], count: int) -> None:
+        if key is None or self.cache_entries <= 0:
+            return
+        with self._lock:
+            self.cache[key] = count
+            self.cache.move_to_end(key)
+            while len(self.cache) > self.cache_entries:
+                self.cache.popitem(last=False)
+
+    def _encode_count(self, text: str) -> int:
+        # Special-token text such as "<|endoftext|>" in a document is counted as plain text
+        return sum(len(self.encoding.encode_ordinary(piece)) for piece in segments(text))
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        key = self._key(text)
+        count = self._lookup(key)
+        if count is None:
+            count = self._encode_count(text)
+            self._remember(key, count)
+        return count
+
+    def count_many(self, texts: List[str]) -> List[int]:
+        """Counts for many texts; uncached ones are encoded in batches on TOKENIZER_THREADS threads."""
+        counts = [0] * len(texts)
+        keys: List[Optional[bytes]] = [None] * len(texts)
+        uncached: List[int] = []
+        for i, text in enumerate(texts):
+            if not text:
+                continue
+            keys[i] = self._key(text)
+            cached = self._lookup(keys[i])
+            if cached is None:
+                uncached.append(i)
+            else:
+                counts[i] = cached
+
+        # Segments are produced lazily and encoded in bounded batches, so only
+        # a few segments and their token lists exist at any time
+        batch_chars = SEGMENT_CHARS * BATCH_SEGMENTS_PER_THREAD * max(1, self.num_threads)
+        batch: List[str] = []
+        owners: List[int] = []
+        chars = 0
+
+        def flush():
+            for owner, tokens in zip(owners, self.encoding.encode_ordinary_batch(batch, num_threads=self.num_threads)):
+                counts[owner] += len(tokens)
+            batch.clear()
+            owners.clear()
+
+        for i in uncached:
+            for piece in segments(texts[i]):
+                if batch and chars + len(piece) > batch_chars:
+                    flush()
+                    chars = 0
+                batch.append(piece)
+                owners.append(i)
+                chars += len(piece)
+        if batch:
+            flush()
+
+        for i in uncached:
+            self._remember(keys[i], counts[i])
+        return counts
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "entries": len(self.cache),
+                "hit_rate": self.counters["hits"] / lookups if lookups else 0.0
+            }
+
+# Create a singleton instance
+tokenizer = Tokenizer()
@@ -0,0 +1,107 @@
+import os
+import asyncio
+import hashlib
+import logging
+import tempfile
+import shutil
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional
+from fastapi import HTTPException, UploadFile
+from starlette.responses import JSONResponse
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(50 * 1024 * 1024)))  # per file
+UPLOAD_REQUEST_MAX_BYTES = int(os.getenv("UPLOAD_REQUEST_MAX_BYTES", str(4 * UPLOAD_MAX_BYTES)))  # per multipart request
+
+class UploadTooLarge(ValueError):
+    """Raised when an upload exceeds UPLOAD_MAX_BYTES."""
+
+class SpooledUpload(BaseModel):
+    filename: str
+    content_type: Optional[str] = None
+    path: str
+    sha256: str
+    size: int
+
+async def spool_upload(upload: UploadFile, directory: str, max_bytes: int = UPLOAD_MAX_BYTES,
+                       chunk_size: int = UPLOAD_CHUNK_BYTES) -> SpooledUpload:
+    """
+    Copy an upload to a unique file in `directory`, hashing it on the way.
+
+    Starlette has already received the whole request and spooled the file
+    while parsing the form; this only enforces the per-file limit and gives
+    the file a stable path and hash. UploadLimitMiddleware bounds what the
+    server receives in the first place.
+    """
+    filename = os.path.basename(upload.filename or "upload")
+    # Refuse early when the client declared the size
+    if upload.size is not None and upload.size > max_bytes:
+        raise UploadTooLarge(f"{filename} is larger than the {max_bytes} byte upload limit")
+
+    # Keep the original name as suffix: extraction picks the parser from the extension
+    fd, path = tempfile.mkstemp(dir=directory, suffix=f"_{filename}")
+    digest = hashlib.sha256()
+    size = 0
+    with os.fdopen(fd, "wb") as spool:
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(f"{filename} is larger than the {max_bytes} byte upload limit")
+            digest.update(chunk)
+            await asyncio.to_thread(spool.write, chunk)
+    return SpooledUpload(
+        filename=filename,
+        content_type=upload.content_type,
+        path=path,
+        sha256=digest.hexdigest(),
+        size=size
+    )
+
+@asynccontextmanager
+async def spooled_uploads(files: List[UploadFile], max_bytes: int = UPLOAD_MAX_BYTES) -> AsyncIterator[List[SpooledUpload]]:
+    """Spool uploads into a per-request temp directory that is removed afterwards."""
+    directory = tempfile.mkdtemp(prefix="agent-upload-")
+    try:
+        yield [await spool_upload(file, directory, max_bytes) for file in files]
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+class UploadLimitMiddleware:
+    """
+    Reject multipart requests larger than `max_bytes` before their body is parsed.
+
+    A declared Content-Length over the limit gets 413 without reading the
+    body; chunked bodies are counted as they arrive and stop at the limit.
+    """
+
+    def __init__(self, app, max_bytes: int = UPLOAD_REQUEST_MAX_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        headers = dict(scope.get("headers") or []) if scope["type"] == "http" else {}
+        if not headers.get(b"content-type", b"").startswith(b"multipart/form-data"):
+            return await self.app(scope, receive, send)
+        detail = f"Request is larger than the {self.max_bytes} byte upload limit"
+        length = headers.get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_bytes:
+            return await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -1,27 +1,132 @@
 import requests
-from bs4 import BeautifulSoup
+import httpx
 from urllib.parse import urlparse
 from typing import List, Dict, Optional
+from contextlib import asynccontextmanager
 from datetime import datetime
+from concurrent.futures import Executor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import os
+import asyncio
+import multiprocessing
 import logging
-import tiktoken  # for OpenAI-style tokenization
-import nltk  # for general purpose tokenization
-nltk.download('punkt')  # Download required NLTK data
-from PIL import Image
-import pytesseract
+import hashlib
 import io
+from agents.fetch_records import FetchRecord, FetchRecordStore, fetch_records
+from agents.html_extract import html_to_text
+from agents.tokenizer import tokenizer, count_words
+from agents.metrics import timed
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 MAX_TOKENS = 120_000  # Maximum allowable context
+SCRAPE_CONCURRENCY = int(os.getenv("SCRAPE_CONCURRENCY", "16"))  # requests in flight overall
+SCRAPE_PER_HOST = int(os.getenv("SCRAPE_PER_HOST", "4"))  # requests in flight per host
+SCRAPE_TIMEOUT = float(os.getenv("SCRAPE_TIMEOUT", "10"))  # seconds per request
+SCRAPE_DEADLINE = float(os.getenv("SCRAPE_DEADLINE", "60"))  # seconds for a whole batch of URLs
+SCRAPE_MAX_BYTES = int(os.getenv("SCRAPE_MAX_BYTES", str(5 * 1024 * 1024)))  # per response body
+SCRAPE_WORKERS = int(os.getenv("SCRAPE_WORKERS", str(os.cpu_count() or 1)))  # HTML parsing processes
+
+class PageTooLarge(ValueError):
+    """Raised when a response body exceeds SCRAPE_MAX_BYTES."""
+
+def extract_page(url: str, content_type: str, body: bytes, encoding: Optional[str], tokenize_method: str) -> Optional[Dict]:
+    """Parse and count one fetched page; runs inside the parsing worker processes."""
+    # Check if URL points to an image
+    if content_type.startswith('image/'):
+        text = scraper.extract_image_text(url, body)
+    else:
+        text = html_to_text(body.decode(encoding or 'utf-8', errors='replace'))
+    if not text:
+        return None
+    return {"content": text, "token_count": scraper.tokenize_text(text, tokenize_method)["token_count"]}
+
+class LoopResources:
+    """HTTP client and request slots shared by every scrape on one event loop."""
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self.overall = asyncio.Semaphore(SCRAPE_CONCURRENCY)
+        self.per_host: Dict[str, list] = {}  # host -> [semaphore, requests holding or waiting for it]
+        self.closer: Optional[asyncio.Task] = None
+
+    @asynccontextmanager
+    async def slot(self, host: str):
+        """A slot for `host`, then a global one; hosts nobody is waiting on are forgotten."""
+        entry = self.per_host.setdefault(host, [asyncio.Semaphore(SCRAPE_PER_HOST), 0])
+        entry[1] += 1
+        try:
+            # Host slot first: URLs waiting on a busy host must not hold global slots other hosts could use
+            async with entry[0], self.overall:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self.per_host[host]
 
 class WebScraper:
-    def __init__(self):
+    def __init__(self, records: Optional[FetchRecordStore] = fetch_records, parse_executor: Optional[Executor] = None):
         self.headers = {'User-Agent': 'Mozilla/5.0'}
-        self.tokenizer = tiktoken.get_encoding("cl100k_base")  # Default GPT-4 tokenizer
         self.total_tokens = 0
+        self.records = records
+        self._parse_executor = parse_executor
+        self._loops: Dict[asyncio.AbstractEventLoop, LoopResources] = {}
+
+    @property
+    def parse_executor(self) -> Executor:
+        """Process pool for HTML parsing and tokenization, created on first use from a forkserver."""
+        if self._parse_executor is None:
+            self._parse_executor = ProcessPoolExecutor(
+                max_workers=SCRAPE_WORKERS, mp_context=multiprocessing.get_context("forkserver")
+            )
+        return self._parse_executor
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Pooled HTTP client shared by all scrapes on the running event loop."""
+        return self.resources().client
+
+    def resources(self) -> LoopResources:
+        """
+        Client and request slots of the running event loop, created on first use.
+
+        Every batch on the loop shares them, so SCRAPE_CONCURRENCY and
+        SCRAPE_PER_HOST limit the whole process rather than one call.
+        """
+        loop = asyncio.get_running_loop()
+        resources = self._loops.get(loop)
+        if resources is None:
+            resources = self._loops[loop] = LoopResources(self.new_client())
+            # A client can only be closed on its own loop, so close it when that loop shuts down
+            resources.closer = loop.create_task(self._close_with_loop(loop, resources))
+        return resources
+
+    async def _close_with_loop(self, loop: asyncio.AbstractEventLoop, resources: LoopResources) -> None:
+        try:
+            await loop.create_future()
+        finally:
+            if self._loops.get(loop) is resources:
+                del self._loops[loop]
+            await resources.client.aclose()
+
+    def new_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            headers=self.headers,
+            timeout=SCRAPE_TIMEOUT,
+            follow_redirects=True,
+            limits=httpx.Limits(max_connections=SCRAPE_CONCURRENCY, max_keepalive_connections=SCRAPE_CONCURRENCY)
+        )
+
+    async def aclose(self) -> None:
+        resources = self._loops.pop(asyncio.get_running_loop(), None)
+        if resources is not None:
+            resources.closer.cancel()
+            await resources.client.aclose()
+        if self._parse_executor is not None:
+            self._parse_executor.shutdown(wait=False, cancel_futures=True)
+            self._parse_executor = None
     
     def validate_url(self, url: str) -> bool:
         """Validate if the URL is properly formatted."""
@@ -32,61 +137,191 @@ class WebScraper:
             logger.error(f"URL validation error for {url}: {str(e)}")
             return False
     
-    def check_token_limit(self, new_tokens: int) -> bool:
+    def check_token_limit(self, new_tokens: int, total_tokens: Optional[int] = None) -> bool:
         """Check if adding new tokens would exceed the limit"""
-        if self.total_tokens + new_tokens > MAX_TOKENS:
+        total_tokens = self.total_tokens if total_tokens is None else total_tokens
+        if total_tokens + new_tokens > MAX_TOKENS:
             raise ValueError(f"Adding this content would exceed the maximum token limit of {MAX_TOKENS}")
         return True
 
-    def extract_image_text(self, image_url: str) -> Optional[str]:
+    def extract_image_text(self, image_url: str, data: Optional[bytes] = None) -> Optional[str]:
         """Extract text from images using OCR"""
         try:
-            response = requests.get(image_url, headers=self.headers, timeout=10)
-            response.raise_for_status()
-            image = Image.open(io.BytesIO(response.content))
-            return pytesseract.image_to_string(image)
+            if data is None:
+                response = requests.get(image_url, headers=self.headers, timeout=SCRAPE_TIMEOUT)
+                response.raise_for_status()
+                data = response.content
+            # Imported on first use; most pages are not images
+            from PIL import Image
+            import pytesseract
+            image = Image.open(io.BytesIO(data))
+            with timed("ocr", "image"):
+                return pytesseract.image_to_string(image)
         except Exception as e:
             logger.error(f"OCR failed for image {image_url}: {str(e)}")
             return None
 
-    def scrape_url(self, url: str) -> Optional[str]:
-        """Scrape content from a single URL."""
+    async def _get(self, client: httpx.AsyncClient, url: str, headers: Dict[str, str]):
+        """GET a URL, reading at most SCRAPE_MAX_BYTES of its body."""
+        async with client.stream('GET', url, headers=headers) as response:
+            declared = response.headers.get('content-length')
+            if declared and declared.isdigit() and int(declared) > SCRAPE_MAX_BYTES:
+                raise PageTooLarge(f"{url} is larger than {SCRAPE_MAX_BYTES} bytes")
+            body = bytearray()
+            async for chunk in response.aiter_bytes():
+                body.extend(chunk)
+                if len(body) > SCRAPE_MAX_BYTES:
+                    raise PageTooLarge(f"{url} is larger than {SCRAPE_MAX_BYTES} bytes")
+            return response, bytes(body)
+
+    async def _parse(self, url: str, content_type: str, body: bytes, encoding: Optional[str],
+                     tokenize_method: str) -> Optional[Dict]:
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                self.parse_executor, extract_page, url, content_type, body, encoding, tokenize_method
+            )
+        except BrokenProcessPool as e:
+            # A crashed worker breaks the whole pool; start a fresh one for later pages
+            logger.error(f"Parsing worker crashed on {url}: {e}")
+            self._parse_executor = None
+            return None
+
+    async def afetch_website(self, url: str, tokenize_method: str = "openai",
+                             client: Optional[httpx.AsyncClient] = None) -> Optional[Dict]:
+        """
+        Fetch a URL and return its text, token count and content hash.
+
+        The last fetch of each URL is recorded. Later fetches send
+        If-None-Match/If-Modified-Since and reuse the recorded text and token
+        count when the server answers 304 or the body hash is unchanged.
+        """
         try:
             if not self.validate_url(url):
                 logger.warning(f"Invalid URL format: {url}")
                 return None
-            
+
+            record = self.records.get(url) if self.records is not None else None
+            if record is not None and record.token_method != tokenize_method:
+                record = None
+            headers = {}
+            if record is not None:
+                if record.etag:
+                    headers['If-None-Match'] = record.etag
+                if record.last_modified:
+                    headers['If-Modified-Since'] = record.last_modified
+
             # Fetch webpage
-            response = requests.get(url, headers=self.headers, timeout=10)
+            with timed("scrape", "fetch"):
+                response, body = await self._get(client or self.client, url, headers)
+            if response.status_code == 304 and record is not None:
+                logger.info(f"{url} not modified, reusing extracted text")
+                return {"content": record.text, "token_count": record.token_count, "content_hash": record.content_hash}
             response.raise_for_status()
-            
-            # Check if URL points to an image
-            content_type = response.headers.get('content-type', '')
-            if content_type.startswith('image/'):
-                return self.extract_image_text(url)
-            
-            # Parse HTML
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # Remove unwanted elements
-            for element in soup.find_all(['script', 'style', 'nav', 'footer', 'iframe']):
-                element.decompose()
-            
-            # Extract text from relevant tags
-            content = []
-            for tag in soup.find_all(['h1', 'h2', 'h3', 'p']):
-                text = tag.get_text(strip=True)
-                if text:
-                    content.append(text)
-            
-            return " ".join(content)
-            
-        except requests.RequestException as e:
+
+            content_hash = hashlib.sha256(body).hexdigest()
+            if record is not None and record.content_hash == content_hash:
+                logger.info(f"{url} unchanged, reusing extracted text")
+                page = {"content": record.text, "token_count": record.token_count}
+            else:
+                content_type = response.headers.get('content-type', '')
+                # Image OCR is timed inside the worker too, which only reaches /metrics in multiprocess mode
+                is_image = content_type.startswith('image/')
+                with timed("ocr" if is_image else "scrape", "image" if is_image else "parse", worker=is_image):
+                    page = await self._parse(url, content_type, body, response.encoding, tokenize_method)
+                if not page:
+                    return None
+
+            if self.records is not None:
+                self.records.put(FetchRecord(
+                    url=url,
+                    etag=response.headers.get('etag'),
+                    last_modified=response.headers.get('last-modified'),
+                    content_hash=content_hash,
+                    text=page["content"],
+                    token_count=page["token_count"],
+                    token_method=tokenize_method
+                ))
+            return {**page, "content_hash": content_hash}
+
+        except httpx.HTTPError as e:
             logger.error(f"Request failed for {url}: {str(e)}")
             return None
         except Exception as e:
             logger.error(f"Error processing {url}: {str(e)}")
             return None
+
+    async def afetch_many(self, urls: List[str], tokenize_method: str = "openai", deadline: float = SCRAPE_DEADLINE,
+                          client: Optional[httpx.AsyncClient] = None) -> List[Optional[Dict]]:
+        """
+        afetch_website for many URLs at once, in the order of `urls`.
+
+        At most SCRAPE_CONCURRENCY requests are in flight, and SCRAPE_PER_HOST
+        per host, counting every batch running on the event loop. URLs not
+        finished within `deadline` seconds give None.
+        """
+        resources = self.resources()
+        client = client or resources.client
+
+        async def fetch(url: str) -> Optional[Dict]:
+            async with resources.slot(urlparse(url).netloc):
+                return await self.afetch_website(url, tokenize_method, client)
+
+        tasks = [asyncio.create_task(fetch(url)) for url in urls]
+        if not tasks:
+            return []
+        done, pending = await asyncio.wait(tasks, timeout=deadline)
+        for task in pending:
+            task.cancel()
+        if pending:
+            logger.warning(f"Skipped {len(pending)} of {len(urls)} websites not fetched within {deadline}s")
+        return [task.result() if task in done else None for task in tasks]
+
+    async def aprocess_websites(self, urls: List[str], tokenize_method: str = "openai", existing_tokens: int = 0,
+                                deadline: float = SCRAPE_DEADLINE, client: Optional[httpx.AsyncClient] = None) -> List[Dict]:
+        """
+        Fetch websites concurrently and return their content with tokenization.
+
+        URLs that fail or miss the deadline are skipped. Results keep the
+        order of `urls`, and `existing_tokens` (e.g. websites the agent
+        already has) counts towards MAX_TOKENS.
+        """
+        pages = await self.afetch_many(urls, tokenize_method, deadline, client)
+
+        processed_websites = []
+        total_tokens = existing_tokens
+        for url, page in zip(urls, pages):
+            if page:
+                # Check token limit before adding
+                self.check_token_limit(page["token_count"], total_tokens)
+                total_tokens += page["token_count"]
+                
+                processed_websites.append({
+                    "url": url,
+                    "content": {
+                        "content": page["content"],
+                        "token_count": page["token_count"]
+                    },
+                    "content_hash": page["content_hash"],
+                    "timestamp": datetime.utcnow()
+                })
+            else:
+                logger.warning(f"No content extracted from {url}")
+        
+        return processed_websites
+
+    async def _with_client(self, call):
+        async with self.new_client() as client:
+            return await call(client)
+
+    def fetch_website(self, url: str, tokenize_method: str = "openai") -> Optional[Dict]:
+        """Synchronous afetch_website, for callers without an event loop."""
+        return asyncio.run(self._with_client(lambda client: self.afetch_website(url, tokenize_method, client)))
+
+    def scrape_url(self, url: str) -> Optional[str]:
+        """Scrape content from a single URL."""
+        page = self.fetch_website(url)
+        return page["content"] if page else None
     
     def tokenize_text(self, text: str, method: str = "openai") -> Dict:
         """
@@ -97,52 +332,23 @@ class WebScraper:
             method: 'openai' for tiktoken or 'nltk' for basic tokenization
         
         Returns:
-            Dictionary containing tokens and token count
+            Dictionary containing the token count; token lists are not kept
         """
         if not text:
-            return {"tokens": [], "token_count": 0}
+            return {"token_count": 0}
 
         if method == "openai":
-            tokens = self.tokenizer.encode(text)
-            return {
-                "tokens": tokens,
-                "token_count": len(tokens)
-            }
+            return {"token_count": tokenizer.count(text)}
         elif method == "nltk":
-            tokens = nltk.word_tokenize(text)
-            return {
-                "tokens": tokens,
-                "token_count": len(tokens)
-            }
+            return {"token_count": count_words(text)}
         else:
             raise ValueError("Unsupported tokenization method")
 
-    def process_websites(self, urls: List[str], tokenize_method: str = "openai") -> List[Dict]:
-        """Process a list of websites and return their content with tokenization."""
-        processed_websites = []
-        self.total_tokens = 0
-        
-        for url in urls:
-            content = self.scrape_url(url)
-            if content:
-                tokenization_info = self.tokenize_text(content, tokenize_method)
-                # Check token limit before adding
-                self.check_token_limit(tokenization_info["token_count"])
-                self.total_tokens += tokenization_info["token_count"]
-                
-                processed_websites.append({
-                    "url": url,
-                    "content": {
-                        "content": content,
-                        "tokens": tokenization_info["tokens"],
-                        "token_count": tokenization_info["token_count"]
-                    },
-                    "timestamp": datetime.utcnow()
-                })
-            else:
-                logger.warning(f"No content extracted from {url}")
-        
-        return processed_websites
+    def process_websites(self, urls: List[str], tokenize_method: str = "openai", existing_tokens: int = 0) -> List[Dict]:
+        """Synchronous aprocess_websites, for callers without an event loop."""
+        return asyncio.run(self._with_client(
+            lambda client: self.aprocess_websites(urls, tokenize_method, existing_tokens, client=client)
+        ))
 
 # Create a singleton instance
 scraper = WebScraper()
@@ -0,0 +1,137 @@
+import os
+import uuid
+import asyncio
+import logging
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor
+from datetime import datetime
+from threading import Lock
+from typing import Any, Callable, Optional
+from pydantic import BaseModel
+
+logger = logging.getLogger(__name__)
+
+JOB_EXECUTOR = os.getenv("JOB_EXECUTOR", "thread")  # "thread" or "process"
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "32"))  # queued jobs allowed beyond the running ones
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", "500"))  # finished jobs kept for status lookups
+
+class JobQueueFull(Exception):
+    """Raised when the worker pool and its pending queue are both full."""
+
+class JobInfo(BaseModel):
+    job_id: str
+    agent_id: Optional[str] = None
+    query: Optional[str] = None
+    status: str
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+
+class Job:
+    def __init__(self, job_id: str, future: Future, agent_id: Optional[str] = None, query: Optional[str] = None):
+        self.id = job_id
+        self.future = future
+        self.agent_id = agent_id
+        self.query = query
+        self.created_at = datetime.utcnow()
+        self.finished_at = None
+
+    @property
+    def status(self) -> str:
+        if self.future.cancelled():
+            return "cancelled"
+        if self.future.done():
+            return "failed" if self.future.exception() else "completed"
+        if self.future.running():
+            return "running"
+        return "queued"
+
+    @property
+    def error(self) -> Optional[str]:
+        if self.future.done() and not self.future.cancelled() and self.future.exception():
+            return str(self.future.exception())
+        return None
+
+    def result(self) -> Any:
+        """Return the job result; only valid once the job has completed."""
+        return self.future.result(timeout=0)
+
+    def info(self) -> JobInfo:
+        return JobInfo(
+            job_id=self.id,
+            agent_id=self.agent_id,
+            query=self.query,
+            status=self.status,
+            error=self.error,
+            created_at=self.created_at,
+            finished_at=self.finished_at
+        )
+
+class JobManager:
+    def __init__(self, max_workers: int = JOB_WORKERS, executor: str = JOB_EXECUTOR,
+                 max_pending: int = JOB_MAX_PENDING, history: int = JOB_HISTORY):
+        if executor not in {"thread", "process"}:
+            raise ValueError(f"Unsupported job executor: {executor}")
+        self.max_workers = max_workers
+        self.executor_kind = executor
+        self.max_pending = max_pending
+        self.history = history
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._executor = None
+        self._lock = Lock()
+
+    @property
+    def executor(self):
+        """Worker pool, created on first submit so forked workers start from a loaded app."""
+        if self._executor is None:
+            if self.executor_kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="research-job")
+        return self._executor
+
+    def active_count(self) -> int:
+        return sum(1 for job in self.jobs.values() if not job.future.done())
+
+    def submit(self, fn: Callable, *args, agent_id: Optional[str] = None, query: Optional[str] = None,
+               job_id: Optional[str] = None, **kwargs) -> Job:
+        """Queue fn(*args, **kwargs) on the worker pool and return its job handle."""
+        with self._lock:
+            if self.active_count() >= self.max_workers + self.max_pending:
+                raise JobQueueFull("Too many research jobs in progress, try again later")
+            job_id = job_id or uuid.uuid4().hex
+            future = self.executor.submit(fn, *args, **kwargs)
+            job = Job(job_id, future, agent_id=agent_id, query=query)
+            self.jobs[job_id] = job
+            self._prune()
+        future.add_done_callback(lambda _: self._finish(job))
+        return job
+
+    def _finish(self, job: Job) -> None:
+        job.finished_at = datetime.utcnow()
+        if job.error:
+            logger.error(f"Job {job.id} failed: {job.error}")
+        else:
+            logger.info(f"Job {job.id} finished with status {job.status}")
+
+    def _prune(self) -> None:
+        """Drop the oldest finished jobs once more than `history` are kept."""
+        finished = [job_id for job_id, job in self.jobs.items() if job.future.done()]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self.jobs[job_id]
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    async def wait(self, job: Job) -> Any:
+        """Await a job from the event loop without blocking it."""
+        return await asyncio.wrap_future(job.future)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+# Create a singleton instance
+job_manager = JobManager()
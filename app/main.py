@@ -1,58 +1,126 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Request
+from fastapi.responses import StreamingResponse, Response
+from starlette.concurrency import iterate_in_threadpool
 from pydantic import BaseModel, Field
 from typing import List, Dict, Optional
+from functools import partial
 import json
 from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo.server_api import ServerApi
 from bson import ObjectId
-from agents.agent import begin_research
-from agents.webscrape import scraper
+from agents.agent import begin_research, research_with_timings, resume_research, stream_research, warm_up
+from agents.checkpoints import checkpoints
+from agents.webscrape import scraper, MAX_TOKENS
 from agents.file_extractor import file_processor
-from datetime import datetime
+from agents.search_cache import search_cache
+from agents.llm_cache import llm_cache
+from agents.tokenizer import tokenizer
+from agents.metrics import metrics_payload, register_cache_metrics, register_mongo_metrics
+from agents.sources import source_store, public_source
+from agents.messages import message_store, public_message, MESSAGES_PAGE_SIZE
+from agents.retrieval import agent_sources, index_store
+from agents.uploads import spooled_uploads, UploadLimitMiddleware, UploadTooLarge, SpooledUpload
+from app.jobs import job_manager, JobInfo, JobQueueFull
+import asyncio
+import threading
+import uuid
+import anyio
 import uvicorn
 import os
 import logging
+from datetime import datetime
 
 app = FastAPI()
+app.add_middleware(UploadLimitMiddleware)
 db = None
 
+# Keep references to fire-and-forget tasks so they are not garbage collected
+background_tasks = set()
+
+WEBSITE_REFRESH_INTERVAL = float(os.getenv("WEBSITE_REFRESH_INTERVAL", "0"))  # seconds; 0 disables the refresher
+CHECKPOINT_CLEANUP_INTERVAL = float(os.getenv("CHECKPOINT_CLEANUP_INTERVAL", "3600"))  # seconds; 0 disables cleanup
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "false").lower() in ("1", "true", "yes")
+
+def run_in_background(coro):
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
 # Add startup state tracking
 app.state.is_ready = False
 
+# Mongo commands are timed through pymongo's monitoring hooks, registered before any client exists
+register_mongo_metrics()
+register_cache_metrics({
+    "search": search_cache.stats,
+    "llm": llm_cache.stats,
+    "extraction": file_processor.extraction_cache.stats,
+    "token_counts": tokenizer.stats
+})
+
 class AgentDB(BaseModel):
     id: str = Field(alias="_id")
     name: str
     files: List[Dict] = []
     websites: List[Dict] = []
     messages: List[Dict] = []
+    token_totals: Dict[str, int] = {}
 
 class Message(BaseModel):
     message: str
     
-async def init_db():
+def init_db() -> Optional[AsyncIOMotorClient]:
+    """Create the Mongo client; it connects on first use, so this does not touch the network."""
     global db
     try:
         # MongoDB Atlas connection string
         mongodb_url = os.getenv("MONGODB_URL")
-        # Create a new client and connect to the server with ServerApi=1
+        # Create a new client with ServerApi=1
         client = AsyncIOMotorClient(mongodb_url, server_api=ServerApi('1'), serverSelectionTimeoutMS=5000)
         db = client.agents_db
+        # Share the connection with the source store and the file processor
+        source_store.db = db
+        message_store.db = db
+        file_processor.db = db
+        return client
+    except Exception as e:
+        print(f"Error configuring MongoDB client: {e}")
+        return None
+
+async def connect_db(client: AsyncIOMotorClient) -> bool:
+    """Check the connection and create indexes; runs after the app is already serving."""
+    try:
         await client.admin.command('ping')
+        await source_store.ensure_indexes()
+        await message_store.ensure_indexes()
         print("Successfully connected to MongoDB Atlas!")
-        return True
     except Exception as e:
         print(f"Error connecting to MongoDB Atlas: {e}")
         return False
+    if WEBSITE_REFRESH_INTERVAL > 0:
+        run_in_background(refresh_websites_periodically(WEBSITE_REFRESH_INTERVAL))
+    return True
 
 @app.on_event("startup")
 async def startup_event():
-    db_success = await init_db()
-    if db_success:
-        app.state.is_ready = True
+    client = init_db()
+    # Ready right away: the database, model clients and tokenizer connect or load on first use
+    app.state.is_ready = True
+    if client is not None:
+        run_in_background(connect_db(client))
     else:
-        # Still mark as ready if DB fails, as it might be optional for some endpoints
-        app.state.is_ready = True
         print("Warning: Application starting without database connection")
+    if CHECKPOINT_CLEANUP_INTERVAL > 0:
+        run_in_background(cleanup_checkpoints_periodically(CHECKPOINT_CLEANUP_INTERVAL))
+    if WARMUP_ON_STARTUP:
+        run_in_background(asyncio.to_thread(warm_up))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    job_manager.shutdown()
+    file_processor.shutdown()
+    await scraper.aclose()
 
 @app.get("/_health")
 async def health_check():
@@ -61,6 +129,22 @@ async def health_check():
         raise HTTPException(status_code=503, detail="Application is not ready")
     return {"status": "healthy"}
 
+@app.get("/_stats")
+async def cache_stats():
+    """Hit/miss counters of the in-process caches."""
+    return {
+        "search_cache": search_cache.stats(),
+        "llm_cache": llm_cache.stats(),
+        "extraction_cache": file_processor.extraction_cache.stats(),
+        "token_counts": tokenizer.stats()
+    }
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics: node and external call latency, model tokens and cache hits."""
+    payload, content_type = metrics_payload()
+    return Response(content=payload, media_type=content_type)
+
 @app.get("/")
 async def root():
     return {"message": "Hello World"}
@@ -88,36 +172,29 @@ async def create_agent(agent_post: str = Form(...), files: Optional[List[UploadF
         # Create new agent document
         agent = {
             "name": agent_data["name"],
-            "files": [],
-            "websites": [],
-            "messages": []
+            "token_totals": {"files": 0, "websites": 0}
         }
         print(f"Created agent document: {agent}")  # Debug log
         
-        # Insert into MongoDB
-        try:
-            result = await db.agents.insert_one(agent)
-            agent_id = str(result.inserted_id)
-            print(f"Successfully inserted agent with ID: {agent_id}")  # Debug log
-        except Exception as e:
-            print(f"MongoDB insertion error: {e}")  # Debug log
-            raise
-        
-        # Process files if they exist
-        if files:
-            print(f"Processing {len(files)} files")  # Debug log
-            for file in files:
-                contents = await file.read()
-                await db.agents.update_one(
-                    {"_id": ObjectId(agent_id)},
-                    {"$push": {"files": {
-                        "filename": file.filename,
-                        "content_type": file.content_type,
-                        "content": contents.decode()
-                    }}}
-                )
+        # Spool uploads to disk first so oversized files are rejected before the agent exists
+        async with spooled_uploads(files or []) as uploads:
+            # Insert into MongoDB
+            try:
+                result = await db.agents.insert_one(agent)
+                agent_id = str(result.inserted_id)
+                print(f"Successfully inserted agent with ID: {agent_id}")  # Debug log
+            except Exception as e:
+                print(f"MongoDB insertion error: {e}")  # Debug log
+                raise
+            
+            # Process files if they exist
+            if uploads:
+                print(f"Processing {len(uploads)} files")  # Debug log
+                await ingest_files(agent_id, uploads)
         
         return {"additionalProp1": agent_id}
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         print(f"Error in create_agent: {e}")  # Debug log
         raise HTTPException(status_code=500, detail=str(e))
@@ -125,11 +202,18 @@ async def create_agent(agent_post: str = Form(...), files: Optional[List[UploadF
 @app.get("/agents/{agent_id}", response_model=AgentDB)
 async def get_agent(agent_id: str):
     try:
-        agent = await db.agents.find_one({"_id": ObjectId(agent_id)})
+        agent = await db.agents.find_one({"_id": ObjectId(agent_id)}, {"name": 1, "token_totals": 1})
         if not agent:
             raise HTTPException(status_code=404, detail="Agent not found")
         # Convert ObjectId to string for JSON serialization
         agent["_id"] = str(agent["_id"])
+        # Sources live in their own collection; list them without their text
+        sources = [public_source(doc) for doc in await source_store.list(agent_id)]
+        agent["files"] = [doc for doc in sources if doc["kind"] == "file"]
+        agent["websites"] = [doc for doc in sources if doc["kind"] == "website"]
+        # Only the latest page of history, oldest first; older messages via /messages
+        recent, _ = await message_store.page(agent_id, MESSAGES_PAGE_SIZE)
+        agent["messages"] = [public_message(doc) for doc in reversed(recent)]
         return agent
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -140,55 +224,307 @@ async def delete_agent(agent_id: str):
         result = await db.agents.delete_one({"_id": ObjectId(agent_id)})
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Agent not found")
+        await source_store.delete_agent(agent_id)
+        await message_store.delete_agent(agent_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def load_agent_for_research(agent_id: str) -> Optional[Dict]:
+    """Agent name plus the text of its sources; message history is not loaded."""
+    agent = await db.agents.find_one({"_id": ObjectId(agent_id)}, {"name": 1})
+    if agent:
+        agent.update(await source_store.load_for_research(agent_id))
+    return agent
+
+async def index_agent_sources(agent_id: str):
+    """Chunk and index the agent's current sources so queries only retrieve what they need."""
+    sources = agent_sources(await source_store.load_for_research(agent_id))
+    if sources:
+        await asyncio.to_thread(index_store.build, sources)
+
+async def ingest_files(agent_id: str, uploads: List[SpooledUpload], replace: bool = False) -> List[Dict]:
+    """
+    Add uploaded files the agent does not have yet, identified by content hash.
+
+    With `replace`, the agent's files that are not part of this upload are removed.
+    Only new files are extracted.
+    """
+    existing = await source_store.keys(agent_id, "file")
+    uploaded = {upload.sha256 for upload in uploads}
+    removed = [key for key in existing if key not in uploaded] if replace else []
+    new_uploads = list({upload.sha256: upload for upload in uploads if upload.sha256 not in existing}.values())
+    file_docs = []
+    if new_uploads:
+        # Files being replaced do not count towards the limit; nothing is written until extraction succeeds
+        existing_tokens = await source_store.token_total(agent_id, "file")
+        existing_tokens -= sum(existing[key].get("token_count", 0) for key in removed)
+        file_docs = await file_processor.extract_files(new_uploads, existing_tokens)
+    await source_store.remove_keys(agent_id, "file", removed)
+    added = []
+    for file_doc in file_docs:
+        source = await source_store.add(agent_id, "file", file_doc["sha256"], file_doc)
+        if source:
+            added.append(source)
+    if added or replace:
+        await index_agent_sources(agent_id)
+    return added
+
+async def ingest_websites(agent_id: str, urls: List[str], replace: bool = False) -> List[Dict]:
+    """
+    Scrape and add websites the agent does not have yet, identified by URL.
+
+    With `replace`, the agent's websites that are not in `urls` are removed.
+    """
+    existing = await source_store.keys(agent_id, "website")
+    removed = [key for key in existing if key not in set(urls)] if replace else []
+    new_urls = list(dict.fromkeys(url for url in urls if url not in existing))
+    websites = []
+    if new_urls:
+        # Websites being replaced do not count towards the limit; a rejected request writes nothing
+        existing_tokens = await source_store.token_total(agent_id, "website")
+        existing_tokens -= sum(existing[key].get("token_count", 0) for key in removed)
+        websites = await scraper.aprocess_websites(new_urls, existing_tokens=existing_tokens)
+    await source_store.remove_keys(agent_id, "website", removed)
+    added = []
+    for website in websites:
+        source = await source_store.add(agent_id, "website", website["url"], website)
+        if source:
+            added.append(source)
+    if added or replace:
+        await index_agent_sources(agent_id)
+    return added
+
+async def refresh_agent_websites(agent_id: str, urls: Optional[List[str]] = None) -> int:
+    """Revalidate an agent's websites (or those of them in `urls`) and store the ones whose content changed."""
+    existing = await source_store.keys(agent_id, "website")
+    total = await source_store.token_total(agent_id, "website")
+    updated = 0
+    candidates = [url for url in existing if urls is None or url in urls]
+    for url, page in zip(candidates, await scraper.afetch_many(candidates)):
+        source = existing[url]
+        if not page or page["content_hash"] == source.get("content_hash"):
+            continue
+        new_total = total - source.get("token_count", 0) + page["token_count"]
+        if new_total > MAX_TOKENS:
+            logging.warning(f"Keeping the stored copy of {url}: the new version exceeds the token limit")
+            continue
+        await source_store.update(agent_id, "website", url, {
+            "content": page["content"],
+            "token_count": page["token_count"],
+            "content_hash": page["content_hash"],
+            "timestamp": datetime.utcnow()
+        })
+        total = new_total
+        updated += 1
+    if updated:
+        await index_agent_sources(agent_id)
+    return updated
+
+async def refresh_websites_periodically(interval: float):
+    """Background loop revalidating every agent's websites each `interval` seconds."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            for agent_id in await source_store.agents_with("website"):
+                updated = await refresh_agent_websites(agent_id)
+                if updated:
+                    logging.info(f"Refreshed {updated} websites of agent {agent_id}")
+        except Exception as e:
+            logging.error(f"Website refresh failed: {e}")
+
+async def cleanup_checkpoints_periodically(interval: float):
+    """Background loop removing research runs that were not resumed within CHECKPOINT_TTL."""
+    while True:
+        try:
+            await asyncio.to_thread(checkpoints.cleanup)
+        except Exception as e:
+            logging.error(f"Checkpoint cleanup failed: {e}")
+        await asyncio.sleep(interval)
+
+async def store_message(agent_id: str, query: str, response: str):
+    """Append a finished research result to the agent's message history."""
+    await message_store.add(agent_id, query, response)
+
+async def store_job_result(job):
+    """Wait for a submitted research job and persist its draft."""
+    try:
+        final_draft = await job_manager.wait(job)
+        await store_message(job.agent_id, job.query, final_draft)
+    except Exception as e:
+        logging.error(f"Research job {job.id} for agent {job.agent_id} failed: {e}")
+
+async def submit_research(agent_id: str, message: Message, research=begin_research):
+    # Check if agent exists
+    agent = await load_agent_for_research(agent_id)
+    if not agent:
+        raise HTTPException(status_code=404, detail="Agent not found")
+    # The job id doubles as the run's checkpoint thread, so the job can be resumed by id
+    job_id = uuid.uuid4().hex
+    try:
+        return job_manager.submit(
+            partial(research, agent_id=agent_id), task=message.message, agent_db=agent, thread_id=job_id,
+            agent_id=agent_id, query=message.message, job_id=job_id
+        )
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
 @app.post("/agents/{agent_id}/queries", status_code=201)
-async def send_message(agent_id: str, message: Message):
+async def send_message(agent_id: str, message: Message, timings: bool = False):
+    """Run a research query and return the essay; `timings=true` adds a wall time breakdown."""
     try:
-        # Check if agent exists
-        agent = await db.agents.find_one({"_id": ObjectId(agent_id)})
+        # Run the research process on the worker pool and wait for the final draft
+        if timings:
+            job = await submit_research(agent_id, message, research_with_timings)
+            result = await job_manager.wait(job)
+            final_draft = result["response"]
+        else:
+            job = await submit_research(agent_id, message)
+            final_draft = await job_manager.wait(job)
+            result = {"response": final_draft}
+
+        # Store the result in MongoDB
+        await store_message(agent_id, message.message, final_draft)
+
+        # Return the draft in the expected format
+        return result
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/agents/{agent_id}/jobs", status_code=202)
+async def submit_job(agent_id: str, message: Message):
+    """Queue a research query and return its job id immediately."""
+    try:
+        job = await submit_research(agent_id, message)
+        run_in_background(store_job_result(job))
+        return {"job_id": job.id, "status": job.status}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def close_research_stream(events, run_id: str) -> None:
+    """Close an abandoned research stream and mark its run interrupted so it can be resumed."""
+    try:
+        events.close()
+    except ValueError:
+        # Still inside a graph step on a worker thread; `stop` ends it at its next event
+        pass
+    checkpoints.interrupt(run_id)
+
+def format_sse(event: str, data: Dict) -> str:
+    """Encode one Server-Sent Event frame."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@app.post("/agents/{agent_id}/queries/stream")
+async def stream_message(agent_id: str, message: Message, request: Request):
+    """Run a research query and stream its progress and draft tokens as Server-Sent Events."""
+    try:
+        agent = await load_agent_for_research(agent_id)
         if not agent:
             raise HTTPException(status_code=404, detail="Agent not found")
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        # Run the research process and get the final draft
-        final_draft = begin_research(task=message.message, agent_db=agent)
-
-        # Store the result in MongoDB
-        await db.agents.update_one(
-            {"_id": ObjectId(agent_id)},
-            {"$push": {"messages": {
-                "query": message.message,
-                "response": final_draft,
-                "timestamp": datetime.utcnow()
-            }}}
+    async def event_stream():
+        stop = threading.Event()
+        run_id = uuid.uuid4().hex
+        final_draft = None
+        events = stream_research(
+            task=message.message, agent_db=agent, stop=stop, thread_id=run_id, agent_id=agent_id
         )
+        try:
+            async for event in iterate_in_threadpool(events):
+                if await request.is_disconnected():
+                    logging.info(f"Client disconnected from research stream for agent {agent_id}")
+                    return
+                if event["event"] == "done":
+                    final_draft = event["data"]["response"]
+                yield format_sse(event["event"], event["data"])
+        except Exception as e:
+            logging.error(f"Research stream for agent {agent_id} failed: {e}")
+            yield format_sse("error", {"detail": str(e), "run_id": run_id})
+        finally:
+            stop.set()
+            if final_draft is None:
+                # After a disconnect nothing pulls the generator again, so its own stop check never runs.
+                # Shielded: when the response is cancelled this cleanup must still happen.
+                with anyio.CancelScope(shield=True):
+                    await anyio.to_thread.run_sync(close_research_stream, events, run_id)
+        if final_draft is not None:
+            await store_message(agent_id, message.message, final_draft)
 
-        # Return the draft in the expected format
-        return {
-            "response": final_draft
-        }
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.get("/jobs/{job_id}", response_model=JobInfo)
+async def get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.info()
 
+@app.get("/jobs/{job_id}/result")
+async def get_job_result(job_id: str):
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    status = job.status
+    if status in {"queued", "running"}:
+        raise HTTPException(status_code=409, detail=f"Job is {status}")
+    if status != "completed":
+        raise HTTPException(status_code=500, detail=job.error or f"Job {status}")
+    return {"response": job.result()}
+
+@app.post("/jobs/{job_id}/resume", status_code=202)
+async def resume_job(job_id: str):
+    """Resume an interrupted or failed research run (job or stream) from its last checkpoint."""
+    job = job_manager.get(job_id)
+    if job is not None and job.status in {"queued", "running"}:
+        raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+    # A stream run still executing here would get a second execution writing the same checkpoints
+    if checkpoints.is_active(job_id):
+        raise HTTPException(status_code=409, detail="Run is running")
+    run = await asyncio.to_thread(checkpoints.get, job_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail="Run not found")
+    if run.status == "completed":
+        raise HTTPException(status_code=409, detail="Run already completed")
+    try:
+        agent = await load_agent_for_research(run.agent_id) if run.agent_id else None
+        if run.agent_id and not agent:
+            raise HTTPException(status_code=404, detail="Agent not found")
+        job = job_manager.submit(
+            resume_research, job_id, agent_db=agent, agent_id=run.agent_id, query=run.task, job_id=job_id
+        )
+        run_in_background(store_job_result(job))
+        return {"job_id": job.id, "status": job.status}
+    except HTTPException:
+        raise
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
-        
+
 @app.put("/agents/{agent_id}/websites", status_code=204)
 async def update_agent_websites(agent_id: str, websites: List[str]):
     try:
         # Check if agent exists
-        agent = await db.agents.find_one({"_id": ObjectId(agent_id)})
+        agent = await db.agents.find_one({"_id": ObjectId(agent_id)}, {"_id": 1})
         if not agent:
             raise HTTPException(status_code=404, detail="Agent not found")
 
-        # Process websites using the WebScraper
-        processed_websites = scraper.process_websites(websites)
-        
-        # Update agent's websites in MongoDB
-        if processed_websites:
-            await db.agents.update_one(
-                {"_id": ObjectId(agent_id)},
-                {"$set": {"websites": processed_websites}}
-            )
+        # Revalidate the websites the agent keeps; unchanged pages cost a conditional request
+        await refresh_agent_websites(agent_id, websites)
+        # Replace the agent's websites, scraping only URLs it does not have yet
+        await ingest_websites(agent_id, websites, replace=True)
         
         return None
     except ValueError as e:
@@ -204,21 +540,21 @@ async def update_agent_files(agent_id: str, files: List[UploadFile] = File(...))
         logging.info(f"Number of files: {len(files)}")
         
         # Check if agent exists
-        agent = await db.agents.find_one({"_id": ObjectId(agent_id)})
+        agent = await db.agents.find_one({"_id": ObjectId(agent_id)}, {"_id": 1})
         if agent is None:  # Changed from 'if not agent'
             logging.error(f"Agent {agent_id} not found")
             raise HTTPException(status_code=404, detail="Agent not found")
         
-        # Initialize file processor's database connection
-        mongodb_url = os.getenv("MONGODB_URL")
-        await file_processor.init_db(mongodb_url)
-        
-        # Process and store files
+        # Replace the agent's files, extracting only files it does not have yet
         logging.info("Starting file processing")
-        await file_processor.process_files(agent_id, files)
+        async with spooled_uploads(files) as uploads:
+            await ingest_files(agent_id, uploads, replace=True)
         logging.info("File processing completed successfully")
         
         return None
+    except UploadTooLarge as e:
+        logging.error(f"Upload rejected: {str(e)}")
+        raise HTTPException(status_code=413, detail=str(e))
     except ValueError as e:
         logging.error(f"Validation error: {str(e)}")
         raise HTTPException(status_code=400, detail=str(e))
@@ -226,6 +562,95 @@ async def update_agent_files(agent_id: str, files: List[UploadFile] = File(...))
         logging.error(f"Error processing files: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/agents/{agent_id}/messages")
+async def list_messages(agent_id: str, limit: int = MESSAGES_PAGE_SIZE, before: Optional[str] = None):
+    """Message history, newest first. Pass `next_before` back as `before` for the next page."""
+    try:
+        agent = await db.agents.find_one({"_id": ObjectId(agent_id)}, {"_id": 1})
+        if not agent:
+            raise HTTPException(status_code=404, detail="Agent not found")
+        messages, next_before = await message_store.page(agent_id, limit, before)
+        return {"messages": [public_message(doc) for doc in messages], "next_before": next_before}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/agents/{agent_id}/websites/refresh")
+async def refresh_websites(agent_id: str):
+    """Revalidate the agent's websites now; unchanged pages are not re-parsed."""
+    try:
+        agent = await db.agents.find_one({"_id": ObjectId(agent_id)}, {"_id": 1})
+        if not agent:
+            raise HTTPException(status_code=404, detail="Agent not found")
+        return {"updated": await refresh_agent_websites(agent_id)}
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/agents/{agent_id}/sources")
+async def list_sources(agent_id: str, kind: Optional[str] = None):
+    """List the agent's files and websites without their extracted text."""
+    try:
+        agent = await db.agents.find_one({"_id": ObjectId(agent_id)}, {"_id": 1})
+        if not agent:
+            raise HTTPException(status_code=404, detail="Agent not found")
+        return [public_source(doc) for doc in await source_store.list(agent_id, kind)]
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/agents/{agent_id}/files", status_code=201)
+async def add_agent_files(agent_id: str, files: List[UploadFile] = File(...)):
+    """Add files to an agent; files it already has (same content) are skipped."""
+    try:
+        agent = await db.agents.find_one({"_id": ObjectId(agent_id)}, {"_id": 1})
+        if not agent:
+            raise HTTPException(status_code=404, detail="Agent not found")
+        async with spooled_uploads(files) as uploads:
+            added = await ingest_files(agent_id, uploads)
+        return {"added": [public_source({k: v for k, v in doc.items() if k != "content"}) for doc in added]}
+    except HTTPException:
+        raise
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logging.error(f"Error adding files: {str(e)}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/agents/{agent_id}/websites", status_code=201)
+async def add_agent_websites(agent_id: str, websites: List[str]):
+    """Add websites to an agent; URLs it already has are skipped."""
+    try:
+        agent = await db.agents.find_one({"_id": ObjectId(agent_id)}, {"_id": 1})
+        if not agent:
+            raise HTTPException(status_code=404, detail="Agent not found")
+        added = await ingest_websites(agent_id, websites)
+        return {"added": [public_source({k: v for k, v in doc.items() if k != "content"}) for doc in added]}
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.delete("/agents/{agent_id}/sources/{source_id}", status_code=204)
+async def delete_source(agent_id: str, source_id: str):
+    try:
+        if not await source_store.remove(agent_id, source_id):
+            raise HTTPException(status_code=404, detail="Source not found")
+        await index_agent_sources(agent_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8080)
 
@@ -0,0 +1,59 @@
+"""
+Benchmark the HTML extraction backends on the saved pages in test/data/html.
+
+    python test/bench_html_extract.py [--rounds 20]
+
+Prints pages per second and MB/s for each backend, whether its output
+matches the BeautifulSoup reference on every page, and which pages the lxml
+backend hands to BeautifulSoup because their tags nest differently.
+"""
+import sys
+import os
+import glob
+import time
+import argparse
+import lxml.html
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.html_extract import EXTRACTORS, nests_differently, soup_text
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), "data", "html")
+
+def load_corpus():
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(CORPUS_DIR, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            pages[os.path.basename(path)] = f.read()
+    return pages
+
+def read_by_soup(html):
+    parser = lxml.html.HTMLParser()
+    lxml.html.document_fromstring(html, parser=parser)
+    return nests_differently(html, parser)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    pages = load_corpus()
+    size_mb = sum(len(html.encode("utf-8")) for html in pages.values()) / 1e6
+    reference = {name: soup_text(html) for name, html in pages.items()}
+    print(f"{len(pages)} pages, {size_mb:.2f} MB, {args.rounds} rounds")
+
+    for name, extract in EXTRACTORS.items():
+        mismatches = [page for page, html in pages.items() if extract(html) != reference[page]]
+        started = time.perf_counter()
+        for _ in range(args.rounds):
+            for html in pages.values():
+                extract(html)
+        elapsed = time.perf_counter() - started
+        parity = "parity ok" if not mismatches else f"differs on {', '.join(mismatches)}"
+        print(f"{name:>6}: {len(pages) * args.rounds / elapsed:8.1f} pages/s  "
+              f"{size_mb * args.rounds / elapsed:6.2f} MB/s  {parity}")
+    fallbacks = [page for page, html in pages.items() if read_by_soup(html)]
+    print(f"lxml reads {len(fallbacks)} of {len(pages)} pages with bs4: {', '.join(fallbacks) or 'none'}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Benchmark token counting on large documents.
+
+    python test/bench_tokenizer.py [--docs 16] [--doc-mb 2] [--encoding cl100k_base]
+
+Compares the previous approach (one `len(encoding.encode(text))` per
+document) with the shared tokenizer's count-only, batched and cached paths.
+It reports the time and the peak memory traced by tracemalloc for each.
+"""
+import sys
+import os
+import glob
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import tiktoken
+from agents.html_extract import lxml_text
+from agents.tokenizer import Tokenizer
+
+CORPUS_DIR = os.path.join(os.path.dirname(__file__), "data", "html")
+
+def documents(count: int, size: int):
+    """Large plain-text documents built from the HTML corpus, each slightly different."""
+    paragraphs = []
+    for path in sorted(glob.glob(os.path.join(CORPUS_DIR, "*.html"))):
+        with open(path, encoding="utf-8") as f:
+            paragraphs.append(lxml_text(f.read()))
+    base = "\n\n".join(paragraphs)
+    return [(f"Document {i}\n" + base * (size // len(base) + 1))[:size] for i in range(count)]
+
+def measure(label, run):
+    tracemalloc.start()
+    started = time.perf_counter()
+    total = run()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:>28}: {elapsed:7.3f}s  peak {peak / 1e6:8.1f} MB  ({total} tokens)")
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--docs", type=int, default=16)
+    parser.add_argument("--doc-mb", type=float, default=2.0)
+    parser.add_argument("--encoding", default="cl100k_base")
+    args = parser.parse_args()
+
+    encoding = tiktoken.get_encoding(args.encoding)
+    docs = documents(args.docs, int(args.doc_mb * 1e6))
+    print(f"{len(docs)} documents of {args.doc_mb} MB, {os.cpu_count()} CPUs")
+
+    baseline = measure("encode + len, one by one", lambda: sum(len(encoding.encode(doc, disallowed_special=())) for doc in docs))
+    counted = measure("count, one by one", lambda: sum(map(Tokenizer(encoding=encoding).count, docs)))
+    cached = Tokenizer(encoding=encoding)
+    batched = measure("count_many (batched)", lambda: sum(cached.count_many(docs)))
+    repeated = measure("count_many again (cached)", lambda: sum(cached.count_many(docs)))
+    assert baseline == counted == batched == repeated, "token counts differ"
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+import sys
+import os
+
+# Ensure the project root is in sys.path so that the "agents" package can be imported.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.context_budget import ContextBudget, item_caps
+
+def word_count(text):
+    return len(text.split())
+
+def sentences(prefix, count):
+    return " ".join(f"{prefix} sentence {i} ends here." for i in range(count))
+
+def test_item_caps_shorten_largest_items_first():
+    assert item_caps([10, 20, 30], 100) == [10, 20, 30]
+    assert item_caps([10, 50, 100], 70) == [10, 30, 30]
+
+def test_truncate_ends_on_sentence_boundary():
+    budget = ContextBudget(count_tokens=word_count)
+    text = sentences("A", 10)
+    cut = budget.truncate(text, 12)
+    assert cut == "A sentence 0 ends here. A sentence 1 ends here."
+    assert budget.truncate("one two three four five", 3) == "one two three"
+
+def test_pack_truncates_instead_of_dropping_and_reports():
+    budget = ContextBudget(max_tokens=100, verified_share=0.5, count_tokens=word_count)
+    verified = [sentences("V", 20), sentences("W", 2)]
+    supplementary = [sentences("S", 20)]
+    packed = budget.pack(fixed=["ten words of fixed prompt text go right here ok"], verified=verified, supplementary=supplementary)
+
+    assert len(packed.verified) == 2 and len(packed.supplementary) == 1
+    assert packed.verified[1] == verified[1]
+    total = sum(word_count(t) for t in packed.verified + packed.supplementary)
+    assert total <= 90
+    assert packed.report["fixed_tokens"] == 10
+    assert packed.report["verified"]["truncated"] == 1
+    assert packed.report["supplementary"]["truncated"] == 1
+    assert packed.report["verified"]["dropped"] == 0
+
+def test_prompt_size_stays_flat_as_sources_accumulate():
+    budget = ContextBudget(max_tokens=200, count_tokens=word_count)
+    supplementary = []
+    sizes = []
+    for revision in range(6):
+        supplementary += [sentences(f"R{revision}", 5) for _ in range(3)]
+        packed = budget.pack(fixed=["task"], verified=[sentences("V", 30)], supplementary=supplementary)
+        sizes.append(sum(word_count(t) for t in packed.verified + packed.supplementary))
+    assert max(sizes) <= 199
+    # Once the budget is reached more revisions do not grow the prompt
+    assert all(120 < size <= 199 for size in sizes[2:])
+
+def test_unused_share_moves_to_the_other_section():
+    budget = ContextBudget(max_tokens=100, verified_share=0.5, count_tokens=word_count)
+    packed = budget.pack(fixed=[], verified=[], supplementary=[sentences("S", 16)])
+    assert packed.report["supplementary"]["tokens_out"] > 50
@@ -0,0 +1,40 @@
+import sys
+import os
+
+# Ensure the project root is in sys.path so that the "agents" package can be imported.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.dedup import dedupe, similarity
+
+BASE = ("Green tea is made from Camellia sinensis leaves that have not undergone withering and oxidation. "
+        "It originated in China and its production spread to other countries in East Asia over centuries.")
+
+def test_exact_duplicates_ignore_labels_case_and_punctuation():
+    snippets = [f"[Supplementary Source] {BASE}", f"[Supplementary Source] {BASE.upper()}!!"]
+    kept, report = dedupe(snippets)
+    assert kept == snippets[:1]
+    assert report.exact_duplicates == 1
+    assert report.tokens_saved == len(snippets[1].split())
+
+def test_near_duplicates_are_dropped_and_distinct_snippets_kept():
+    near = BASE.replace("over centuries", "over many centuries")
+    other = "[Supplementary Source] Coffee was first cultivated in Ethiopia before spreading to Yemen."
+    kept, report = dedupe([BASE, near, other], threshold=0.7)
+    assert kept == [BASE, other]
+    assert report.near_duplicates == 1
+
+def test_snippets_covered_by_verified_sources_are_dropped():
+    verified = [f"[VERIFIED SOURCE - File 'tea.pdf'] Intro text. {BASE} More text about brewing."]
+    kept, report = dedupe([f"[Supplementary Source] {BASE}"], verified)
+    assert kept == []
+    assert report.covered_by_verified == 1
+
+def test_threshold_is_configurable():
+    near = BASE.replace("over centuries", "over many centuries")
+    kept, _ = dedupe([BASE, near], threshold=0.99)
+    assert len(kept) == 2
+
+def test_similarity_of_revised_drafts():
+    assert similarity(BASE, BASE.upper()) == 1.0
+    assert 0.0 < similarity(BASE, BASE + " Black tea is oxidized.") < 1.0
+    assert similarity(BASE, "") == 0.0
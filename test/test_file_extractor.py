@@ -0,0 +1,228 @@
+import sys
+import os
+import re
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+import pytest
+
+# Ensure the project root is in sys.path so that the "agents" package can be imported.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents import file_extractor
+from agents.file_extractor import FileProcessor
+from agents.uploads import SpooledUpload
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            yield doc
+
+class FakeCollection:
+    """Just enough of a Motor collection for the extraction cache."""
+
+    def __init__(self):
+        self.docs = {}
+
+    def find(self, query, projection=None):
+        return FakeCursor([{"_id": key, **self.docs[key]} for key in query["_id"]["$in"] if key in self.docs])
+
+    async def replace_one(self, query, doc, upsert=False):
+        self.docs[query["_id"]] = doc
+
+def upload(name, sha256=None):
+    return SpooledUpload(filename=name, path=f"/uploads/{name}", sha256=sha256 or name, size=1)
+
+both_running = threading.Barrier(2, timeout=5)
+
+def fake_extract_file(path):
+    """Stand-in for extract_file; the file name says how it behaves and how many tokens it has."""
+    name = os.path.basename(path)
+    if "hang" in name:
+        with open(path + ".pid", "w") as f:
+            f.write(str(os.getpid()))
+        time.sleep(60)
+    if "raise" in name:
+        raise RuntimeError("partition crashed")
+    if "broken" in name:
+        return None
+    if "blank" in name:
+        return {"content": "", "token_count": 0}
+    if "slow" in name:
+        time.sleep(0.3)
+    if "parallel" in name:
+        both_running.wait()
+    tokens = re.search(r"_(\d+)\.", name)
+    return {"content": f"text of {name}", "token_count": int(tokens.group(1)) if tokens else 10}
+
+def is_running(pid):
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().split(")")[-1].split()[0] not in {"Z", "X"}
+    except FileNotFoundError:
+        return False
+
+@pytest.fixture
+def processor(monkeypatch):
+    extracted = []
+    def recording_extract_file(path):
+        extracted.append(os.path.basename(path))
+        return fake_extract_file(path)
+    monkeypatch.setattr(file_extractor, "extract_file", recording_extract_file)
+    processor = FileProcessor()
+    processor.db = SimpleNamespace(extraction_cache=FakeCollection())
+    processor.max_workers = 2
+    processor._executor = ThreadPoolExecutor(max_workers=2)
+    processor.extracted = extracted
+    yield processor
+    processor.shutdown()
+
+def test_identical_bytes_are_extracted_once_and_then_cached(processor):
+    files = [upload("a.pdf", "hash-a"), upload("copy-of-a.pdf", "hash-a"), upload("b.pdf", "hash-b")]
+    results = asyncio.run(processor.extract_files(files))
+
+    assert sorted(processor.extracted) == ["a.pdf", "b.pdf"]
+    assert [doc["content"]["content"] for doc in results] == ["text of a.pdf", "text of a.pdf", "text of b.pdf"]
+    assert processor.extraction_cache.stats()["misses"] == 2
+
+    asyncio.run(processor.extract_files([upload("again.pdf", "hash-a")]))
+    assert sorted(processor.extracted) == ["a.pdf", "b.pdf"]
+    assert processor.extraction_cache.stats()["hits"] == 1
+
+def test_failed_and_empty_extractions_are_not_cached(processor):
+    files = [upload("broken.png"), upload("blank.png")]
+    results = asyncio.run(processor.extract_files(files))
+    assert [doc["filename"] for doc in results] == ["blank.png"]
+    assert processor.db.extraction_cache.docs == {}
+
+    asyncio.run(processor.extract_files(files))
+    assert processor.extracted.count("broken.png") == 2
+    assert processor.extracted.count("blank.png") == 2
+
+def test_ocr_failure_gives_none(monkeypatch, tmp_path):
+    def failing_ocr(image):
+        raise RuntimeError("tesseract is not installed")
+    monkeypatch.setattr(file_extractor, "ocr_image", failing_ocr)
+    image_path = tmp_path / "scan.png"
+    from PIL import Image
+    Image.new("RGB", (8, 8)).save(image_path)
+    assert FileProcessor().extract_text_from_image(str(image_path)) is None
+
+def test_files_are_extracted_in_parallel(processor):
+    files = [upload("parallel-a.pdf"), upload("parallel-b.pdf")]
+    results = asyncio.run(processor.extract_files(files))
+    assert [doc["filename"] for doc in results] == ["parallel-a.pdf", "parallel-b.pdf"]
+
+def test_a_failing_file_does_not_affect_the_others(processor):
+    files = [upload("raise.pdf"), upload("ok.pdf"), upload("broken.pdf")]
+    results = asyncio.run(processor.extract_files(files))
+    assert [doc["filename"] for doc in results] == ["ok.pdf"]
+
+def test_token_limit_follows_upload_order_not_completion_order(processor):
+    # The second file finishes first, but the first one uploaded gets the remaining budget
+    files = [upload("slow_70000.pdf"), upload("fast_60000.pdf"), upload("small_50000.pdf")]
+    results = asyncio.run(processor.extract_files(files))
+    assert [doc["filename"] for doc in results] == ["slow_70000.pdf", "small_50000.pdf"]
+
+    results = asyncio.run(processor.extract_files([upload("fast_60000.pdf")], existing_tokens=70_000))
+    assert results == []
+
+def test_timed_out_file_is_killed_and_frees_the_pool(monkeypatch, tmp_path):
+    monkeypatch.setattr(file_extractor, "extract_file", fake_extract_file)
+    monkeypatch.setattr(file_extractor, "FILE_TIMEOUT", 1.0)
+    processor = FileProcessor()
+    processor.db = SimpleNamespace(extraction_cache=FakeCollection())
+    # One worker: ok.pdf waits for the hung file's slot and then runs on the fresh pool
+    processor.max_workers = 1
+    hang = SpooledUpload(filename="hang.pdf", path=str(tmp_path / "hang.pdf"), sha256="hang", size=1)
+    try:
+        started = time.monotonic()
+        results = asyncio.run(processor.extract_files([hang, upload("ok.pdf")]))
+        assert time.monotonic() - started < 30
+        assert [doc["filename"] for doc in results] == ["ok.pdf"]
+
+        with open(hang.path + ".pid") as f:
+            hung_pid = int(f.read())
+        deadline = time.monotonic() + 5
+        while is_running(hung_pid) and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert not is_running(hung_pid)
+
+        results = asyncio.run(processor.extract_files([upload("next.pdf")]))
+        assert [doc["filename"] for doc in results] == ["next.pdf"]
+    finally:
+        processor.shutdown()
+
+class FakePage:
+    def __init__(self, number):
+        self.number = number
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+@pytest.fixture
+def scanned_pdf(monkeypatch):
+    import pdf2image
+    rasterized = []
+    def convert_from_path(path, dpi=None, first_page=None, last_page=None):
+        pages = [FakePage(number) for number in range(first_page, last_page + 1)]
+        rasterized.append(pages)
+        return pages
+    def slow_first_page_ocr(page):
+        # Earlier pages finishing last must not change the order of the text
+        time.sleep(0.05 if page.number % 3 == 1 else 0)
+        return f"page {page.number} words"
+    monkeypatch.setattr(pdf2image, "pdfinfo_from_path", lambda path: {"Pages": 7})
+    monkeypatch.setattr(pdf2image, "convert_from_path", convert_from_path)
+    monkeypatch.setattr(file_extractor, "ocr_image", slow_first_page_ocr)
+    return rasterized
+
+def test_ocr_rasterizes_one_window_at_a_time_in_page_order(scanned_pdf):
+    texts = list(FileProcessor().iter_pdf_ocr_pages("scan.pdf", window=3, workers=3))
+
+    assert texts == [f"page {number} words" for number in range(1, 8)]
+    assert [[page.number for page in window] for window in scanned_pdf] == [[1, 2, 3], [4, 5, 6], [7]]
+    assert all(page.closed for window in scanned_pdf for page in window)
+
+def test_ocr_stops_once_the_token_budget_is_reached(scanned_pdf, monkeypatch):
+    processor = FileProcessor()
+    monkeypatch.setattr(processor, "extract_text", lambda path: "")
+    monkeypatch.setattr(processor, "tokenize_text", lambda text: {"token_count": len(text.split())})
+    monkeypatch.setattr(processor, "iter_pdf_ocr_pages",
+                        lambda path: FileProcessor.iter_pdf_ocr_pages(processor, path, window=2, workers=2))
+
+    text = processor.extract_text_from_pdf_with_ocr("scan.pdf", max_tokens=9)
+
+    assert text.splitlines() == ["page 1 words", "page 2 words", "page 3 words"]
+    # Pages 5-7 are never rasterized
+    assert [[page.number for page in window] for window in scanned_pdf] == [[1, 2], [3, 4]]
+
+def test_pool_extractions_are_timed_in_the_parent(processor):
+    from prometheus_client import REGISTRY
+    def count(service, operation):
+        return REGISTRY.get_sample_value(
+            "external_call_seconds_count", {"service": service, "operation": operation}
+        ) or 0
+    before = count("partition", "docx"), count("ocr", "png")
+
+    asyncio.run(processor.extract_files([upload("timed.docx"), upload("broken-scan.png")]))
+
+    assert count("partition", "docx") == before[0] + 1
+    assert count("ocr", "png") == before[1] + 1
+
+def test_extraction_pool_workers_are_not_forked_from_the_server():
+    processor = FileProcessor()
+    try:
+        assert processor.executor._mp_context.get_start_method() == "forkserver"
+        assert processor.executor.submit(os.getpid).result(timeout=60) != os.getpid()
+    finally:
+        processor.shutdown()
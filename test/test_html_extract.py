@@ -0,0 +1,49 @@
+import sys
+import os
+import glob
+import pytest
+
+# Ensure the project root is in sys.path so that the "agents" package can be imported.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents import html_extract
+from agents.html_extract import get_extractor, html_to_text, lxml_text, soup_text
+
+CORPUS = sorted(glob.glob(os.path.join(os.path.dirname(__file__), "data", "html", "*.html")))
+
+@pytest.mark.parametrize("path", CORPUS, ids=os.path.basename)
+def test_lxml_matches_beautifulsoup_on_corpus(path):
+    with open(path, encoding="utf-8") as f:
+        html = f.read()
+    text = lxml_text(html)
+    assert text
+    assert text == soup_text(html)
+
+def test_removed_elements_keep_tail_text_and_comments_are_skipped():
+    html = "<nav><p>menu</p></nav><p>one<script>x()</script>two<!-- note --> &amp; three</p><footer><p>f</p></footer>"
+    assert html_to_text(html, "lxml") == html_to_text(html, "bs4") == "onetwo& three"
+
+@pytest.mark.parametrize("html, text", [
+    # Blocks inside a paragraph or heading that is closed after them
+    ("<div><p>x<div>y</div>z</p></div>", "xyz"),
+    ("<p>a<table><tr><td>cell</td></tr></table>b</p>", "acellb"),
+    ("<p>one<h2>two</h2>three</p>", "onetwothree two"),
+    ("<h1>a<p>b</h1>c", "ab b"),
+    # Paragraphs that are never closed
+    ("<p>a<div>b</div>", "ab"),
+    ("<p>a<p>b", "ab b"),
+])
+def test_lxml_keeps_text_of_misnested_tags(html, text):
+    assert lxml_text(html) == soup_text(html) == text
+
+def test_well_formed_pages_do_not_need_beautifulsoup(monkeypatch):
+    def unexpected(html):
+        raise AssertionError("read by soup_text")
+    monkeypatch.setattr(html_extract, "soup_text", unexpected)
+    with open(os.path.join(os.path.dirname(__file__), "data", "html", "node_querystring.html"), encoding="utf-8") as f:
+        assert lxml_text(f.read())
+    assert lxml_text("<p>a<b>b</b></p><h2>c<div>d</div></h2>") == "ab cd"
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        get_extractor("regex")
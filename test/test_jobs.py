@@ -0,0 +1,61 @@
+import sys
+import os
+import time
+import asyncio
+import threading
+import pytest
+
+# Ensure the project root is in sys.path so that the "app" package can be imported.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.jobs import JobManager, JobQueueFull
+
+def wait_for(job, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not job.future.done() and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+def test_submit_returns_before_job_finishes():
+    manager = JobManager(max_workers=2, max_pending=2)
+    release = threading.Event()
+    job = manager.submit(release.wait, 5, agent_id="a1", query="q")
+    assert job.status in {"queued", "running"}
+    assert manager.get(job.id) is job
+    release.set()
+    wait_for(job)
+    assert job.status == "completed"
+    assert job.info().finished_at is not None
+    manager.shutdown()
+
+def test_failed_job_reports_error():
+    manager = JobManager(max_workers=1)
+    def boom():
+        raise RuntimeError("search failed")
+    job = manager.submit(boom)
+    wait_for(job)
+    assert job.status == "failed"
+    assert job.info().error == "search failed"
+    manager.shutdown()
+
+def test_pending_queue_is_bounded():
+    manager = JobManager(max_workers=1, max_pending=1)
+    release = threading.Event()
+    manager.submit(release.wait, 5)
+    manager.submit(release.wait, 5)
+    with pytest.raises(JobQueueFull):
+        manager.submit(release.wait, 5)
+    release.set()
+    manager.shutdown()
+
+def test_wait_does_not_block_event_loop():
+    manager = JobManager(max_workers=1)
+    async def run():
+        job = manager.submit(time.sleep, 0.2)
+        ticks = 0
+        waiter = asyncio.ensure_future(manager.wait(job))
+        while not waiter.done():
+            ticks += 1
+            await asyncio.sleep(0.01)
+        return ticks
+    assert asyncio.run(run()) > 5
+    manager.shutdown()
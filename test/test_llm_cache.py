@@ -0,0 +1,79 @@
+import sys
+import os
+import time
+from typing import List
+
+# Ensure the project root is in sys.path so that the "agents" package can be imported.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration
+from pydantic import BaseModel
+from agents import llm_cache
+from agents.llm_cache import LLMResponseCache, MemoryBackend, SqliteBackend, with_cache
+
+class CountingModel(FakeListChatModel):
+    """Deterministic fake chat model that records real (uncached) calls."""
+    temperature: float = 0
+    # Shared with the cache-enabled copies made by with_cache()
+    calls: List[str] = []
+
+    def _call(self, messages, *args, **kwargs):
+        self.calls.append(messages[-1].content)
+        return super()._call(messages, *args, **kwargs)
+
+class Queries(BaseModel):
+    queries: List[str]
+
+def test_enabled_node_is_served_from_cache(monkeypatch):
+    monkeypatch.setattr(llm_cache, "llm_cache", LLMResponseCache(MemoryBackend()))
+    model = CountingModel(responses=["outline"])
+    messages = [HumanMessage(content="Write about tea")]
+
+    first = with_cache(model, "plan", {"plan"}).invoke(messages)
+    second = with_cache(model, "plan", {"plan"}).invoke(messages)
+
+    assert first.content == second.content == "outline"
+    assert len(model.calls) == 1
+    assert llm_cache.llm_cache.stats()["hits"] == 1
+
+def test_disabled_node_and_nonzero_temperature_are_not_cached(monkeypatch):
+    monkeypatch.setattr(llm_cache, "llm_cache", LLMResponseCache(MemoryBackend()))
+    model = CountingModel(responses=["outline"])
+    messages = [HumanMessage(content="Write about tea")]
+
+    with_cache(model, "reflect", {"plan"}).invoke(messages)
+    with_cache(model, "reflect", {"plan"}).invoke(messages)
+    warm = model.model_copy(update={"temperature": 0.7})
+    with_cache(warm, "plan", {"plan"}).invoke(messages)
+    with_cache(warm, "plan", {"plan"}).invoke(messages)
+
+    assert len(model.calls) == 4
+
+def test_sqlite_backend_round_trips_structured_output(tmp_path):
+    backend = SqliteBackend(path=str(tmp_path / "llm.sqlite"))
+    message = AIMessage(content='{"queries": ["tea"]}', additional_kwargs={"parsed": Queries(queries=["tea"])})
+    backend.set("key", [ChatGeneration(message=message)])
+
+    restored = SqliteBackend(path=str(tmp_path / "llm.sqlite")).get("key")
+    assert restored[0].message.content == '{"queries": ["tea"]}'
+    assert restored[0].message.additional_kwargs["parsed"] == {"queries": ["tea"]}
+
+def test_backends_expire_and_evict(tmp_path):
+    memory = MemoryBackend(max_entries=1, ttl=0.05)
+    memory.set("a", 1)
+    memory.set("b", 2)
+    assert memory.get("a") is None
+    assert memory.get("b") == 2
+    time.sleep(0.06)
+    assert memory.get("b") is None
+
+    disk = SqliteBackend(path=str(tmp_path / "llm.sqlite"), max_entries=1)
+    disk.set("a", [ChatGeneration(message=AIMessage(content="a"))])
+    disk.set("b", [ChatGeneration(message=AIMessage(content="b"))])
+    assert disk.get("a") is None
+    assert disk.get("b")[0].message.content == "b"
+
+def test_key_depends_on_model_configuration():
+    assert LLMResponseCache.key("prompt", "gpt-4o-mini") != LLMResponseCache.key("prompt", "gpt-4o")
@@ -0,0 +1,159 @@
+import sys
+import os
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+import pytest
+from bson import ObjectId
+
+# Ensure the project root is in sys.path so that the "agents" package can be imported.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.messages import MessageStore, MESSAGES_MAX_PAGE_SIZE
+from agents.storage import migrate_messages_to_collection
+
+def matches(doc, query):
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(matches(doc, branch) for branch in condition):
+                return False
+        elif isinstance(condition, dict):
+            if "$lt" in condition and not (key in doc and doc[key] < condition["$lt"]):
+                return False
+            if "$exists" in condition and (key in doc) != condition["$exists"]:
+                return False
+        elif doc.get(key) != condition:
+            return False
+    return True
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, keys):
+        for key, direction in reversed(keys):
+            self.docs.sort(key=lambda doc: doc[key], reverse=direction < 0)
+        return self
+
+    def limit(self, count):
+        self.docs = self.docs[:count]
+        return self
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            yield doc
+
+class FakeCollection:
+    """In-memory stand-in for the few Motor collection calls the message store makes."""
+
+    def __init__(self):
+        self.docs = []
+
+    async def create_index(self, keys, **kwargs):
+        pass
+
+    async def insert_one(self, doc):
+        doc.setdefault("_id", ObjectId())
+        self.docs.append(dict(doc))
+        return SimpleNamespace(inserted_id=doc["_id"])
+
+    async def insert_many(self, docs):
+        for doc in docs:
+            await self.insert_one(doc)
+
+    def find(self, query, projection=None):
+        return FakeCursor([dict(doc) for doc in self.docs if matches(doc, query)])
+
+    async def find_one(self, query, projection=None):
+        return next((dict(doc) for doc in self.docs if matches(doc, query)), None)
+
+    async def update_one(self, query, update):
+        for doc in self.docs:
+            if matches(doc, query):
+                for field in update.get("$unset", {}):
+                    doc.pop(field, None)
+                return
+
+def fake_db():
+    return SimpleNamespace(messages=FakeCollection(), agents=FakeCollection())
+
+AGENT_ID = str(ObjectId())
+NOW = datetime(2026, 1, 1)
+
+async def add_messages(store, timestamps):
+    return [await store.add(AGENT_ID, f"query {i}", f"essay {i}", timestamp) for i, timestamp in enumerate(timestamps)]
+
+async def read_all(store, limit):
+    pages, before = [], None
+    while True:
+        messages, before = await store.page(AGENT_ID, limit, before)
+        pages.append(messages)
+        if before is None:
+            return pages
+
+def test_pages_break_timestamp_ties_by_id_without_gaps_or_repeats():
+    store = MessageStore(fake_db())
+    # Five messages share a timestamp, so the cursor has to tell them apart by _id
+    timestamps = [NOW] * 5 + [NOW + timedelta(seconds=1), NOW - timedelta(seconds=1)]
+    added = asyncio.run(add_messages(store, timestamps))
+    # A message of another agent never shows up
+    asyncio.run(store.add(str(ObjectId()), "other", "other", NOW))
+
+    pages = asyncio.run(read_all(store, limit=2))
+
+    expected = sorted(added, key=lambda doc: (doc["timestamp"], doc["_id"]), reverse=True)
+    assert [len(page) for page in pages] == [2, 2, 2, 1]
+    assert [doc["_id"] for page in pages for doc in page] == [doc["_id"] for doc in expected]
+
+def test_next_before_is_none_on_a_full_last_page():
+    store = MessageStore(fake_db())
+    asyncio.run(add_messages(store, [NOW + timedelta(seconds=i) for i in range(4)]))
+
+    first, before = asyncio.run(store.page(AGENT_ID, 2))
+    assert before == str(first[-1]["_id"])
+    second, before = asyncio.run(store.page(AGENT_ID, 2, before))
+    assert len(second) == 2
+    assert before is None
+
+def test_unknown_or_malformed_cursor_is_rejected():
+    store = MessageStore(fake_db())
+    asyncio.run(add_messages(store, [NOW]))
+    with pytest.raises(ValueError):
+        asyncio.run(store.page(AGENT_ID, 2, str(ObjectId())))
+    with pytest.raises(ValueError):
+        asyncio.run(store.page(AGENT_ID, 2, "not-a-cursor"))
+
+def test_unknown_cursor_is_a_400(monkeypatch):
+    from fastapi.testclient import TestClient
+    from app import main
+    db = fake_db()
+    asyncio.run(db.agents.insert_one({"_id": ObjectId(AGENT_ID), "name": "agent"}))
+    monkeypatch.setattr(main, "db", db)
+    monkeypatch.setattr(main.message_store, "db", db)
+
+    response = TestClient(main.app).get(f"/agents/{AGENT_ID}/messages", params={"before": str(ObjectId())})
+    assert response.status_code == 400
+
+def test_page_size_is_capped():
+    store = MessageStore(fake_db())
+    asyncio.run(add_messages(store, [NOW + timedelta(seconds=i) for i in range(MESSAGES_MAX_PAGE_SIZE + 5)]))
+
+    messages, before = asyncio.run(store.page(AGENT_ID, 1000))
+    assert len(messages) == MESSAGES_MAX_PAGE_SIZE
+    assert before is not None
+    assert len(asyncio.run(store.page(AGENT_ID, 0))[0]) == 1
+
+def test_embedded_messages_are_migrated_to_the_collection():
+    db = fake_db()
+    embedded = [{"query": f"q{i}", "response": f"r{i}", "timestamp": NOW + timedelta(seconds=i)} for i in range(3)]
+    asyncio.run(db.agents.insert_one({"_id": ObjectId(AGENT_ID), "name": "agent", "messages": embedded}))
+    asyncio.run(db.agents.insert_one({"_id": ObjectId(), "name": "new agent"}))
+
+    assert asyncio.run(migrate_messages_to_collection(db)) == 1
+    assert "messages" not in db.agents.docs[0]
+    messages, before = asyncio.run(MessageStore(db).page(AGENT_ID, 10))
+    assert [doc["query"] for doc in messages] == ["q2", "q1", "q0"]
+    assert before is None
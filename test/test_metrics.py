@@ -0,0 +1,43 @@
+import sys
+import os
+import pytest
+from prometheus_client import CollectorRegistry, generate_latest
+
+# Ensure the project root is in sys.path so that the "agents" package can be imported.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.metrics import CacheCollector, EXTERNAL_ERRORS, collect_timings, instrument_node, timed
+
+def test_timed_calls_and_nodes_add_up_per_request():
+    def node(state, config=None):
+        with timed("tavily", "search"):
+            pass
+        return {"config": config}
+
+    wrapped = instrument_node("research_plan", node)
+    with collect_timings() as timings:
+        assert wrapped({}, config="c") == {"config": "c"}
+        wrapped({})
+    report = timings.report()
+    assert report["node:research_plan"]["calls"] == 2
+    assert report["tavily"]["calls"] == 2
+    # Outside a collecting context nothing is recorded per request, but nothing fails either
+    wrapped({})
+
+def test_failed_calls_are_counted():
+    before = EXTERNAL_ERRORS.labels("scrape", "fetch")._value.get()
+    with pytest.raises(RuntimeError):
+        with timed("scrape", "fetch"):
+            raise RuntimeError("boom")
+    assert EXTERNAL_ERRORS.labels("scrape", "fetch")._value.get() == before + 1
+
+def test_cache_counters_are_exported_from_cache_stats():
+    registry = CollectorRegistry()
+    registry.register(CacheCollector({
+        "search": lambda: {"memory_hits": 2, "disk_hits": 1, "misses": 4},
+        "llm": lambda: {"hits": 5, "misses": 0}
+    }))
+    text = generate_latest(registry).decode()
+    assert 'cache_hits_total{cache="search"} 3.0' in text
+    assert 'cache_misses_total{cache="search"} 4.0' in text
+    assert 'cache_hits_total{cache="llm"} 5.0' in text
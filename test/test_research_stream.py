@@ -0,0 +1,258 @@
+import sys
+import os
+import json
+import itertools
+import threading
+import pytest
+
+# Ensure the project root is in sys.path so that the "agents" package can be imported.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+os.environ.setdefault("TAVILY_API_KEY", "test-key")
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from agents import agent
+from agents.context_budget import ContextBudget
+from agents.checkpoints import CheckpointStore
+
+def fake_research_node(state):
+    return {"content": ["[Supplementary Source] fact"], "queries": ["history of tea"]}
+
+def fake_reflection_node(score):
+    def reflection_node(state):
+        update = {"critique": "Add more history", "score": score, "issues": ["Add more history"]}
+        if score >= agent.REFLECT_STOP_SCORE:
+            update.update(agent.stop_revising(state, "score", state["revision_number"]))
+        return update
+    return reflection_node
+
+@pytest.fixture
+def fake_graph(monkeypatch):
+    replies = itertools.cycle([AIMessage(content="An essay about tea")])
+    monkeypatch.setattr(agent, "model", GenericFakeChatModel(messages=replies))
+    monkeypatch.setattr(agent, "research_plan_node", fake_research_node)
+    monkeypatch.setattr(agent, "research_critique_node", fake_research_node)
+    monkeypatch.setattr(agent, "reflection_node", fake_reflection_node(5))
+    monkeypatch.setattr(agent, "context_budget", ContextBudget(count_tokens=lambda text: len(text.split())))
+    monkeypatch.setattr(agent, "checkpoints", CheckpointStore(path=None))
+    # Compiled graphs hold on to the node functions they were built with
+    agent.build_graph.cache_clear()
+    yield
+    agent.build_graph.cache_clear()
+
+def test_stream_research_emits_node_and_token_events(fake_graph):
+    events = list(agent.stream_research("Write about tea", max_revisions=2))
+    names = [event["event"] for event in events]
+
+    assert names[0] == "start"
+    assert events[0]["data"]["run_id"] == events[-1]["data"]["run_id"]
+    # Planning and the first research round run concurrently, so either may finish first
+    assert set(names[1:3]) == {"plan", "queries"}
+    assert names.count("draft") == 2
+    assert names.count("critique") == 1
+    assert "token" in names
+    assert names[-1] == "done"
+    tokens = "".join(e["data"]["content"] for e in events if e["event"] == "token")
+    assert tokens.startswith("An essay about tea")
+    assert events[-1]["data"]["response"] == "An essay about tea"
+
+def test_stream_research_stops_when_asked(fake_graph):
+    stop = threading.Event()
+    events = []
+    for event in agent.stream_research("Write about tea", max_revisions=2, stop=stop):
+        events.append(event)
+        stop.set()
+    assert len(events) == 1
+
+def test_graph_is_compiled_once_per_shape():
+    with_sources = {"files": [{"name": "a.pdf", "content": {"content": "tea", "token_count": 1}}], "websites": []}
+    assert agent.generate_graph(None) is agent.generate_graph({"files": [], "websites": []})
+    assert agent.generate_graph(with_sources) is agent.generate_graph(dict(with_sources))
+    assert agent.generate_graph(None) is not agent.generate_graph(with_sources)
+
+def test_agent_sources_reach_graph_through_config(fake_graph):
+    agent_db = {"files": [{"name": "a.pdf", "content": {"content": "tea facts", "token_count": 2}}], "websites": []}
+    events = list(agent.stream_research("Write about tea", max_revisions=1, agent_db=agent_db))
+    sources = [e for e in events if e["event"] == "sources"]
+    assert sources == [{"event": "sources", "data": {"count": 1}}]
+
+def test_research_with_timings_breaks_down_nodes_and_model_calls(fake_graph):
+    result = agent.research_with_timings("Write about tea", max_revisions=1)
+
+    assert result["response"] == "An essay about tea"
+    timings = result["timings"]
+    assert {"node:planner", "node:research_plan", "node:generate", "llm"} <= set(timings)
+    assert timings["llm"]["calls"] == 2
+
+def test_failed_run_resumes_without_repeating_finished_nodes(fake_graph, monkeypatch):
+    calls = []
+    def flaky_critique(state):
+        calls.append(state["revision_number"])
+        if len(calls) == 1:
+            raise RuntimeError("search timed out")
+        return fake_research_node(state)
+    monkeypatch.setattr(agent, "research_critique_node", flaky_critique)
+    plans = []
+    monkeypatch.setattr(agent, "plan_node", lambda state: plans.append(1) or {"plan": "outline"})
+    agent.build_graph.cache_clear()
+
+    with pytest.raises(RuntimeError):
+        agent.begin_research("Write about tea", max_revisions=2, thread_id="run-1")
+    assert agent.checkpoints.get("run-1").status == "failed"
+
+    assert agent.resume_research("run-1") == "An essay about tea"
+    assert plans == [1]
+    assert calls == [2, 2]
+    assert agent.checkpoints.get("run-1").status == "completed"
+    with pytest.raises(ValueError):
+        agent.resume_research("run-1")
+
+def test_high_reflection_score_stops_revising(fake_graph, monkeypatch):
+    monkeypatch.setattr(agent, "reflection_node", fake_reflection_node(9))
+    monkeypatch.setattr(agent, "research_critique_node", lambda state: pytest.fail("should not research again"))
+    agent.build_graph.cache_clear()
+
+    events = list(agent.stream_research("Write about tea", max_revisions=3))
+    assert [e["event"] for e in events].count("draft") == 1
+    done = events[-1]["data"]
+    assert done["stop_reason"] == "score"
+    assert done["revisions_skipped"] == 2
+    assert done["score"] == 9
+
+def test_converged_drafts_stop_revising(fake_graph):
+    result = agent.research_with_timings("Write about tea", max_revisions=4)
+    # The fake model writes the same essay every time, so the second draft already converged
+    assert result["revisions"]["revisions"] == 2
+    assert result["revisions"]["stop_reason"] == "converged"
+    assert result["revisions"]["revisions_skipped"] == 2
+    assert result["revisions"]["draft_similarity"] == 1.0
+
+def test_reflection_scores_and_lists_issues(monkeypatch):
+    class StructuredModel:
+        def with_structured_output(self, schema):
+            return self
+        def invoke(self, messages):
+            return agent.Reflection(score=8, issues=["Cite a source"], critique="Solid")
+    monkeypatch.setattr(agent, "get_model", StructuredModel)
+
+    update = agent.reflection_node({"draft": "An essay", "revision_number": 2, "max_revisions": 3})
+    assert update["critique"] == "Solid\n\nIssues to fix:\n- Cite a source"
+    assert update["stop_reason"] == "score"
+    assert update["revisions_skipped"] == 2
+
+@pytest.mark.parametrize("score", [0, 11])
+def test_reflection_score_outside_the_scale_is_rejected(score):
+    with pytest.raises(ValueError):
+        agent.Reflection(score=score, issues=[], critique="")
+
+def test_planning_and_first_research_run_concurrently(fake_graph, monkeypatch):
+    both_started = threading.Barrier(2, timeout=5)
+    def planner(state):
+        both_started.wait()
+        return {"plan": "outline"}
+    def research(state):
+        both_started.wait()
+        return fake_research_node(state)
+    monkeypatch.setattr(agent, "plan_node", planner)
+    monkeypatch.setattr(agent, "research_plan_node", research)
+    agent.build_graph.cache_clear()
+
+    assert agent.begin_research("Write about tea", max_revisions=1) == "An essay about tea"
+
+def test_content_reducer_appends_new_snippets_once():
+    merged = agent.merge_content(["a", "b"], ["b", "c", "c"])
+    assert merged == ["a", "b", "c"]
+    assert agent.merge_content(None, ["a"]) == ["a"]
+
+def test_dedup_savings_are_reported_per_draft_and_per_run(fake_graph, monkeypatch):
+    def repeating_research(state):
+        return {"content": ["[Supplementary Source] Tea is old.", "[Supplementary Source] tea is OLD!"], "queries": []}
+    monkeypatch.setattr(agent, "research_plan_node", repeating_research)
+    agent.build_graph.cache_clear()
+
+    events = list(agent.stream_research("Write about tea", max_revisions=2))
+    drafts = [e["data"] for e in events if e["event"] == "draft"]
+    saved = sum(draft["dedup"]["tokens_saved"] for draft in drafts)
+    assert saved > 0
+    assert events[-1]["data"]["dedup_tokens_saved"] == saved
+
+def test_context_budget_cuts_are_reported_per_draft_and_per_run(fake_graph, monkeypatch):
+    def long_research(state):
+        return {"content": [f"[Supplementary Source] {'tea ' * 400}"], "queries": []}
+    monkeypatch.setattr(agent, "research_plan_node", long_research)
+    monkeypatch.setattr(agent, "context_budget", ContextBudget(max_tokens=200, count_tokens=lambda text: len(text.split())))
+    agent.build_graph.cache_clear()
+
+    result = agent.research_with_timings("Write about tea", max_revisions=1)
+    context = result["revisions"]["context"]
+    assert context["max_tokens"] == 200
+    assert context["supplementary"]["truncated"] == 1
+    assert context["supplementary"]["tokens_out"] < context["supplementary"]["tokens_in"]
+
+    events = list(agent.stream_research("Write about tea", max_revisions=1))
+    draft = next(e["data"] for e in events if e["event"] == "draft")
+    assert draft["context"]["supplementary"]["truncated"] == 1
+
+def test_client_disconnect_closes_the_stream_and_marks_the_run_interrupted(fake_graph, monkeypatch):
+    import asyncio
+    from app import main
+    monkeypatch.setattr(main, "checkpoints", agent.checkpoints)
+    async def load_agent(agent_id):
+        return {"name": "agent", "files": [], "websites": []}
+    monkeypatch.setattr(main, "load_agent_for_research", load_agent)
+    stored = []
+    async def store_message(*args):
+        stored.append(args)
+    monkeypatch.setattr(main, "store_message", store_message)
+
+    class DisconnectingRequest:
+        """Connected for the first two events, gone afterwards."""
+        def __init__(self):
+            self.checks = 0
+        async def is_disconnected(self):
+            self.checks += 1
+            return self.checks > 2
+
+    async def disconnect_and_resume():
+        response = await main.stream_message("agent", main.Message(message="Write about tea"), DisconnectingRequest())
+        frames = [frame async for frame in response.body_iterator]
+        status = agent.checkpoints.conn.execute("SELECT status FROM runs").fetchall()
+        # The client only has what it received before dropping
+        event, data = frames[0].splitlines()[:2]
+        run_id = json.loads(data.removeprefix("data: "))["run_id"]
+        job = await main.resume_job(run_id)
+        await main.background_tasks.pop()
+        return frames, event, status, job
+
+    frames, event, status, job = asyncio.run(disconnect_and_resume())
+
+    assert len(frames) == 2
+    assert event == "event: start"
+    assert status == [("interrupted",)]
+    assert agent.checkpoints.get(job["job_id"]).status == "completed"
+    assert stored == [("agent", "Write about tea", "An essay about tea")]
+
+def test_a_run_still_executing_here_cannot_be_resumed(fake_graph, monkeypatch):
+    import asyncio
+    from fastapi import HTTPException
+    from app import main
+    monkeypatch.setattr(main, "checkpoints", agent.checkpoints)
+    async def store_message(*args):
+        pass
+    monkeypatch.setattr(main, "store_message", store_message)
+
+    events = agent.stream_research("Write about tea", max_revisions=1, thread_id="run-1")
+    assert next(events)["event"] == "start"
+    next(events)
+    assert agent.checkpoints.get("run-1").status == "running"
+
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(main.resume_job("run-1"))
+    assert error.value.status_code == 409
+    with pytest.raises(ValueError):
+        agent.resume_research("run-1")
+
+    events.close()
+    assert agent.checkpoints.get("run-1").status == "interrupted"
+    assert agent.resume_research("run-1") == "An essay about tea"
@@ -0,0 +1,59 @@
+import sys
+import os
+
+# Ensure the project root is in sys.path so that the "agents" package can be imported.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.retrieval import BM25Index, IndexStore, agent_sources, chunk_text, sources_fingerprint
+
+TEA = "Tea originated in China. " * 30 + "The tea ceremony is central to Japanese culture."
+COFFEE = "Coffee was first cultivated in Ethiopia. Coffee spread to Yemen and then Europe."
+
+def test_chunks_respect_size_and_sentence_boundaries():
+    text = " ".join(f"Sentence number {i} is here." for i in range(100))
+    chunks = chunk_text(text, chunk_words=50, overlap_words=10)
+    assert len(chunks) > 1
+    assert all(len(chunk.split()) <= 50 for chunk in chunks)
+    assert all(chunk.endswith(".") for chunk in chunks)
+    # Overlap carries the tail of one chunk into the next
+    assert chunks[1].split(".")[0] in chunks[0]
+
+def test_bm25_ranks_relevant_chunks_first():
+    index = BM25Index.build([("[VERIFIED SOURCE - File 'tea.pdf']", TEA), ("[VERIFIED SOURCE - Website 'c']", COFFEE)])
+    top = index.search("Where was coffee first cultivated?", k=1)
+    assert top[0]["source"] == "[VERIFIED SOURCE - Website 'c']"
+    assert "Ethiopia" in top[0]["text"]
+
+def test_index_round_trips_through_disk(tmp_path):
+    sources = [("a", TEA), ("b", COFFEE)]
+    IndexStore(directory=str(tmp_path)).build(sources)
+
+    store = IndexStore(directory=str(tmp_path))
+    index = store.get(sources)
+    assert index.search("Japanese ceremony", k=1)[0]["source"] == "a"
+    assert (tmp_path / f"{sources_fingerprint(sources)}.npz").exists()
+
+def test_disk_keeps_only_the_most_recently_used_indexes(tmp_path):
+    first, second, third = [("a", TEA)], [("b", COFFEE)], [("a", TEA), ("b", COFFEE)]
+    store = IndexStore(directory=str(tmp_path), disk_entries=2)
+    def saved(sources):
+        return (tmp_path / f"{sources_fingerprint(sources)}.npz").exists()
+
+    for age, sources in ((2, first), (1, second)):
+        store.build(sources)
+        os.utime(tmp_path / f"{sources_fingerprint(sources)}.npz", (age, age))
+    # Loading the first index from disk counts as a use
+    IndexStore(directory=str(tmp_path), disk_entries=2).get(first)
+    store.build(third)
+
+    assert saved(first) and saved(third)
+    assert not saved(second)
+    assert not (tmp_path / f"{sources_fingerprint(second)}.json").exists()
+
+def test_agent_sources_reads_files_and_websites():
+    agent_db = {
+        "files": [{"filename": "tea.pdf", "content": {"content": TEA, "token_count": 10}}, {"filename": "empty.pdf"}],
+        "websites": [{"url": "https://c.example", "content": {"content": COFFEE, "token_count": 5}}]
+    }
+    labels = [label for label, _ in agent_sources(agent_db)]
+    assert labels == ["[VERIFIED SOURCE - File 'tea.pdf']", "[VERIFIED SOURCE - Website 'https://c.example']"]
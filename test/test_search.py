@@ -0,0 +1,98 @@
+import sys
+import os
+import time
+
+# Ensure the project root is in sys.path so that the "agents" package can be imported.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.search import search_all
+from agents.search_cache import SearchCache, CachedSearchClient, cache_key
+
+class FakeSearchClient:
+    """Local stand-in for TavilyClient with a fixed latency per query."""
+
+    def __init__(self, latencies, fail=()):
+        self.latencies = latencies
+        self.fail = set(fail)
+        self.calls = []
+
+    def search(self, query, max_results=None, timeout=None):
+        self.calls.append(query)
+        time.sleep(self.latencies.get(query, 0))
+        if query in self.fail:
+            raise RuntimeError("upstream error")
+        return {"results": [{"content": f"{query} result {i}"} for i in range(max_results)]}
+
+def test_wall_time_is_about_the_slowest_query():
+    client = FakeSearchClient({"a": 0.3, "b": 0.1, "c": 0.2})
+    start = time.monotonic()
+    results = search_all(client, ["a", "b", "c"], max_results=1, concurrency=3, timeout=5)
+    elapsed = time.monotonic() - start
+
+    assert elapsed < 0.45  # sequential would take 0.6s
+    assert [r[0]["content"] for r in results] == ["a result 0", "b result 0", "c result 0"]
+
+def test_concurrency_limit_is_respected():
+    client = FakeSearchClient({"a": 0.2, "b": 0.2, "c": 0.2, "d": 0.2})
+    start = time.monotonic()
+    search_all(client, ["a", "b", "c", "d"], max_results=1, concurrency=2, timeout=5)
+    assert time.monotonic() - start >= 0.4
+
+def test_slow_and_failing_queries_are_dropped():
+    client = FakeSearchClient({"slow": 1.0, "fast": 0.05}, fail={"bad"})
+    start = time.monotonic()
+    results = search_all(client, ["slow", "bad", "fast"], max_results=2, concurrency=3, timeout=0.2)
+
+    assert time.monotonic() - start < 0.6
+    assert results[0] == []
+    assert results[1] == []
+    assert [r["content"] for r in results[2]] == ["fast result 0", "fast result 1"]
+
+def test_no_queries():
+    assert search_all(FakeSearchClient({}), [], max_results=1) == []
+
+def test_cache_normalizes_queries_and_keys_on_max_results(tmp_path):
+    cache = SearchCache(path=str(tmp_path / "cache.sqlite"))
+    client = CachedSearchClient(FakeSearchClient({}), cache)
+
+    client.search("History of Tea", max_results=1)
+    client.search("  history   of TEA? ", max_results=1)
+    client.search("history of tea", max_results=2)
+
+    assert client.client.calls == ["History of Tea", "history of tea"]
+    assert cache.stats()["memory_hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+def test_cache_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    SearchCache(path=path).set("tea", 1, {"results": [{"content": "x"}]})
+
+    cache = SearchCache(path=path)
+    assert cache.get("tea", 1) == {"results": [{"content": "x"}]}
+    assert cache.stats()["disk_hits"] == 1
+
+def test_cache_expires_and_evicts(tmp_path):
+    cache = SearchCache(path=str(tmp_path / "cache.sqlite"), ttl=0.05, memory_entries=1, disk_entries=1)
+    cache.set("tea", 1, {"results": []})
+    cache.set("coffee", 1, {"results": []})
+    assert cache.stats()["evictions"] == 2
+    assert len(cache.memory) == 1
+    time.sleep(0.06)
+    assert cache.get("coffee", 1) is None
+
+def test_queries_differing_in_question_words_do_not_share_results(tmp_path):
+    cache = SearchCache(path=str(tmp_path / "cache.sqlite"))
+    client = CachedSearchClient(FakeSearchClient({}), cache)
+
+    queries = ["When was Oxford founded?", "Where was Oxford founded?",
+               "why is the sky blue", "how is the sky blue", "tea vs coffee", "tea or coffee"]
+    for query in queries:
+        client.search(query, max_results=1)
+
+    assert client.client.calls == queries
+    assert cache.stats()["misses"] == len(queries)
+
+def test_queries_differing_in_direction_or_tense_get_different_keys():
+    assert cache_key("flights from london to paris", 1) != cache_key("flights to london from paris", 1)
+    assert cache_key("who is president", 1) != cache_key("who was president", 1)
+    assert cache_key("Who is President?", 1) == cache_key("who is  president", 1)
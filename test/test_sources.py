@@ -0,0 +1,238 @@
+import sys
+import os
+import asyncio
+import hashlib
+from types import SimpleNamespace
+import pytest
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+# Ensure the project root is in sys.path so that the "agents" package can be imported.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.sources import SourceStore, flatten_source
+from agents.storage import legacy_source_key
+
+def test_flatten_source_lifts_extractor_content():
+    source = {"url": "https://example.com", "content": {"content": "text", "token_count": 3}}
+    assert flatten_source(source) == {"url": "https://example.com", "content": "text", "token_count": 3}
+    assert flatten_source({"content": "text", "token_count": 3})["content"] == "text"
+
+def test_legacy_source_keys():
+    assert legacy_source_key("websites", {"url": "https://example.com"}) == "https://example.com"
+    assert legacy_source_key("files", {"sha256": "abc", "content": {"content": "x"}}) == "abc"
+    # Files stored before uploads were hashed are keyed by their extracted text
+    first = legacy_source_key("files", {"filename": "a.txt", "content": {"content": "same"}})
+    second = legacy_source_key("files", {"filename": "b.txt", "content": {"content": "same"}})
+    assert first == second
+
+def matches(doc, query):
+    for key, condition in query.items():
+        if isinstance(condition, dict) and "$in" in condition:
+            if doc.get(key) not in condition["$in"]:
+                return False
+        elif doc.get(key) != condition:
+            return False
+    return True
+
+def increment(doc, path, amount):
+    *parents, field = path.split(".")
+    for parent in parents:
+        doc = doc.setdefault(parent, {})
+    doc[field] = doc.get(field, 0) + amount
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction=1):
+        self.docs.sort(key=lambda doc: doc[key], reverse=direction < 0)
+        return self
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            yield doc
+
+class FakeCollection:
+    """In-memory stand-in for the Motor collection calls the source store makes."""
+
+    def __init__(self):
+        self.docs = []
+
+    async def create_index(self, keys, **kwargs):
+        pass
+
+    async def insert_one(self, doc):
+        doc.setdefault("_id", ObjectId())
+        self.docs.append(doc)
+        return SimpleNamespace(inserted_id=doc["_id"])
+
+    def find(self, query, projection=None):
+        excluded = {field for field, keep in (projection or {}).items() if not keep}
+        return FakeCursor([{k: v for k, v in doc.items() if k not in excluded} for doc in self.docs if matches(doc, query)])
+
+    async def find_one(self, query, projection=None):
+        return next((dict(doc) for doc in self.docs if matches(doc, query)), None)
+
+    async def update_one(self, query, update, upsert=False):
+        doc = next((doc for doc in self.docs if matches(doc, query)), None)
+        if doc is None:
+            if not upsert:
+                return SimpleNamespace(upserted_id=None)
+            doc = {**query, **update.get("$setOnInsert", {}), "_id": ObjectId()}
+            self.docs.append(doc)
+            return SimpleNamespace(upserted_id=doc["_id"])
+        doc.update(update.get("$set", {}))
+        for path, amount in update.get("$inc", {}).items():
+            increment(doc, path, amount)
+        return SimpleNamespace(upserted_id=None)
+
+    async def find_one_and_update(self, query, update, projection=None, return_document=ReturnDocument.BEFORE):
+        doc = next((doc for doc in self.docs if matches(doc, query)), None)
+        if doc is None:
+            return None
+        previous = dict(doc)
+        doc.update(update["$set"])
+        return previous
+
+    async def find_one_and_delete(self, query, projection=None):
+        doc = next((doc for doc in self.docs if matches(doc, query)), None)
+        if doc is not None:
+            self.docs.remove(doc)
+        return doc
+
+    async def delete_many(self, query):
+        kept = [doc for doc in self.docs if not matches(doc, query)]
+        deleted, self.docs = len(self.docs) - len(kept), kept
+        return SimpleNamespace(deleted_count=deleted)
+
+    async def distinct(self, field, query):
+        return list(dict.fromkeys(doc[field] for doc in self.docs if matches(doc, query)))
+
+def fake_db():
+    return SimpleNamespace(agents=FakeCollection(), sources=FakeCollection())
+
+AGENT_ID = str(ObjectId())
+
+def new_store():
+    db = fake_db()
+    asyncio.run(db.agents.insert_one({"_id": ObjectId(AGENT_ID), "name": "agent",
+                                      "token_totals": {"files": 0, "websites": 0}}))
+    return SourceStore(db)
+
+def website(url, tokens, text="text"):
+    return {"url": url, "content": {"content": text, "token_count": tokens}, "content_hash": text}
+
+def totals(store):
+    return asyncio.run(store.db.agents.find_one({"_id": ObjectId(AGENT_ID)}))["token_totals"]
+
+def test_add_skips_a_source_the_agent_already_has():
+    store = new_store()
+    first = asyncio.run(store.add(AGENT_ID, "website", "https://a.example", website("https://a.example", 5)))
+    again = asyncio.run(store.add(AGENT_ID, "website", "https://a.example", website("https://a.example", 7)))
+    # Same key as a file, or for another agent, is a different source
+    as_file = asyncio.run(store.add(AGENT_ID, "file", "https://a.example", {"content": {"content": "x", "token_count": 1}}))
+    other_agent = asyncio.run(store.add(str(ObjectId()), "website", "https://a.example", website("https://a.example", 2)))
+
+    assert first["token_count"] == 5 and first["content"] == "text"
+    assert again is None
+    assert as_file is not None and other_agent is not None
+    assert len(asyncio.run(store.list(AGENT_ID))) == 2
+    assert totals(store) == {"files": 1, "websites": 5}
+
+def test_token_totals_follow_add_update_and_remove():
+    store = new_store()
+    a = asyncio.run(store.add(AGENT_ID, "website", "https://a.example", website("https://a.example", 10)))
+    asyncio.run(store.add(AGENT_ID, "website", "https://b.example", website("https://b.example", 20)))
+    asyncio.run(store.add(AGENT_ID, "website", "https://c.example", website("https://c.example", 30)))
+    assert totals(store)["websites"] == 60
+
+    assert asyncio.run(store.update(AGENT_ID, "website", "https://b.example", {"content": "new", "token_count": 25}))
+    assert not asyncio.run(store.update(AGENT_ID, "website", "https://missing.example", {"token_count": 99}))
+    assert totals(store)["websites"] == 65
+
+    assert asyncio.run(store.remove(AGENT_ID, str(a["_id"])))
+    assert not asyncio.run(store.remove(AGENT_ID, str(a["_id"])))
+    assert not asyncio.run(store.remove(AGENT_ID, "not-an-id"))
+    assert totals(store)["websites"] == 55
+
+    assert asyncio.run(store.remove_keys(AGENT_ID, "website", ["https://b.example", "https://missing.example"])) == 1
+    assert asyncio.run(store.token_total(AGENT_ID, "website")) == 30
+    assert list(asyncio.run(store.keys(AGENT_ID, "website"))) == ["https://c.example"]
+
+@pytest.fixture
+def api(monkeypatch):
+    """TestClient over an agent stored in fake collections; scraping, extraction and indexing are faked."""
+    from fastapi.testclient import TestClient
+    from app import main
+    store = new_store()
+    monkeypatch.setattr(main, "db", store.db)
+    monkeypatch.setattr(main.source_store, "db", store.db)
+
+    pages = {}
+    async def afetch_many(urls, *args, **kwargs):
+        return [pages.get(url) for url in urls]
+    monkeypatch.setattr(main.scraper, "afetch_many", afetch_many)
+
+    async def extract_files(uploads, existing_tokens=0):
+        return [{"filename": upload.filename, "sha256": upload.sha256, "size": upload.size,
+                 "content": {"content": "file text", "token_count": 3}} for upload in uploads]
+    monkeypatch.setattr(main.file_processor, "extract_files", extract_files)
+
+    builds = []
+    monkeypatch.setattr(main, "index_store", SimpleNamespace(build=builds.append))
+    return SimpleNamespace(client=TestClient(main.app), store=store, pages=pages, builds=builds)
+
+def page(tokens, text="text"):
+    return {"content": text, "token_count": tokens, "content_hash": text}
+
+def test_add_list_and_delete_sources(api):
+    api.pages["https://a.example"] = page(4)
+    response = api.client.post(f"/agents/{AGENT_ID}/websites", json=["https://a.example", "https://a.example"])
+    assert response.status_code == 201
+    assert [doc["url"] for doc in response.json()["added"]] == ["https://a.example"]
+    # Already present: nothing is scraped or added
+    assert api.client.post(f"/agents/{AGENT_ID}/websites", json=["https://a.example"]).json() == {"added": []}
+
+    response = api.client.post(f"/agents/{AGENT_ID}/files", files=[("files", ("a.txt", b"same")), ("files", ("b.txt", b"same"))])
+    assert response.status_code == 201
+    assert [doc["sha256"] for doc in response.json()["added"]] == [hashlib.sha256(b"same").hexdigest()]
+
+    sources = api.client.get(f"/agents/{AGENT_ID}/sources").json()
+    assert [(doc["kind"], doc["token_count"]) for doc in sources] == [("website", 4), ("file", 3)]
+    assert all("content" not in doc for doc in sources)
+    assert [doc["kind"] for doc in api.client.get(f"/agents/{AGENT_ID}/sources", params={"kind": "file"}).json()] == ["file"]
+    assert api.client.get(f"/agents/{ObjectId()}/sources").status_code == 404
+
+    assert api.client.delete(f"/agents/{AGENT_ID}/sources/{sources[0]['_id']}").status_code == 204
+    assert api.client.delete(f"/agents/{AGENT_ID}/sources/{sources[0]['_id']}").status_code == 404
+    assert api.client.delete(f"/agents/{AGENT_ID}/sources/not-an-id").status_code == 404
+    assert [doc["kind"] for doc in api.client.get(f"/agents/{AGENT_ID}/sources").json()] == ["file"]
+    assert totals(api.store) == {"files": 3, "websites": 0}
+    assert [text for _, text in api.builds[-1]] == ["file text"]
+
+def test_rejected_website_replacement_changes_nothing(api):
+    api.pages.update({"https://big.example": page(100_000, "big"), "https://small.example": page(10_000, "small")})
+    api.client.post(f"/agents/{AGENT_ID}/websites", json=["https://big.example", "https://small.example"])
+    builds = len(api.builds)
+
+    # big (kept) + new would pass MAX_TOKENS even though small is being removed
+    api.pages["https://new.example"] = page(30_000, "new")
+    response = api.client.put(f"/agents/{AGENT_ID}/websites", json=["https://big.example", "https://new.example"])
+
+    assert response.status_code == 400
+    assert sorted(doc["url"] for doc in api.client.get(f"/agents/{AGENT_ID}/sources").json()) == [
+        "https://big.example", "https://small.example"]
+    assert totals(api.store)["websites"] == 110_000
+    assert len(api.builds) == builds
+
+    # Tokens of the websites being replaced do not count against the new ones
+    response = api.client.put(f"/agents/{AGENT_ID}/websites", json=["https://small.example", "https://new.example"])
+    assert response.status_code == 204
+    assert sorted(doc["url"] for doc in api.client.get(f"/agents/{AGENT_ID}/sources").json()) == [
+        "https://new.example", "https://small.example"]
+    assert totals(api.store)["websites"] == 40_000
+    assert len(api.builds) == builds + 1
@@ -0,0 +1,33 @@
+import sys
+import os
+import json
+import subprocess
+
+# Ensure the project root is in sys.path so that the "agents" package can be imported.
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+IMPORT_BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", "3.0"))
+HEAVY_MODULES = [
+    "unstructured", "pytesseract", "pdf2image", "langchain_openai", "tavily", "nltk", "langgraph.graph"
+]
+
+PROBE = f"""
+import sys, json, time
+started = time.perf_counter()
+import app.main
+print(json.dumps({{
+    "seconds": time.perf_counter() - started,
+    "loaded": [name for name in {HEAVY_MODULES!r} if name in sys.modules]
+}}))
+"""
+
+def test_app_imports_quickly_without_keys_or_heavy_modules():
+    env = {k: v for k, v in os.environ.items() if k not in ("TAVILY_API_KEY", "OPENAI_API_KEY")}
+    result = subprocess.run(
+        [sys.executable, "-c", PROBE], cwd=ROOT, env=env, capture_output=True, text=True, timeout=60
+    )
+    assert result.returncode == 0, result.stderr
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    assert report["loaded"] == []
+    assert report["seconds"] < IMPORT_BUDGET_SECONDS
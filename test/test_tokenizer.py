@@ -0,0 +1,54 @@
+import sys
+import os
+import io
+import random
+import contextlib
+import pytest
+import tiktoken
+from tiktoken._educational import bpe_train
+
+# Ensure the project root is in sys.path so that the "agents" package can be imported.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.tokenizer import Tokenizer, segments
+
+# cl100k_base split pattern; the real ranks cannot be downloaded in tests, so a tiny BPE is trained on it
+CL100K_PATTERN = r"""'(?i:[sdmt]|ll|ve|re)|[^\r\n\p{L}\p{N}]?+\p{L}++|\p{N}{1,3}+| ?[^\s\p{L}\p{N}]++[\r\n]*+|\s++$|\s*[\r\n]|\s+(?!\S)|\s"""
+
+@pytest.fixture(scope="module")
+def encoding():
+    with open(os.path.join(os.path.dirname(__file__), "data", "html", "news_article.html"), encoding="utf-8") as f:
+        sample = f.read()[:6000]
+    with contextlib.redirect_stdout(io.StringIO()):
+        ranks = bpe_train(sample, 320, CL100K_PATTERN, visualise=None)
+    return tiktoken.Encoding("test_bpe", pat_str=CL100K_PATTERN, mergeable_ranks=ranks, special_tokens={})
+
+def random_text(rng, pieces):
+    alphabet = ["token", " word", "\n", "\n\n", "  ", "\r\n", ".", "'s", "123", "é", "\t", " \n", "-", " "]
+    return "".join(rng.choice(alphabet) for _ in range(pieces))
+
+def test_segmented_counts_match_whole_text(encoding):
+    rng = random.Random(3)
+    for _ in range(200):
+        text = random_text(rng, rng.randint(50, 2000))
+        pieces = list(segments(text, 64))
+        assert "".join(pieces) == text
+        assert sum(len(encoding.encode_ordinary(piece)) for piece in pieces) == len(encoding.encode_ordinary(text))
+
+def test_count_many_matches_count_and_uses_cache(encoding):
+    rng = random.Random(5)
+    texts = [random_text(rng, 3000) for _ in range(4)] + ["", "short", "<|endoftext|> is plain text"]
+    tokenizer = Tokenizer(encoding=encoding, num_threads=2)
+
+    batched = tokenizer.count_many(texts)
+
+    assert batched == [len(encoding.encode_ordinary(text)) for text in texts]
+    assert tokenizer.stats()["misses"] == 4
+    assert [tokenizer.count(text) for text in texts] == batched
+    assert tokenizer.stats()["hits"] == 4
+
+def test_cache_is_bounded(encoding):
+    tokenizer = Tokenizer(encoding=encoding, cache_entries=2)
+    for i in range(5):
+        tokenizer.count(f"{i} " + "x" * 300)
+    assert tokenizer.stats()["entries"] == 2
@@ -0,0 +1,75 @@
+import sys
+import os
+import asyncio
+import hashlib
+from io import BytesIO
+import pytest
+from fastapi import UploadFile
+
+# Ensure the project root is in sys.path so that the "agents" package can be imported.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents.uploads import spool_upload, spooled_uploads, UploadLimitMiddleware, UploadTooLarge
+
+def test_spooled_uploads_are_hashed_unique_and_cleaned_up():
+    data = b"report body " * 1000
+    files = [UploadFile(filename="report.pdf", file=BytesIO(data)), UploadFile(filename="report.pdf", file=BytesIO(b"other"))]
+
+    async def run():
+        async with spooled_uploads(files) as uploads:
+            paths = [upload.path for upload in uploads]
+            assert paths[0] != paths[1]
+            assert all(path.endswith("_report.pdf") for path in paths)
+            with open(paths[0], "rb") as f:
+                assert f.read() == data
+            assert uploads[0].sha256 == hashlib.sha256(data).hexdigest()
+            assert uploads[0].size == len(data)
+        return paths
+
+    paths = asyncio.run(run())
+    assert not any(os.path.exists(path) for path in paths)
+
+def test_oversized_upload_is_rejected_while_streaming(tmp_path):
+    upload = UploadFile(filename="big.bin", file=BytesIO(b"x" * 5000))
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(spool_upload(upload, str(tmp_path), max_bytes=4096, chunk_size=1024))
+
+def test_declared_size_is_checked_before_reading(tmp_path):
+    upload = UploadFile(filename="big.bin", file=BytesIO(b"x"), size=10_000)
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(spool_upload(upload, str(tmp_path), max_bytes=4096))
+    assert upload.file.tell() == 0
+
+@pytest.fixture
+def limited_app():
+    from fastapi import FastAPI, File
+    from fastapi.testclient import TestClient
+    app = FastAPI()
+    app.add_middleware(UploadLimitMiddleware, max_bytes=4096)
+    app.handled = []
+
+    @app.post("/upload")
+    async def upload(files: list[UploadFile] = File(...)):
+        app.handled.append([file.filename for file in files])
+        return {}
+
+    return app, TestClient(app)
+
+def test_request_over_the_limit_is_refused_before_parsing(limited_app):
+    app, client = limited_app
+    assert client.post("/upload", files=[("files", ("small.txt", b"x" * 100))]).status_code == 200
+
+    response = client.post("/upload", files=[("files", ("a.bin", b"x" * 3000)), ("files", ("b.bin", b"x" * 3000))])
+    assert response.status_code == 413
+    assert app.handled == [["small.txt"]]
+
+def test_chunked_request_is_cut_off_at_the_limit(limited_app):
+    app, client = limited_app
+    boundary = "limit"
+    body = (f"--{boundary}\r\nContent-Disposition: form-data; name=\"files\"; filename=\"big.bin\"\r\n\r\n".encode()
+            + b"x" * 10_000 + f"\r\n--{boundary}--\r\n".encode())
+    chunks = (body[i:i + 1024] for i in range(0, len(body), 1024))
+
+    response = client.post("/upload", content=chunks, headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+    assert response.status_code == 413
+    assert app.handled == []
@@ -0,0 +1,182 @@
+import sys
+import os
+import time
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+
+# Ensure the project root is in sys.path so that the "agents" package can be imported.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from agents import webscrape
+from agents.fetch_records import FetchRecordStore
+from agents.webscrape import WebScraper
+
+class Site:
+    """State of the stand-in web server: page bodies and what clients sent."""
+
+    def __init__(self):
+        self.pages = {}
+        self.delays = {}
+        self.etags = True
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        site = self.server.site
+        with site.lock:
+            site.requests.append((self.path, dict(self.headers)))
+            site.in_flight += 1
+            site.max_in_flight = max(site.max_in_flight, site.in_flight)
+        try:
+            time.sleep(site.delays.get(self.path, 0))
+            body = site.pages[self.path].encode()
+            etag = f'"{hash(body)}"'
+            if site.etags and self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            if site.etags:
+                self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with site.lock:
+                site.in_flight -= 1
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def site():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    server.site = Site()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.site.base = f"http://127.0.0.1:{server.server_port}"
+    yield server.site
+    server.shutdown()
+
+@pytest.fixture
+def scraper(tmp_path, monkeypatch):
+    """Scraper parsing on a thread, counting HTML parses and words instead of tiktoken tokens."""
+    parses = []
+    html_to_text = webscrape.html_to_text
+
+    def counting_html_to_text(html):
+        parses.append(html)
+        return html_to_text(html)
+
+    monkeypatch.setattr(webscrape, "html_to_text", counting_html_to_text)
+    monkeypatch.setattr(webscrape.scraper, "tokenize_text", lambda text, method="openai": {"tokens": [], "token_count": len(text.split())})
+    executor = ThreadPoolExecutor(max_workers=2)
+    scraper = WebScraper(FetchRecordStore(str(tmp_path / "records.sqlite")), parse_executor=executor)
+    scraper.parses = parses
+    yield scraper
+    executor.shutdown()
+
+def test_not_modified_page_is_not_parsed_again(site, scraper):
+    site.pages["/a"] = "<html><h1>Title</h1><p>First version.</p></html>"
+
+    first = scraper.process_websites([site.base + "/a"])
+    second = scraper.process_websites([site.base + "/a"])
+
+    assert len(scraper.parses) == 1
+    assert site.requests[1][1].get("If-None-Match")
+    assert second[0]["content"] == first[0]["content"] == {"content": "Title First version.", "token_count": 3}
+
+def test_unchanged_body_without_validators_is_not_parsed_again(site, scraper):
+    site.etags = False
+    site.pages["/a"] = "<html><p>Same body.</p></html>"
+
+    scraper.fetch_website(site.base + "/a")
+    page = scraper.fetch_website(site.base + "/a")
+
+    assert len(scraper.parses) == 1
+    assert page["content"] == "Same body."
+
+def test_changed_page_is_parsed_and_rehashed(site, scraper):
+    site.pages["/a"] = "<html><p>Old.</p></html>"
+    old = scraper.fetch_website(site.base + "/a")
+
+    site.pages["/a"] = "<html><p>New text here.</p></html>"
+    new = scraper.fetch_website(site.base + "/a")
+
+    assert len(scraper.parses) == 2
+    assert new["content"] == "New text here."
+    assert new["content_hash"] != old["content_hash"]
+
+def test_per_host_limit_deadline_and_order(site, scraper, monkeypatch):
+    monkeypatch.setattr(webscrape, "SCRAPE_PER_HOST", 2)
+    for i in range(6):
+        site.pages[f"/{i}"] = f"<p>Page {i}.</p>"
+        site.delays[f"/{i}"] = 0.2
+    site.pages["/slow"] = "<p>Slow.</p>"
+    site.delays["/slow"] = 3
+    urls = [site.base + f"/{i}" for i in range(6)] + [site.base + "/slow"]
+
+    started = time.monotonic()
+    websites = asyncio.run(scraper.aprocess_websites(urls, deadline=1.5))
+
+    assert time.monotonic() - started < 2.5
+    assert site.max_in_flight == 2
+    assert [website["url"] for website in websites] == urls[:6]
+
+    # A busy host must not hold global slots: the other host's URL, listed last, goes out right away
+    monkeypatch.setattr(webscrape, "SCRAPE_CONCURRENCY", 2)
+    monkeypatch.setattr(webscrape, "SCRAPE_PER_HOST", 1)
+    site.pages["/other"] = "<p>Other host.</p>"
+    site.requests.clear()
+    other_host = site.base.replace("127.0.0.1", "localhost") + "/other"
+    websites = asyncio.run(scraper.aprocess_websites([site.base + f"/{i}" for i in range(4)] + [other_host]))
+    assert "/other" in [path for path, _ in site.requests[:2]]
+    assert websites[-1]["url"] == other_host
+
+def test_limits_hold_across_concurrent_batches_and_the_client_closes_with_its_loop(site, scraper, monkeypatch):
+    monkeypatch.setattr(webscrape, "SCRAPE_PER_HOST", 2)
+    for i in range(6):
+        site.pages[f"/{i}"] = f"<p>Page {i}.</p>"
+        site.delays[f"/{i}"] = 0.2
+    urls = [site.base + f"/{i}" for i in range(6)]
+
+    async def two_requests_and_the_refresher():
+        batches = await asyncio.gather(scraper.afetch_many(urls[:2]), scraper.afetch_many(urls[2:4]),
+                                       scraper.afetch_many(urls[4:]))
+        return batches, scraper.resources()
+
+    batches, resources = asyncio.run(two_requests_and_the_refresher())
+
+    assert site.max_in_flight == 2
+    assert all(page is not None for batch in batches for page in batch)
+    assert resources.per_host == {}
+    assert resources.client.is_closed
+    assert scraper._loops == {}
+
+def test_oversized_page_and_token_limit(site, scraper, monkeypatch):
+    monkeypatch.setattr(webscrape, "SCRAPE_MAX_BYTES", 1000)
+    site.pages["/big"] = "<p>" + "word " * 1000 + "</p>"
+    site.pages["/small"] = "<p>" + "word " * 10 + "</p>"
+
+    assert scraper.process_websites([site.base + "/big", site.base + "/small"])[0]["url"].endswith("/small")
+    with pytest.raises(ValueError):
+        scraper.process_websites([site.base + "/small"], existing_tokens=webscrape.MAX_TOKENS - 5)
+
+def test_parse_pool_workers_are_not_forked_from_the_server(tmp_path):
+    scraper = WebScraper(FetchRecordStore(str(tmp_path / "records.sqlite")))
+    try:
+        assert scraper.parse_executor._mp_context.get_start_method() == "forkserver"
+        assert scraper.parse_executor.submit(os.getpid).result(timeout=60) != os.getpid()
+    finally:
+        scraper.parse_executor.shutdown()